@@ -0,0 +1,322 @@
+"""
+Офлайн-бенчмарк обхода: синтетическая база знаний (benchmarks.synthetic_kb) раздаётся локальным
+HTTP-сервером, по ней проходят IWebCrawler и KBWebCrawler2CSV. Для каждого сценария выводятся
+страницы в секунду, пиковая память (RSS) и время фаз обработки (utils.metrics).
+
+    python -m benchmarks.bench_crawl --articles 500 --pages-count 1 4
+    python -m benchmarks.bench_crawl --fetch browser --save bench.json
+    python -m benchmarks.bench_crawl --baseline bench.json --tolerance 0.2
+    python -m benchmarks.bench_crawl --fetch browser --articles 10000 --recycle-after 200 --max-browser-rss 1500
+    python -m benchmarks.bench_crawl --pages-count 1 --prefetch 4 --parse-workers 2 --markdown-workers 2 --markdown-queue 8
+
+--fetch http (по умолчанию) получает страницы HTTP-клиентом без браузера (путь static_first)
+и измеряет только обработку в Python; --fetch browser - полный путь через Chromium.
+С --baseline сценарии, ставшие медленнее или прожорливее больше чем на tolerance, считаются
+регрессией, и бенчмарк завершается с кодом 1.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.synthetic_kb import SyntheticKB, SPACE_ID
+from utils.metrics import CrawlMetrics
+from utils.retriever import check_parser
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+class HTTPResponse:
+    """
+    Ответ в объёме, который краулер использует у APIResponse Playwright.
+    """
+
+    def __init__(self, url, status, headers, body):
+        self.url = url
+        self.status = status
+        self.ok = 200 <= status < 300
+        self.headers = {key.lower(): value for key, value in headers.items()}
+        self._body = body
+
+    async def body(self):
+        return self._body
+
+
+class HTTPRequestContext:
+    """
+    Замена context.request браузера для режима --fetch http: запросы urllib в пуле потоков.
+    """
+
+    def fetch(self, url, headers, timeout):
+        request = urllib.request.Request(url, headers=headers or {})
+        try:
+            with urllib.request.urlopen(request, timeout=timeout / 1000) as response:
+                return HTTPResponse(response.url, response.status, dict(response.headers), response.read())
+        except urllib.error.HTTPError as e:
+            return HTTPResponse(url, e.code, dict(e.headers), e.read())
+
+    async def get(self, url, headers=None, timeout=30000):
+        return await asyncio.to_thread(self.fetch, url, headers, timeout)
+
+
+class HTTPContext:
+    def __init__(self):
+        self.request = HTTPRequestContext()
+
+
+class HTTPFetchMixin:
+    """
+    Retriever без браузера: все страницы загружаются статически (static_first), изображения -
+    тем же HTTP-клиентом.
+    """
+
+    async def __aenter__(self):
+        self.context = HTTPContext()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
+
+
+class RSSMonitor:
+    """
+    Пиковая память процесса бенчмарка и (если установлен psutil) дочерних процессов браузера.
+    """
+
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.python_peak = 0
+        self.browser_peak = 0
+        self.task = None
+
+    def sample(self):
+        process = psutil.Process()
+        self.python_peak = max(self.python_peak, process.memory_info().rss)
+        children = 0
+        for child in process.children(recursive=True):
+            try:
+                children += child.memory_info().rss
+            except psutil.Error:
+                pass
+        self.browser_peak = max(self.browser_peak, children)
+
+    async def run(self):
+        while True:
+            self.sample()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if psutil:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.sample()
+        try:
+            import resource
+            # ru_maxrss в Linux - в килобайтах
+            self.python_peak = max(self.python_peak, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+        except ImportError:
+            pass
+        return (self.python_peak or None, self.browser_peak or None)
+
+
+def make_classes(fetch):
+    # Бенчмарк запускается из корня репозитория; kb_retriever при импорте пишет лог в ./output
+    (ROOT / 'output').mkdir(exist_ok=True)
+    import kb_retriever
+    from utils.retriever import IHTMLRetriever, IWebCrawler
+    logging.getLogger().setLevel(logging.WARNING)
+
+    class LocalKBCrawler(kb_retriever.KBWebCrawler2CSV):
+        space_id = SPACE_ID
+
+    if fetch == 'http':
+        retrievers = {
+            'generic': type('HTTPRetriever', (HTTPFetchMixin, IHTMLRetriever), {}),
+            'kb': type('HTTPKBRetriever', (HTTPFetchMixin, kb_retriever.KBHTMLRetriever), {}),
+        }
+    else:
+        retrievers = {'generic': IHTMLRetriever, 'kb': kb_retriever.KBHTMLRetriever}
+    return (retrievers, {'generic': IWebCrawler, 'kb': LocalKBCrawler})
+
+
+async def crawl_scenario(crawler_name, base_url, start_url, options):
+    (retrievers, crawlers) = make_classes(options['fetch'])
+    metrics = CrawlMetrics()
+    monitor = RSSMonitor()
+    monitor.start()
+    with tempfile.TemporaryDirectory() as output_dir:
+        async with retrievers[crawler_name](
+            base_url=start_url,
+            pages_count=options['pages_count'],
+            static_first=options['fetch'] == 'http',
+            static_probe_limit=10 ** 9,
+            parser=options['parser'],
+            metrics=metrics,
+            parse_workers=options['parse_workers'],
+            headless=not options['headed'],
+            recycle_after=options['recycle_after'],
+            max_browser_rss=options['max_browser_rss'],
+        ) as retriever:
+            settings = {
+                'output_dir': output_dir,
+                'no_images': options['no_images'],
+                'max_depth': options['depth'] + 1,
+                'markdown_workers': options['markdown_workers'],
+                'markdown_queue': options['markdown_queue'],
+                'prefetch': options['prefetch'],
+            }
+            if crawler_name == 'kb':
+                crawlers['kb'].kb_url = base_url
+                crawler = crawlers['kb'](retriever, ignored_classes=['tags-classifiers editor__article-tags'], non_recursive_classes=['tag'], **settings)
+            else:
+                crawler = crawlers['generic'](
+                    retriever,
+                    navigation_classes=['side-menu'],
+                    ignored_classes=['app-header', 'page-footer'],
+                    duplicate_tags=['div', 'ul'],
+                    **settings,
+                )
+            crawler.initialize()
+            started = time.perf_counter()
+            await crawler.crawl(start_url)
+            elapsed = time.perf_counter() - started
+            crawler.close()
+    (python_rss, browser_rss) = await monitor.stop()
+    summary = metrics.summary()
+    return {
+        'pages': summary['pages'],
+        'seconds': elapsed,
+        'pages_per_sec': summary['pages'] / elapsed if elapsed else 0.0,
+        'python_rss': python_rss,
+        'browser_rss': browser_rss,
+        'phases': summary['phases'],
+        'counters': summary['counters'],
+    }
+
+
+def run_scenario(crawler_name, base_url, start_url, options):
+    # Каждый сценарий выполняется в отдельном процессе, чтобы пиковая память не накапливалась между ними
+    return asyncio.run(crawl_scenario(crawler_name, base_url, start_url, options))
+
+
+def format_mb(value):
+    return f"{value / 2**20:.0f}" if value else "-"
+
+
+def print_results(results):
+    print(f"{'сценарий':<22} {'страниц':>8} {'время, с':>9} {'стр/с':>8} {'RSS, МБ':>8} {'браузер, МБ':>12}")
+    for (name, result) in results.items():
+        print(
+            f"{name:<22} {result['pages']:>8} {result['seconds']:>9.2f} {result['pages_per_sec']:>8.1f}"
+            f" {format_mb(result['python_rss']):>8} {format_mb(result['browser_rss']):>12}"
+        )
+    for (name, result) in results.items():
+        total = sum(phase['seconds'] for phase in result['phases'].values()) or 1.0
+        print(f"\nФазы {name}:")
+        print(f"  {'фаза':<18} {'вызовов':>8} {'всего, с':>9} {'мс/стр':>8} {'доля':>6}")
+        for (phase, stats) in result['phases'].items():
+            per_page = stats['seconds'] / max(1, result['pages']) * 1000
+            print(f"  {phase:<18} {stats['calls']:>8} {stats['seconds']:>9.3f} {per_page:>8.2f} {stats['seconds'] / total:>6.1%}")
+
+
+def compare(results, baseline, tolerance):
+    """
+    Возвращает список регрессий относительно сохранённых результатов.
+    """
+    regressions = []
+    for (name, result) in results.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        if result['pages_per_sec'] < base['pages_per_sec'] * (1 - tolerance):
+            regressions.append(f"{name}: {result['pages_per_sec']:.1f} стр/с против {base['pages_per_sec']:.1f}")
+        for key in ('python_rss', 'browser_rss'):
+            if result[key] and base.get(key) and result[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{name}: {key} {format_mb(result[key])} МБ против {format_mb(base[key])} МБ")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--articles', type=int, default=300, help='Количество статей синтетической базы знаний')
+    parser.add_argument('--fanout', type=int, default=4, help='Вложенных статей у каждой статьи')
+    parser.add_argument('--depth', type=int, default=4, help='Глубина дерева статей')
+    parser.add_argument('--paragraphs', type=int, default=12, help='Абзацев текста в статье')
+    parser.add_argument('--images', type=int, default=2, help='Изображений в статье')
+    parser.add_argument('--no-images', action='store_true', help='Не загружать изображения')
+    parser.add_argument('--crawlers', nargs='+', choices=['generic', 'kb'], default=['generic', 'kb'])
+    parser.add_argument('--pages-count', type=int, nargs='+', default=[1, 4], help='Размеры пула вкладок')
+    parser.add_argument('--fetch', choices=['http', 'browser'], default='http')
+    parser.add_argument('--parser', default='lxml')
+    parser.add_argument('--prefetch', type=int, default=0, help='Страниц, загружаемых заранее при обходе в одной вкладке')
+    parser.add_argument('--parse-workers', type=int, default=0, help='Потоков для разбора HTML')
+    parser.add_argument('--markdown-workers', type=int, default=0, help='Процессов для конвертации в Markdown')
+    parser.add_argument('--markdown-queue', type=int, default=0, help='Страниц, ожидающих конвертации и записи')
+    parser.add_argument('--headed', action='store_true', help='Показывать окно браузера (--fetch browser)')
+    parser.add_argument('--recycle-after', type=int, default=0, help='Заменять вкладку после стольких загрузок')
+    parser.add_argument('--max-browser-rss', type=int, default=None, help='Пересоздавать контекст браузера после стольких МБ')
+    parser.add_argument('--save', help='Сохранить результаты в JSON')
+    parser.add_argument('--baseline', help='Сравнить с результатами, сохранёнными через --save')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Допустимое ухудшение скорости и памяти (доля)')
+    args = parser.parse_args()
+    check_parser(args.parser)
+
+    site = SyntheticKB(articles=args.articles, fanout=args.fanout, depth=args.depth, paragraphs=args.paragraphs, images=args.images)
+    server = site.serve()
+    print(f"Синтетическая база знаний: {len(site.tree)} статей, {site.base_url}, загрузка: {args.fetch}")
+    results = {}
+    try:
+        for crawler_name in args.crawlers:
+            for pages_count in args.pages_count:
+                options = {
+                    'fetch': args.fetch,
+                    'pages_count': pages_count,
+                    'parser': args.parser,
+                    'no_images': args.no_images,
+                    'depth': args.depth,
+                    'prefetch': args.prefetch,
+                    'parse_workers': args.parse_workers,
+                    'markdown_workers': args.markdown_workers,
+                    'markdown_queue': args.markdown_queue,
+                    'headed': args.headed,
+                    'recycle_after': args.recycle_after,
+                    'max_browser_rss': args.max_browser_rss,
+                }
+                with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                    results[f"{crawler_name}-{args.fetch}-{pages_count}"] = executor.submit(
+                        run_scenario, crawler_name, site.base_url, site.start_url, options
+                    ).result()
+    finally:
+        server.shutdown()
+
+    print_results(results)
+    if args.save:
+        Path(args.save).write_text(json.dumps(results, ensure_ascii=False, indent=1), encoding='utf-8')
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text(encoding='utf-8')), args.tolerance)
+        for regression in regressions:
+            print(f"Регрессия: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
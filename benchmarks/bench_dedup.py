@@ -0,0 +1,89 @@
+"""
+Сравнение поиска дубликатов: прежний вариант (копия тега и обход всех вложенных <a> для каждого
+div/p/table) и однопроходный расчёт отпечатков снизу вверх (compute_link_fingerprints).
+
+    python -m benchmarks.bench_dedup --depth 200 --repeat 3
+
+Страница - глубоко вложенные div, на каждом уровне абзац со ссылками и повторяющийся блок.
+Проверяется, что оба варианта удаляют одни и те же элементы.
+"""
+import argparse
+import asyncio
+import hashlib
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.retriever import IWebCrawler, INSIGNIFICANT_TAGS, make_soup, prepare_tag_for_hashing
+
+URL = "https://kb.example.local/space/s/article/root"
+
+
+class DummyRetriever:
+    base_url = URL
+    pages_count = 1
+
+
+def nested_page(depth, links_per_level=3):
+    html = ""
+    for level in reversed(range(depth)):
+        links = ''.join(f'<a href="/article/{level}/{i}">ссылка {i}</a> ' for i in range(links_per_level))
+        shared = '<div class="shared"><p><a href="/article/common">Общий блок</a></p></div>'
+        html = f'<div class="level-{level}"><p>Уровень {level}: {links}</p>{shared}{html}</div>'
+    return f'<html><body>{html}</body></html>'
+
+
+def legacy_remove_duplicates(soup, url, duplicate_tags, processed):
+    tags_to_decompose = []
+    for tag in soup.find_all(duplicate_tags):
+        cleaned_content = prepare_tag_for_hashing(tag, INSIGNIFICANT_TAGS, base_url=url)
+        if not cleaned_content:
+            continue
+        tag_hash = hashlib.md5(cleaned_content.encode('utf-8')).hexdigest()
+        if tag_hash in processed:
+            tags_to_decompose.append(tag)
+        else:
+            processed.add(tag_hash)
+    for tag in tags_to_decompose:
+        tag.decompose()
+
+
+def run_legacy(html, duplicate_tags):
+    soup = make_soup(html)
+    start = time.perf_counter()
+    legacy_remove_duplicates(soup, URL, duplicate_tags, set())
+    return time.perf_counter() - start, str(soup)
+
+
+def run_fingerprints(html, duplicate_tags, output_dir):
+    crawler = IWebCrawler(DummyRetriever(), output_dir=output_dir, duplicate_tags=duplicate_tags)
+    soup = make_soup(html)
+    start = time.perf_counter()
+    asyncio.run(crawler.remove_duplicates(soup, URL))
+    return time.perf_counter() - start, str(soup)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--depth', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    duplicate_tags = ['div', 'p', 'table']
+    html = nested_page(args.depth)
+    print(f"Глубина: {args.depth}, объём страницы: {len(html) // 1024} КБ")
+    with tempfile.TemporaryDirectory() as output_dir:
+        legacy = [run_legacy(html, duplicate_tags) for _ in range(args.repeat)]
+        fingerprints = [run_fingerprints(html, duplicate_tags, output_dir) for _ in range(args.repeat)]
+    legacy_time = min(t for t, _ in legacy)
+    fingerprint_time = min(t for t, _ in fingerprints)
+    print(f"прежний вариант:  {legacy_time * 1000:10.1f} мс")
+    print(f"отпечатки:        {fingerprint_time * 1000:10.1f} мс  (x{legacy_time / fingerprint_time:.1f})")
+    print(f"результаты совпадают: {legacy[0][1] == fingerprints[0][1]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Сравнение конвертеров HTML -> Markdown (html2text и markdownify), прежней постобработки
+(шесть последовательных re.sub) с utils.markdown.postprocess (с проверкой совпадения результатов)
+и конвертации в цикле событий с пулом процессов.
+
+    python -m benchmarks.bench_markdown --html ./saved_pages --workers 0 2 4
+
+Без --html используются страницы синтетической базы знаний (benchmarks.synthetic_kb),
+часть из них - со встроенными дочерними статьями и маркерами связанного контента.
+Для пула выводится и наибольшая задержка цикла событий: пока конвертация идёт в нём,
+браузер не получает команд.
+"""
+import argparse
+import asyncio
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.synthetic_kb import SyntheticKB
+from utils.markdown import MarkdownConverter, DEFAULT_MARKDOWN_OPTIONS, get_converter, postprocess
+
+
+def legacy_postprocess(markdown):
+    markdown = markdown.strip() if markdown else ""
+    markdown = markdown.replace('\t', ' ')
+    markdown = re.sub(r'[ ]{2,}', ' ', markdown)
+    markdown = re.sub(r'[ ]{1,}+\n{1,}', '\n', markdown)
+    markdown = re.sub(r'\n{2,}', '\n', markdown)
+    markdown = re.sub(
+        r'(\n*)[ ]*##START_LINKED_CONTENT_FROM:\s*(https?://\S+)(\n*)',
+        r'\n===========================\n##START_LINKED_CONTENT_FROM: \2\n',
+        markdown
+    )
+    markdown = re.sub(
+        r'(\n*)[ ]*##END_LINKED_CONTENT_FROM:\s*(https?://\S+)(\n*)',
+        r'\n##END_LINKED_CONTENT_FROM: \2\n===========================\n',
+        markdown
+    )
+    return markdown
+
+
+def embedded_page(site, i, children):
+    """
+    Статья со встроенными дочерними статьями, как после обхода в режиме link_mode='inline'.
+    """
+    parts = [site.render(i)]
+    for child in children:
+        parts.append(
+            f'<div class="embedded-content">\n\n##START_LINKED_CONTENT_FROM: {site.article_url(child)}\n'
+            f'{site.render(child)}\n##END_LINKED_CONTENT_FROM: {site.article_url(child)}\n\n</div>'
+        )
+    return ''.join(parts)
+
+
+def synthetic_pages(count):
+    site = SyntheticKB(articles=count * 4, images=3)
+    site.base_url = "https://kb.example.local"
+    pages = [site.render(i) for i in range(count)]
+    pages += [embedded_page(site, i, site.tree[i][2]) for i in range(count // 4) if site.tree[i][2]]
+    return pages
+
+
+def bench_engine(engine, pages, repeat):
+    convert = get_converter(engine, DEFAULT_MARKDOWN_OPTIONS[engine])
+    (convert_times, legacy_times, single_times) = ([], [], [])
+    mismatches = 0
+    size = 0
+    for _ in range(repeat):
+        for html in pages:
+            start = time.perf_counter()
+            raw = convert(html)
+            convert_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            legacy = legacy_postprocess(raw)
+            legacy_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            single = postprocess(raw)
+            single_times.append(time.perf_counter() - start)
+            mismatches += legacy != single
+            size += len(single)
+    return (sum(convert_times), sum(legacy_times), sum(single_times), mismatches, size // repeat)
+
+
+async def measure_loop_lag(stop, interval=0.005):
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def bench_pool(engine, pages, workers):
+    converter = MarkdownConverter(engine, workers=workers)
+    if workers:
+        # Запуск процессов пула не входит в измерение
+        await asyncio.gather(*(converter.convert_async('<p>прогрев</p>') for _ in range(workers)))
+    stop = asyncio.Event()
+    lag = asyncio.create_task(measure_loop_lag(stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(converter.convert_async(html) for html in pages))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    worst_lag = await lag
+    converter.close()
+    return (elapsed, worst_lag)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--html', help='Каталог с сохранёнными страницами *.html')
+    parser.add_argument('--pages', type=int, default=200, help='Количество синтетических страниц')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--engines', nargs='+', choices=list(DEFAULT_MARKDOWN_OPTIONS), default=list(DEFAULT_MARKDOWN_OPTIONS))
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 2, 4], help='Размеры пула процессов (0 - в цикле событий)')
+    args = parser.parse_args()
+
+    if args.html:
+        pages = [path.read_text(encoding='utf-8', errors='replace') for path in sorted(Path(args.html).glob('*.html'))]
+    else:
+        pages = synthetic_pages(args.pages)
+    print(f"Страниц: {len(pages)}, средний размер {statistics.mean(len(html) for html in pages) / 1024:.0f} КБ")
+
+    print(f"\n{'конвертер':<12} {'мс/стр':>8} {'прежняя пост., мс/стр':>22} {'новая пост., мс/стр':>22} {'расхождений':>12} {'символов':>10}")
+    for engine in args.engines:
+        (convert_time, legacy_time, single_time, mismatches, size) = bench_engine(engine, pages, args.repeat)
+        total = len(pages) * args.repeat
+        print(
+            f"{engine:<12} {convert_time / total * 1000:>8.2f} {legacy_time / total * 1000:>22.3f}"
+            f" {single_time / total * 1000:>22.3f} {mismatches:>12} {size:>10}"
+        )
+
+    for engine in args.engines:
+        print(f"\nПул конвертации, {engine}:")
+        print(f"  {'процессов':>9} {'время, с':>9} {'стр/с':>8} {'макс. задержка цикла, мс':>25}")
+        for workers in args.workers:
+            (elapsed, worst_lag) = asyncio.run(bench_pool(engine, pages, workers))
+            print(f"  {workers:>9} {elapsed:>9.2f} {len(pages) / elapsed:>8.1f} {worst_lag * 1000:>25.1f}")
+
+
+if __name__ == "__main__":
+    main()
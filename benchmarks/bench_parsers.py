@@ -0,0 +1,114 @@
+"""
+Сравнение парсеров BeautifulSoup на сохранённых страницах базы знаний.
+
+Для каждого парсера измеряется время разбора и время проходов краулера
+(игнорируемые элементы, навигация, дубликаты, изображения, ссылки).
+
+    python -m benchmarks.bench_parsers --pages ./saved_html --repeat 5
+
+--pages - каталог со страницами, сохранёнными из браузера (*.htm, *.html); Markdown из ./output не подходит.
+
+Без --pages используется синтетическая страница, похожая на статью KB.
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.retriever import IWebCrawler, make_soup, check_parser
+
+PARSERS = ['html.parser', 'lxml', 'html5lib']
+
+
+class DummyRetriever:
+    base_url = "https://kb.example.local"
+    pages_count = 1
+
+
+def synthetic_page(sections=200):
+    blocks = []
+    for i in range(sections):
+        blocks.append(
+            f'<div class="block"><p>Раздел {i}. ' + 'Текст статьи базы знаний. ' * 20 + '</p>'
+            f'<table><tr><td><a href="/space/s/article/{i % 25}">Статья {i % 25}</a></td>'
+            f'<td><img src="/img/{i % 10}.png"></td></tr></table></div>'
+        )
+    nav = ''.join(f'<li><a href="/space/s/article/{i}">Пункт {i}</a></li>' for i in range(50))
+    return (
+        '<html><head><title>Статья</title></head><body>'
+        f'<div class="menu"><ul>{nav}</ul></div>'
+        '<div class="footer">footer</div>'
+        f'<div class="editor__body-content editor-container">{"".join(blocks)}</div>'
+        '</body></html>'
+    )
+
+
+async def run_passes(crawler, soup, url):
+    await crawler.remove_ignored_elements(soup, url)
+    await crawler.get_navigators(soup, url)
+    await crawler.remove_duplicates(soup, url)
+    await crawler.get_images_elements(soup)
+    await crawler.get_links(soup, url)
+
+
+def bench_parser(parser, pages, repeat, output_dir):
+    parse_times = []
+    pass_times = []
+    for _ in range(repeat):
+        crawler = IWebCrawler(
+            DummyRetriever(),
+            output_dir=output_dir,
+            duplicate_tags=['div', 'p', 'table'],
+            navigation_classes=['menu'],
+            ignored_classes=['footer'],
+            parser=parser,
+        )
+        for (url, html) in pages:
+            start = time.perf_counter()
+            soup = make_soup(html, parser)
+            parse_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            asyncio.run(run_passes(crawler, soup, url))
+            pass_times.append(time.perf_counter() - start)
+    return statistics.median(parse_times) * 1000, statistics.median(pass_times) * 1000
+
+
+def load_pages(pages_dir):
+    if not pages_dir:
+        return [("https://kb.example.local/space/s/article/root", synthetic_page())]
+    return [
+        (f"https://kb.example.local/{path.stem}", path.read_text(encoding='utf-8', errors='replace'))
+        for path in sorted(Path(pages_dir).glob('*.htm*'))
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', help='Каталог с сохранёнными HTML-страницами (*.htm, *.html)')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages)
+    if not pages:
+        parser.error(f"в каталоге {args.pages} нет HTML-страниц (*.htm, *.html)")
+    size = sum(len(html) for _, html in pages) // 1024
+    print(f"Страниц: {len(pages)}, объём: {size} КБ")
+    print(f"{'парсер':<12} {'разбор, мс':>12} {'проходы, мс':>12} {'всего, мс':>12}")
+    with tempfile.TemporaryDirectory() as output_dir:
+        for name in PARSERS:
+            try:
+                check_parser(name)
+            except ValueError as e:
+                print(f"{name:<12} пропущен: {e}")
+                continue
+            (parse_ms, pass_ms) = bench_parser(name, pages, args.repeat, output_dir)
+            print(f"{name:<12} {parse_ms:>12.2f} {pass_ms:>12.2f} {parse_ms + pass_ms:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Сравнение множеств посещённых URL (utils.seen_sets): память, скорость и доля ложных срабатываний.
+
+    python -m benchmarks.bench_seen_sets --count 1000000 --error-rate 0.001
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.seen_sets import make_seen_set, load_seen_set, memory_usage
+
+ARTICLE_URL = "https://kb.example.local/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/{:08x}-4cb8-96d4-5b577dd4422e"
+
+
+def bench_backend(backend, options, count, probes):
+    seen_set = make_seen_set(backend, **options)
+    start = time.perf_counter()
+    for i in range(count):
+        seen_set.add(ARTICLE_URL.format(i))
+    add_time = time.perf_counter() - start
+    start = time.perf_counter()
+    missed = sum(ARTICLE_URL.format(i) not in seen_set for i in range(0, count, max(1, count // probes)))
+    false_positives = sum(ARTICLE_URL.format(count + i) in seen_set for i in range(probes))
+    lookup_time = time.perf_counter() - start
+    if backend != 'set':
+        with tempfile.TemporaryDirectory() as tmp:
+            seen_set.save(Path(tmp) / 'seen.bin')
+            restored = load_seen_set(Path(tmp) / 'seen.bin')
+            missed += sum(ARTICLE_URL.format(i) not in restored for i in range(0, count, max(1, count // probes)))
+    return (memory_usage(seen_set), add_time, lookup_time, missed, false_positives / probes)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=200_000)
+    parser.add_argument('--probes', type=int, default=100_000)
+    parser.add_argument('--error-rate', type=float, default=0.001)
+    args = parser.parse_args()
+
+    backends = [
+        ('set', {}),
+        ('digest', {}),
+        ('bloom', {'error_rate': args.error_rate}),
+    ]
+    print(f"URL: {args.count}, проверок отсутствующих: {args.probes}")
+    print(f"{'тип':<8} {'память, МБ':>11} {'байт/URL':>9} {'добавление, с':>14} {'проверки, с':>12} {'потеряно':>9} {'ложных':>9}")
+    for (backend, options) in backends:
+        (size, add_time, lookup_time, missed, false_rate) = bench_backend(backend, options, args.count, args.probes)
+        print(f"{backend:<8} {size / 2**20:>11.1f} {size / args.count:>9.1f} {add_time:>14.2f} {lookup_time:>12.2f} {missed:>9} {false_rate:>9.5f}")
+
+
+if __name__ == "__main__":
+    main()
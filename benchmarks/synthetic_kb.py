@@ -0,0 +1,200 @@
+"""
+Синтетическая база знаний для бенчмарков: дерево статей со структурой kb.ileasing.ru
+(editor__body-content, вложенные статьи li[keyname][ancestorids], изображения, боковое меню
+и повторяющиеся на всех страницах блоки) и локальный HTTP-сервер для неё.
+"""
+import random
+import struct
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SPACE_ID = "5e1f0000-0000-4000-8000-00000000be0c"
+
+WORDS = (
+    "договор лизинг клиент заявка система пользователь документ отчёт согласование платёж "
+    "график контрагент сделка имущество страхование акт поставщик счёт доступ инструкция "
+    "настройка ошибка обращение роль карточка статус проверка реестр шаблон подпись"
+).split()
+
+
+def article_key(i):
+    return f"{i:08x}-0000-4000-8000-{i:012x}"
+
+
+def make_png(size):
+    """
+    Корректный PNG размером около size байт (случайные пиксели в одной строке).
+    """
+    width = max(1, size // 3)
+    raw = b'\x00' + random.Random(size).randbytes(width * 3)
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    header = struct.pack('>IIBBBBB', width, 1, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(raw, 0)) + chunk(b'IEND', b'')
+
+
+class SyntheticKB:
+    """
+    Дерево из articles статей: у каждой до fanout вложенных, глубина не больше depth.
+    paragraphs - абзацев текста в статье, images - изображений в статье (из общего набора image_pool),
+    menu_items - пунктов бокового меню (ссылки на статьи верхнего уровня), shared_blocks - блоков,
+    одинаковых на всех страницах (отсекаются как дубликаты). Блоки ссылаются на отдельные страницы
+    /docs/N, а не на статьи: иначе при обходе в глубину статьи достигались бы по ним раньше,
+    чем по дереву, и обрезались бы по max_depth.
+    """
+
+    def __init__(self, articles=200, fanout=4, depth=4, paragraphs=12, images=2, image_pool=50, image_size=20_000, menu_items=10, shared_blocks=3):
+        self.articles_count = articles
+        self.fanout = fanout
+        self.depth = depth
+        self.paragraphs = paragraphs
+        self.images = images
+        self.image_pool = image_pool
+        self.image_size = image_size
+        self.menu_items = menu_items
+        self.shared_blocks = shared_blocks
+        # Статья -> (родитель, глубина, вложенные)
+        self.tree = {0: (None, 0, [])}
+        self.build_tree()
+        self.base_url = None
+        # Ответы сервера не пересчитываются, чтобы он не отнимал процессор у краулера
+        self.responses = {}
+
+    def build_tree(self):
+        queue = [0]
+        while queue and len(self.tree) < self.articles_count:
+            parent = queue.pop(0)
+            (_, depth, children) = self.tree[parent]
+            if depth >= self.depth:
+                continue
+            for _ in range(self.fanout):
+                if len(self.tree) >= self.articles_count:
+                    break
+                child = len(self.tree)
+                self.tree[child] = (parent, depth + 1, [])
+                children.append(child)
+                queue.append(child)
+
+    def ancestors(self, i):
+        result = []
+        while (parent := self.tree[i][0]) is not None:
+            result.append(parent)
+            i = parent
+        return list(reversed(result))
+
+    def article_path(self, i):
+        return f"/space/{SPACE_ID}/article/{article_key(i)}"
+
+    def article_url(self, i):
+        return f"{self.base_url}{self.article_path(i)}"
+
+    @property
+    def start_url(self):
+        return self.article_url(0)
+
+    def shared_block(self, n):
+        links = ''.join(f'<li><a href="/docs/{k}">Документ {k}</a></li>' for k in range(n, n + 5))
+        return f'<div class="related-block"><p>Часто читают:</p><ul>{links}</ul></div>'
+
+    def render_doc(self, n):
+        return (
+            f'<html><head><title>Документ {n}</title></head><body>'
+            f'<div class="editor__body-content editor-container"><p class="editor-title__text">Документ {n}</p>'
+            f'<p>{" ".join(WORDS).capitalize()}.</p></div></body></html>'
+        )
+
+    def render(self, i):
+        (_, depth, children) = self.tree[i]
+        rnd = random.Random(i)
+        menu = ''.join(
+            f'<li><a href="{self.article_path(k)}">Раздел {k}</a></li>' for k in self.tree[0][2][:self.menu_items]
+        )
+        nested = ''.join(
+            f'<li keyname="{article_key(k)}" ancestorids="{",".join(article_key(a) for a in self.ancestors(k))}">'
+            f'<span>Статья {k}</span></li>'
+            for k in children
+        )
+        paragraphs = []
+        for p in range(self.paragraphs):
+            words = ' '.join(rnd.choice(WORDS) for _ in range(60))
+            link = ''
+            if children and p < len(children):
+                link = f' Подробнее: <a href="{self.article_path(children[p])}">статья {children[p]}</a>.'
+            paragraphs.append(f'<p>{words.capitalize()}.{link}</p>')
+        images = ''.join(
+            f'<p><img src="/img/{rnd.randrange(self.image_pool)}.png" alt="рисунок"></p>' for _ in range(self.images)
+        )
+        table = '<table><tr><th>Поле</th><th>Значение</th></tr>' + ''.join(
+            f'<tr><td>Параметр {r}</td><td>{rnd.choice(WORDS)}</td></tr>' for r in range(5)
+        ) + '</table>'
+        shared = ''.join(self.shared_block(n * 5) for n in range(self.shared_blocks))
+        return (
+            f'<html><head><title>Статья {i}</title></head><body>'
+            f'<div class="app-header">База знаний</div>'
+            f'<div class="side-menu"><ul>{menu}</ul></div>'
+            f'<div class="editor__body-content editor-container">'
+            f'<p class="editor-title__text">Статья {i} (уровень {depth})</p>'
+            f'<div class="article-info editor__article-info">Автор, дата изменения</div>'
+            f'<div class="article-properties editor__properties">Свойства</div>'
+            f'<div class="scrollbar nested-articles__content ps"><ul>{nested}</ul></div>'
+            f'{"".join(paragraphs)}{images}{table}{shared}'
+            f'<div class="tags-classifiers editor__article-tags">теги</div>'
+            f'</div>'
+            f'<div class="page-footer">Подвал</div>'
+            f'</body></html>'
+        )
+
+    def handle(self, path):
+        """
+        Возвращает (статус, Content-Type, тело) для пути запроса.
+        """
+        path = path.split('?', 1)[0].split('#', 1)[0].rstrip('/')
+        if path not in self.responses:
+            self.responses[path] = self.build_response(path)
+        return self.responses[path]
+
+    def build_response(self, path):
+        prefix = f"/space/{SPACE_ID}/article/"
+        if path.startswith(prefix):
+            key = path[len(prefix):]
+            try:
+                i = int(key.split('-', 1)[0], 16)
+            except ValueError:
+                i = None
+            if i in self.tree and article_key(i) == key:
+                return (200, 'text/html; charset=utf-8', self.render(i).encode('utf-8'))
+        if path.startswith('/docs/') and path[6:].isdigit():
+            return (200, 'text/html; charset=utf-8', self.render_doc(int(path[6:])).encode('utf-8'))
+        if path.startswith('/img/') and path[5:-4].isdigit() and path.endswith('.png'):
+            return (200, 'image/png', make_png(self.image_size + int(path[5:-4])))
+        return (404, 'text/html; charset=utf-8', b'<html><body>Not found</body></html>')
+
+    def serve(self, host='127.0.0.1', port=0):
+        """
+        Запускает HTTP-сервер в фоновом потоке. Возвращает сервер (server.shutdown() для остановки).
+        """
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                (status, content_type, body) = site.handle(self.path)
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        self.base_url = f"http://{host}:{server.server_address[1]}"
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
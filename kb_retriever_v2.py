@@ -1,8 +1,10 @@
 import asyncio
 import os
+import shutil
 import re
 import aiofiles
 import hashlib  # Для хеширования
+from html import escape
 from urllib.parse import urljoin, urlparse
 from pathlib import Path
 from uuid import uuid4
@@ -13,8 +15,18 @@ from bs4 import BeautifulSoup, NavigableString
 import html2text
 
 import logging
+import argparse
 
-from utils.retriever import IHTMLRetriever, IWebCrawler, replace_tag
+from utils.retriever import IHTMLRetriever, IWebCrawler, replace_tag, ensure_soup
+from utils.crawl_state import CrawlStateStore
+from utils.revalidation import RevalidationStore
+from utils.resource_filter import ResourceFilter
+from utils.politeness import PolitenessScheduler
+from utils.discovery import SiteDiscovery
+from utils.sharding import SharedCrawlStore, run_workers, merge_outputs
+from utils.metrics import CrawlMetrics
+from utils.session import SessionStore
+from utils.network_capture import NetworkCapture
 #from utils.kb_summariser import summarise
 
 # Настройка логирования
@@ -32,34 +44,54 @@ articles_url = "https://kb.ileasing.ru/space/"
 global_id = "a100dc8d-3af0-418c-8634-f09f1fdb06f2"  # Replace with actual global ID
 root_article = "af494df7-9560-4cb8-96d4-5b577dd4422e"
 
+# Ответы API, которые SPA загружает при открытии статьи (режим --capture): статья и вложенные статьи
+KB_CAPTURE_ENDPOINTS = {
+    'nested': r'/api/.*/articles?/[0-9a-f-]{36}/(?:children|nested|tree)',
+    'article': r'/api/.*/articles?/[0-9a-f-]{36}/?(?:\?|$)',
+}
+KB_PAGE_PATTERN = r'/space/(?P<space>[0-9a-f-]{36})/article/(?P<article>[0-9a-f-]{36})'
+
+
+def first_value(data, keys):
+    for key in keys:
+        if data.get(key) is not None:
+            return data[key]
+    return None
+
 
 
 class KBHTMLRetriever(IHTMLRetriever):
+    # Страница входа тоже считается готовой: при недействительной сессии SPA перенаправляет на неё
+    default_readiness = {'ready_selector': 'div.editor__body-content, div.auth-signin__option'}
 
-    async def login(self):
+    async def login(self, page=None):
         if not self.login_url:
             return  True# Вход не требуется
+        page = page or self.page
         try:
-            await self.page.goto(self.login_url)
-            await self.wait_for_page_load(self.page)
-            #await self.page.get_by_role("button").first.click()
-            employee_option = self.page.locator('div.auth-signin__option', has_text='Сотрудник компании')
+            await page.goto(self.login_url)
+            await self.wait_for_page_load(page, ready_selector='div.auth-signin__option')
+            #await page.get_by_role("button").first.click()
+            employee_option = page.locator('div.auth-signin__option', has_text='Сотрудник компании')
             await employee_option.locator('button').click()
 
-            await self.page.get_by_placeholder("Введите логин").fill(self.login_credentials['username'])
-            await self.page.get_by_placeholder("Введите пароль").click()
-            await self.page.get_by_placeholder("Введите пароль").fill(self.login_credentials['password'])
-            await self.page.get_by_role("button", name="войти").click()
-            await self.page.wait_for_timeout(2000)
+            await page.get_by_placeholder("Введите логин").fill(self.login_credentials['username'])
+            await page.get_by_placeholder("Введите пароль").click()
+            await page.get_by_placeholder("Введите пароль").fill(self.login_credentials['password'])
+            await page.get_by_role("button", name="войти").click()
+            # После входа SPA уходит со страницы входа по параметру redirect
+            await page.wait_for_url(lambda url: not self.is_auth_redirect(url), timeout=30000)
+            await self.wait_for_page_load(page)
             logging.info(f"Успешный вход на {self.login_url}")
             return True
         except Exception as e:
             logging.error(f"Не удалось выполнить вход на {self.login_url}: {e}")
             return False
 
-    async def clean_content(self, html_content):
-        html_content = await super().clean_content(html_content)
-        soup = BeautifulSoup(html_content, 'html.parser')
+    async def clean_content(self, html_content, url=None):
+        url = url or self.page.url
+        html_content = await super().clean_content(html_content, url)
+        soup = ensure_soup(html_content, self.parser)
         for element in soup.find_all('div', class_='article-info editor__article-info'):
             element.decompose()
         for element in soup.find_all('div', class_='article-properties editor__properties'):
@@ -67,24 +99,70 @@ class KBHTMLRetriever(IHTMLRetriever):
         if content := soup.find(
             'div', class_='editor__body-content editor-container'
         ):
-            return str(content)
-        logging.error(f"Не удалось получить контент статьи для {self.page.url}")
-        if self.page.url.startswith(articles_url):
+            return ensure_soup(content, self.parser)
+        logging.error(f"Не удалось получить контент статьи для {url}")
+        if url.startswith(articles_url):
             return None
 
+    async def build_content(self, payloads, url):
+        """
+        Собирает статью из ответов API в той же разметке, что и отрендеренная страница
+        (editor__body-content, li[keyname][ancestorids]), поэтому заголовок, ссылки и изображения
+        краулер извлекает как обычно.
+        """
+        article = payloads.get('article')
+        if isinstance(article, dict):
+            article = article.get('data', article)
+        body = first_value(article, ('content', 'body', 'html')) if isinstance(article, dict) else None
+        if not isinstance(body, str):
+            logging.warning(f"В ответе API нет текста статьи, контент будет взят из DOM: {url}")
+            return None
+        title = first_value(article, ('title', 'name')) or ''
+        nested = payloads.get('nested') or []
+        if isinstance(nested, dict):
+            nested = first_value(nested, ('items', 'children', 'data')) or []
+        article_id = urlparse(url).path.rstrip('/').rsplit('/', 1)[-1]
+        items = []
+        for child in nested:
+            if not isinstance(child, dict) or not (keyname := first_value(child, ('id', 'keyname', 'key'))):
+                continue
+            ancestors = first_value(child, ('ancestorIds', 'ancestorids', 'ancestors')) or [article_id]
+            if isinstance(ancestors, list):
+                ancestors = ','.join(map(str, ancestors))
+            items.append(
+                f'<li keyname="{escape(str(keyname))}" ancestorids="{escape(str(ancestors))}">'
+                f'<span>{escape(str(first_value(child, ("title", "name")) or ""))}</span></li>'
+            )
+        html = (
+            f'<div class="editor__body-content editor-container">'
+            f'<p class="editor-title__text">{escape(str(title))}</p>'
+            f'<div class="scrollbar nested-articles__content ps"><ul>{"".join(items)}</ul></div>'
+            f'{body}</div>'
+        )
+        soup = await self.parse(html)
+        return ensure_soup(soup.find('div', class_='editor__body-content editor-container'), self.parser)
+
 class KBWebCrawler2CSV(IWebCrawler):
+    # Адрес базы знаний и идентификатор пространства статей (переопределяются, например, для локального стенда)
+    kb_url = base_url
+    space_id = global_id
 
-    def __init__(self, retriever, output_dir='output', images_dir='images', duplicate_tags=None, no_images=False, max_depth=5, non_recursive_classes=None, navigation_classes=None, ignored_classes=None, allowed_domains = None):
-        super().__init__(retriever, output_dir, images_dir, duplicate_tags, no_images, max_depth, non_recursive_classes, navigation_classes, ignored_classes, allowed_domains) 
+    def __init__(self, retriever, output_dir='output', images_dir='images', duplicate_tags=None, no_images=False, max_depth=5, non_recursive_classes=None, navigation_classes=None, ignored_classes=None, allowed_domains = None, state=None, link_mode='inline', seen_backend='set', seen_options=None, discovery=None, shared_store=None, shared_scope='crawl', markdown_engine='html2text', markdown_workers=0, prefetch=0, markdown_queue=0, sink_options=None):
+        super().__init__(retriever, output_dir, images_dir, duplicate_tags, no_images, max_depth, non_recursive_classes, navigation_classes, ignored_classes, allowed_domains, state=state, link_mode=link_mode, seen_backend=seen_backend, seen_options=seen_options, discovery=discovery, shared_store=shared_store, shared_scope=shared_scope, markdown_engine=markdown_engine, markdown_workers=markdown_workers, prefetch=prefetch, markdown_queue=markdown_queue, sink_options=sink_options) 
         self.articles_data = []
 
     def initialize(self):
         super().initialize()
         self.articles_data = []
 
+    def restore_state(self, start_url):
+        super().restore_state(start_url)
+        # Строки страниц, которые не будут запрошены повторно
+        self.articles_data = sorted(self.state.load_rows(start_url, self.visited), key=lambda row: row['no'])
+
 
     async def get_links(self, soup, url):
-        if url.startswith(f'{articles_url}{global_id}/article/'):
+        if url.startswith(f'{self.kb_url}/space/{self.space_id}/article/'):
             std_links = await super().get_links(soup, url)
         else:
             std_links = []
@@ -97,21 +175,35 @@ class KBWebCrawler2CSV(IWebCrawler):
                 keyname = li.get('keyname')
                 ancestorids = li.get('ancestorids')
                 if keyname and ancestorids:
-                    link_url = f"{base_url}/space/{global_id}/article/{keyname}"
+                    link_url = f"{self.kb_url}/space/{self.space_id}/article/{keyname}"
                     links.append((li, link_url))
 
         std_links.extend(links)
         return std_links
 
+    def seed_depth(self, url, start_url):
+        """
+        Адреса статей плоские (/space/<id>/article/<id>), и иерархия в них не видна: к обходу относятся
+        все статьи пространства стартовой статьи из sitemap, не встреченные в её дереве, на глубине 1.
+        При нескольких стартовых статьях одного пространства такие статьи попадают в обход каждой из них
+        (с --workers и --shared-scope global - только в один из них).
+        """
+        (start, target) = (re.search(KB_PAGE_PATTERN, start_url), re.search(KB_PAGE_PATTERN, url))
+        if not start or not target or urlparse(url).netloc != urlparse(start_url).netloc:
+            return None
+        return 1 if target.group('space') == start.group('space') else None
+
     async def process_page(self, url, filename=None, current_depth=0, check_duplicates_depth=-1):
         (content, links, images, title) = await super().process_page(url, filename, current_depth, check_duplicates_depth=check_duplicates_depth)
         if content:
-            markdown = self.html_to_markdown(content)
+            # В режиме ссылок Markdown страницы уже сохранён в page_store
+            with self.metrics.phase('html_to_markdown', url):
+                markdown = self.page_store.load(url) if self.page_store else await self.to_markdown(content)
             if markdown == 'None':
                 print(f'{url} returned None for content {content}\n')
             summary = markdown[:256] # summarise(markdown, max_length=256, min_length=64, do_sample=False),
             no = len(self.articles_data)+1
-            self.articles_data.append({
+            row = {
                 'no': no,
                 'systems': '',
                 'problem': title,
@@ -123,7 +215,10 @@ class KBWebCrawler2CSV(IWebCrawler):
                 'refs': markdown,
                 'url': url,
                 #'images': ', '.join(images)
-            })
+            }
+            self.articles_data.append(row)
+            if self.state:
+                self.state.save_row(self.crawl_id, url, row)
         return (content, links, images, title)
 
     def get_title(self, soup, url):
@@ -133,12 +228,12 @@ class KBWebCrawler2CSV(IWebCrawler):
             return title.text
         return super().get_title(soup, url)
 
-    async def crawl(self, start_url):
-        await super().crawl(start_url)
+    async def finalize_crawl(self, start_url):
         print(f"Scraping completed. {len(self.articles_data)} articles processed.")
         df = pd.DataFrame(self.articles_data)
-        isheader = not os.path.exists('./output/articles_data.csv')
-        df.to_csv('./output/articles_data.csv', index=False, mode='a', header=isheader)
+        csv_path = self.output_dir / 'articles_data.csv'
+        isheader = not csv_path.exists()
+        df.to_csv(csv_path, index=False, mode='a', header=isheader)
         #print("Data saved to ./content/articles_data.csv")
         #print("Images saved to ./content/images/")
 
@@ -151,7 +246,84 @@ load_dotenv(os.path.join(documents_path, 'gv.env'))
 USERNAME = '7810155'
 PASSWORD = os.environ.get('IL_PWD')
 
-async def main():
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--resume', action='store_true', help='Продолжить прерванный обход с последней контрольной точки')
+    parser.add_argument('--state', help='Файл состояния обхода, чтобы обход можно было продолжить (с --resume по умолчанию ./output/crawl_state.sqlite); без --state и --resume состояние не сохраняется')
+    parser.add_argument('--revalidation', default='./output/revalidation.sqlite', help='Файл валидаторов для инкрементального обхода')
+    parser.add_argument('--link-mode', choices=['inline', 'reference'], default='inline', help='Встраивать контент дочерних статей или хранить каждую статью один раз со ссылками')
+    parser.add_argument('--report', default='./output/recrawl_report.json', help='Отчёт new/changed/unchanged/removed')
+    parser.add_argument('--seen-backend', choices=['set', 'digest', 'bloom'], default='set', help='Хранение посещённых URL и хешей дубликатов: set, массив 64-битных хешей или фильтр Блума')
+    parser.add_argument('--seen-error-rate', type=float, default=0.001, help='Вероятность ложного срабатывания фильтра Блума')
+    parser.add_argument('--discovery', action='store_true', help='Соблюдать robots.txt и обходить статьи пространства стартовой статьи из sitemap.xml')
+    parser.add_argument('--output', default='./output', help='Каталог результатов')
+    parser.add_argument('--workers', type=int, default=1, help='Количество процессов-воркеров, каждый со своим браузером')
+    parser.add_argument('--shared', default='./output/shared.sqlite', help='Общая очередь и множества посещённых страниц для воркеров')
+    parser.add_argument('--metrics', action='store_true', help='Писать время фаз обработки страниц в metrics.jsonl и metrics.prom в каталоге результатов')
+    parser.add_argument('--markdown-engine', choices=['html2text', 'markdownify'], default='html2text', help='Конвертер HTML -> Markdown')
+    parser.add_argument('--markdown-workers', type=int, default=2, help='Процессов для конвертации в Markdown (0 - в основном потоке)')
+    parser.add_argument('--markdown-queue', type=int, default=8, help='Страниц, ожидающих конвертации и записи, пока обход продолжается (0 - без очереди)')
+    parser.add_argument('--parse-workers', type=int, default=2, help='Потоков для разбора HTML (0 - в основном потоке)')
+    parser.add_argument('--prefetch', type=int, default=0, help='Страниц, загружаемых заранее при обходе в одной вкладке')
+    parser.add_argument('--headless', action='store_true', help='Запускать браузер без окна')
+    parser.add_argument('--recycle-after', type=int, default=200, help='Заменять вкладку новой после стольких загрузок (0 - не заменять)')
+    parser.add_argument('--max-browser-rss', type=int, default=None, help='Пересоздавать контекст браузера, если его процессы заняли больше стольких МБ (нужен psutil)')
+    parser.add_argument('--session', default='./output/session.json', help='Файл состояния авторизации (cookies и localStorage) для следующих запусков')
+    parser.add_argument('--session-max-age', type=float, default=12, help='Сохранённая сессия старше стольких часов не используется')
+    parser.add_argument('--capture', action='store_true', help='Строить статьи из ответов API, записанных при рендеринге, а затем запрашивать API без рендеринга')
+    parser.add_argument('--fsync', choices=['never', 'close', 'flush'], default='close', help='Когда сбрасывать файлы результата на диск: never, close - при закрытии, flush - после каждой записи пакета')
+    parser.add_argument('--shared-scope', choices=['crawl', 'global'], default='crawl', help='Повторы отсеиваются в пределах стартового URL или по всему запуску')
+    args = parser.parse_args()
+    if args.resume and args.state is None:
+        args.state = './output/crawl_state.sqlite'
+    return args
+
+def get_start_urls():
+    start_urls = [
+        #FAQ
+        'https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/e7a19a56-d067-4023-b259-94284ec4e16b',
+        'https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/a1038bbc-e5d9-4b5a-9482-2739c19cb6cb',
+        'https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/3fdb4f97-2246-4b9e-b477-e9d7d8a2eb86',
+        'https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/dd64ab73-50ea-4d48-83f0-8dcef88512cb',
+        # Инструкции ОИТ
+        "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/af494df7-9560-4cb8-96d4-5b577dd4422e",
+        "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/508e24c5-aa23-419d-9251-69a2bf096706",
+        "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/bb0c7555-f7b3-48a0-9fa1-f3708842ca1a",
+        "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/0ccc2abb-b7cd-44c5-bddb-91e055e545cd",
+        "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/26df2ad9-29b3-4ec9-82b4-fd21fcd14dec",
+        # Пользовательские инструкции
+        "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/602810e3-eb3c-47b8-bbfe-44be5c33566b",
+        "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/4f81f5fe-cd15-492f-8aa0-66b3e4313a85",
+        "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/7c72943d-3f2d-41f9-a1ec-db027880d615",
+        "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/8e30fae5-f94f-4efd-a633-997a19cd891c",
+        "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/3b04ba0f-e24d-4ff6-ba59-60b869b67b16",
+        "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/916983d3-f0e5-48f0-a1ab-4ec104035963",
+        "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/3edc1530-3fbe-4a9e-8ea2-6876a2a63683",
+        # Новый запрос от Кубатина
+        "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/e7a19a56-d067-4023-b259-94284ec4e16b",
+        "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/a1038bbc-e5d9-4b5a-9482-2739c19cb6cb", 
+        "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/dd64ab73-50ea-4d48-83f0-8dcef88512cb", 
+        "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/25eef990-b807-4b13-90e7-68ecadfe7a57", 
+        "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/e834824e-b9bc-42fb-b9a2-95d2b1b3a125", 
+        "https://kb.ileasing.ru/space/a100,dc8d-3af0-418c-8634-f09f1fdb06f2/article/3fdb4f97-2246-4b9e-b477-e9d7d8a2eb86",
+    ]
+
+    start_urls = [
+        # Инструкции к информационным системам
+        "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/7dcde763-e277-40c3-b92a-33d9c92cac96"
+        ,""
+    ]
+    return start_urls
+
+async def crawl(args, next_start_url, output_dir='./output', images_dir='images', shared_store=None, report_path=None):
+    """
+    Обходит стартовые URL, которые возвращает next_start_url(), пока она не вернёт None.
+    """
+    # В воркерах состояние общее и очищается запускающим процессом
+    state = CrawlStateStore(args.state, resume=args.resume or shared_store is not None) if args.state else None
+    # kb.ileasing.ru - SPA: сырой HTML одинаков для всех статей, поэтому сравниваем только очищенный контент
+    revalidation = RevalidationStore(args.revalidation, trust_raw_digest=False)
+    metrics = CrawlMetrics(Path(output_dir) / 'metrics.jsonl', Path(output_dir) / 'metrics.prom') if args.metrics else None
     # Задайте ваш стартовый URL
     start_url = "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/af494df7-9560-4cb8-96d4-5b577dd4422e"
     #start_url = "https://quotes.toscrape.com/page/1/"
@@ -163,12 +335,26 @@ async def main():
     }
 
     # Инициализация retriever без логина
-    async with KBHTMLRetriever(base_url=start_url, login_url=login_url, login_credentials=login_credentials) as retriever:
+    async with KBHTMLRetriever(base_url=start_url, login_url=login_url, login_credentials=login_credentials, pages_count=4, revalidation=revalidation, resource_filter=ResourceFilter(), parser='lxml', scheduler=PolitenessScheduler(), metrics=metrics, parse_workers=args.parse_workers, headless=args.headless, recycle_after=args.recycle_after, max_browser_rss=args.max_browser_rss, session=SessionStore(args.session, max_age=args.session_max_age * 3600), network_capture=NetworkCapture(KB_CAPTURE_ENDPOINTS, KB_PAGE_PATTERN) if args.capture else None) as retriever:
         # Если требуется логин, раскомментируйте следующие строки:
-        if await retriever.login():
+        if await retriever.authenticate():
             #allowed_domains = ['kb.ileasing.ru']
             crawler = KBWebCrawler2CSV(
                 retriever,
+                output_dir=output_dir,
+                images_dir=images_dir,
+                state=state,
+                shared_store=shared_store,
+                shared_scope=args.shared_scope,
+                link_mode=args.link_mode,
+                seen_backend=args.seen_backend,
+                seen_options={'error_rate': args.seen_error_rate} if args.seen_backend == 'bloom' else None,
+                discovery=SiteDiscovery(retriever) if args.discovery else None,
+                markdown_engine=args.markdown_engine,
+                markdown_workers=args.markdown_workers,
+                markdown_queue=args.markdown_queue,
+                prefetch=args.prefetch,
+                sink_options={'fsync': args.fsync},
                 #duplicate_tags=['div', 'p', 'table'],
                 #duplicate_tags=[],
                 no_images=False,
@@ -177,44 +363,65 @@ async def main():
                 #navigation_classes=['side_categories', 'pager'],  # Ваши навигационные классы
                 #ignored_classes = ['footer', 'row header-box', 'breadcrumb', 'header container-fluid', 'icon-star', 'image_container']
             )
-            start_urls = [
-                #FAQ
-                'https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/e7a19a56-d067-4023-b259-94284ec4e16b',
-                'https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/a1038bbc-e5d9-4b5a-9482-2739c19cb6cb',
-                'https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/3fdb4f97-2246-4b9e-b477-e9d7d8a2eb86',
-                'https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/dd64ab73-50ea-4d48-83f0-8dcef88512cb',
-                # Инструкции ОИТ
-                "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/af494df7-9560-4cb8-96d4-5b577dd4422e",
-                "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/508e24c5-aa23-419d-9251-69a2bf096706",
-                "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/bb0c7555-f7b3-48a0-9fa1-f3708842ca1a",
-                "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/0ccc2abb-b7cd-44c5-bddb-91e055e545cd",
-                "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/26df2ad9-29b3-4ec9-82b4-fd21fcd14dec",
-                # Пользовательские инструкции
-                "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/602810e3-eb3c-47b8-bbfe-44be5c33566b",
-                "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/4f81f5fe-cd15-492f-8aa0-66b3e4313a85",
-                "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/7c72943d-3f2d-41f9-a1ec-db027880d615",
-                "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/8e30fae5-f94f-4efd-a633-997a19cd891c",
-                "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/3b04ba0f-e24d-4ff6-ba59-60b869b67b16",
-                "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/916983d3-f0e5-48f0-a1ab-4ec104035963",
-                "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/3edc1530-3fbe-4a9e-8ea2-6876a2a63683",
-                # Новый запрос от Кубатина
-                "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/e7a19a56-d067-4023-b259-94284ec4e16b",
-                "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/a1038bbc-e5d9-4b5a-9482-2739c19cb6cb", 
-                "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/dd64ab73-50ea-4d48-83f0-8dcef88512cb", 
-                "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/25eef990-b807-4b13-90e7-68ecadfe7a57", 
-                "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/e834824e-b9bc-42fb-b9a2-95d2b1b3a125", 
-                "https://kb.ileasing.ru/space/a100,dc8d-3af0-418c-8634-f09f1fdb06f2/article/3fdb4f97-2246-4b9e-b477-e9d7d8a2eb86",
-            ]
-
-            start_urls = [
-                # Инструкции к информационным системам
-                "https://kb.ileasing.ru/space/a100dc8d-3af0-418c-8634-f09f1fdb06f2/article/7dcde763-e277-40c3-b92a-33d9c92cac96"
-                ,""
-            ]
-
-            for start_url in start_urls:
+            while (start_url := next_start_url()) is not None:
                 crawler.initialize()
                 await crawler.crawl(start_url)
+                if shared_store:
+                    shared_store.finish_task(start_url)
+            crawler.close()
+    if state:
+        state.close()
+    revalidation.write_report(report_path or args.report)
+    revalidation.close()
+    if metrics:
+        metrics.close()
+
+
+def run_worker(worker, args):
+    """
+    Процесс-воркер: забирает стартовые URL из общей очереди и пишет результаты в свой каталог.
+    """
+    output_dir = Path(args.output) / 'workers' / f'worker-{worker}'
+    shared_store = SharedCrawlStore(args.shared, worker=worker)
+    try:
+        asyncio.run(crawl(
+            args,
+            shared_store.next_task,
+            output_dir=output_dir,
+            # Хранилище изображений контентно-адресуемое и общее для всех воркеров
+            images_dir=Path(args.output).resolve() / 'images',
+            shared_store=shared_store,
+            report_path=output_dir / 'recrawl_report.json',
+        ))
+    finally:
+        shared_store.close()
+
+
+def main():
+    args = parse_args()
+    if args.workers <= 1:
+        start_urls = iter(get_start_urls())
+        asyncio.run(crawl(args, lambda: next(start_urls, None), output_dir=args.output))
+        return
+
+    shared_store = SharedCrawlStore(args.shared)
+    workers_dir = Path(args.output) / 'workers'
+    if not args.resume:
+        shared_store.reset()
+        if args.state:
+            CrawlStateStore(args.state).close()
+        shutil.rmtree(workers_dir, ignore_errors=True)
+    shared_store.add_tasks(get_start_urls(), resume=args.resume)
+    shared_store.close()
+
+    run_workers(run_worker, args.workers, (args,))
+    merge_outputs(
+        [workers_dir / f'worker-{worker}' for worker in range(args.workers)],
+        args.output,
+        csv_names=['articles_data.csv'],
+        report_name='recrawl_report.json',
+        report_path=args.report,
+    )
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()
@@ -5,7 +5,7 @@ async def main():
     # Задайте ваш стартовый URL
     start_url = "https://plantpad.samlab.cn/diseases_type.html?type=fungus&disease=black_spot_mixed_with_net_blotch"
 
-    async with IHTMLRetriever(base_url=start_url) as retriever:
+    async with IHTMLRetriever(base_url=start_url, static_first=True) as retriever:
         crawler = IWebCrawler(
             retriever,
             duplicate_tags=['div', 'p', 'table'],
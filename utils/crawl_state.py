@@ -0,0 +1,195 @@
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS crawls (
+    crawl TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    crawl TEXT NOT NULL,
+    url TEXT NOT NULL,
+    status TEXT NOT NULL,
+    parent TEXT,
+    content TEXT,
+    links TEXT,
+    images TEXT,
+    title TEXT,
+    navigation TEXT,
+    PRIMARY KEY (crawl, url)
+);
+CREATE TABLE IF NOT EXISTS hashes (
+    crawl TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    url TEXT NOT NULL,
+    PRIMARY KEY (crawl, kind, hash)
+);
+CREATE TABLE IF NOT EXISTS rows (
+    crawl TEXT NOT NULL,
+    url TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (crawl, url)
+);
+"""
+
+
+class CrawlStateStore:
+    """
+    Хранилище состояния обхода на диске (SQLite в режиме WAL).
+    Сохраняет фронтир (начатые страницы), обработанные страницы с их собственным контентом
+    (встроенные дочерние страницы хранятся отдельно и связаны через parent) и ссылками навигационных элементов,
+    хеши дубликатов и уже сформированные строки, чтобы прерванный обход можно было продолжить
+    без повторной загрузки завершённых страниц.
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.resume = resume
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(pages)")}
+        if 'navigation' not in columns:
+            self.conn.execute("ALTER TABLE pages ADD COLUMN navigation TEXT")
+        if not resume:
+            self.reset()
+
+    def reset(self):
+        with self.conn:
+            for table in ('crawls', 'pages', 'hashes', 'rows'):
+                self.conn.execute(f"DELETE FROM {table}")
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def is_crawl_done(self, crawl):
+        row = self.conn.execute("SELECT status FROM crawls WHERE crawl = ?", (crawl,)).fetchone()
+        return bool(row) and row[0] == 'done'
+
+    def start_crawl(self, crawl):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO crawls (crawl, status, started_at) VALUES (?, 'started', ?) "
+                "ON CONFLICT(crawl) DO NOTHING",
+                (crawl, time.time()),
+            )
+
+    def finish_crawl(self, crawl):
+        with self.conn:
+            self.conn.execute(
+                "UPDATE crawls SET status = 'done', finished_at = ? WHERE crawl = ?",
+                (time.time(), crawl),
+            )
+
+    def page_started(self, crawl, url, parent=None):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO pages (crawl, url, status, parent) VALUES (?, ?, 'started', ?) "
+                "ON CONFLICT(crawl, url) DO NOTHING",
+                (crawl, url, parent),
+            )
+
+    def page_done(self, crawl, url, content, links, images, title, navigation=None):
+        with self.conn:
+            self.conn.execute(
+                "UPDATE pages SET status = 'done', content = ?, links = ?, images = ?, title = ?, navigation = ? "
+                "WHERE crawl = ? AND url = ?",
+                (content, json.dumps(links), json.dumps(images), title, json.dumps(navigation or []), crawl, url),
+            )
+
+    def get_page(self, crawl, url):
+        """
+        Возвращает (content, links, images, title) для завершённой страницы или None.
+        """
+        row = self.conn.execute(
+            "SELECT content, links, images, title FROM pages WHERE crawl = ? AND url = ? AND status = 'done'",
+            (crawl, url),
+        ).fetchone()
+        if not row:
+            return None
+        return (row[0], json.loads(row[1] or '[]'), json.loads(row[2] or '[]'), row[3])
+
+    def get_navigation(self, crawl, url):
+        """
+        Ссылки навигационных элементов завершённой страницы [(href, URL)] - чтобы при продолжении
+        обхода пройти их снова: навигационные элементы удаляются из сохраняемого контента.
+        """
+        row = self.conn.execute(
+            "SELECT navigation FROM pages WHERE crawl = ? AND url = ? AND status = 'done'", (crawl, url)
+        ).fetchone()
+        return [tuple(target) for target in json.loads(row[0] or '[]')] if row else []
+
+    def load_children(self, crawl, url):
+        """
+        Завершённые страницы, контент которых был встроен в страницу url.
+        """
+        rows = self.conn.execute(
+            "SELECT url FROM pages WHERE crawl = ? AND parent = ? AND status = 'done'",
+            (crawl, url),
+        )
+        return {row[0] for row in rows}
+
+    def add_hash(self, crawl, kind, hash_value, url):
+        self.conn.execute(
+            "INSERT OR IGNORE INTO hashes (crawl, kind, hash, url) VALUES (?, ?, ?, ?)",
+            (crawl, kind, hash_value, url),
+        )
+
+    def save_row(self, crawl, url, data):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO rows (crawl, url, data) VALUES (?, ?, ?)",
+                (crawl, url, json.dumps(data, ensure_ascii=False, default=str)),
+            )
+
+    def load_visited(self, crawl):
+        """
+        Страницы, контент которых уже встроен в другую завершённую страницу.
+        Завершённые страницы без завершённого родителя сюда не попадают: они будут
+        взяты из кэша при повторном запросе.
+        """
+        rows = self.conn.execute(
+            "SELECT p.url FROM pages p JOIN pages parent "
+            "ON parent.crawl = p.crawl AND parent.url = p.parent "
+            "WHERE p.crawl = ? AND p.status = 'done' AND parent.status = 'done'",
+            (crawl,),
+        )
+        return (row[0] for row in rows)
+
+    def load_hashes(self, crawl, kind):
+        """
+        Хеши, добавленные завершёнными страницами.
+        Хеши незавершённых страниц отбрасываются, иначе при повторной загрузке страница
+        удалила бы собственные блоки как дубликаты.
+        """
+        rows = self.conn.execute(
+            "SELECT h.hash FROM hashes h JOIN pages p ON p.crawl = h.crawl AND p.url = h.url "
+            "WHERE h.crawl = ? AND h.kind = ? AND p.status = 'done'",
+            (crawl, kind),
+        )
+        return (row[0] for row in rows)
+
+    def load_rows(self, crawl, urls):
+        rows = self.conn.execute("SELECT url, data FROM rows WHERE crawl = ?", (crawl,))
+        return [json.loads(data) for url, data in rows if url in urls]
+
+    def pending_pages(self, crawl):
+        rows = self.conn.execute(
+            "SELECT url FROM pages WHERE crawl = ? AND status = 'started'", (crawl,)
+        )
+        return [row[0] for row in rows]
+
+    def log_resume(self, crawl):
+        pending = self.pending_pages(crawl)
+        if pending:
+            logging.info(f"Продолжение обхода {crawl}: {len(pending)} незавершённых страниц будут загружены заново")
@@ -0,0 +1,168 @@
+import gzip
+import logging
+import time
+from datetime import datetime, timezone
+from urllib.parse import urljoin, urlparse
+from urllib.robotparser import RobotFileParser
+from xml.etree import ElementTree
+
+
+def local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def parse_lastmod(value):
+    """
+    Дата W3C из <lastmod> в timestamp. Для даты без времени берётся конец дня:
+    страница могла измениться в любой момент этого дня.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    timestamp = parsed.timestamp()
+    if len(value) == 10:
+        timestamp += 24 * 3600
+    return timestamp
+
+
+class SiteDiscovery:
+    """
+    Получение URL без рендеринга: robots.txt (Disallow, Crawl-delay, Request-rate, Sitemap)
+    и sitemap.xml, включая вложенные sitemap index и .gz.
+    Запросы выполняются через request API контекста браузера retriever (общие cookies)
+    и его планировщик вежливости.
+    sitemap_paths - где искать sitemap, если robots.txt его не указывает.
+    """
+
+    def __init__(self, retriever, user_agent=None, max_sitemaps=100, max_urls=1_000_000, sitemap_paths=('/sitemap.xml',)):
+        self.retriever = retriever
+        self.user_agent = user_agent or retriever.user_agent
+        self.max_sitemaps = max_sitemaps
+        self.max_urls = max_urls
+        self.sitemap_paths = sitemap_paths
+        # Хост -> RobotFileParser
+        self.robots = {}
+        # URL из sitemap -> lastmod (timestamp или None)
+        self.lastmod = {}
+
+    async def fetch(self, url):
+        """
+        Возвращает (статус, тело) или (None, b'') при ошибке запроса.
+        """
+        try:
+            async with self.retriever.schedule(url) as slot:
+                response = await self.retriever.context.request.get(url, timeout=30000)
+                slot.record_response(response)
+            return (response.status, await response.body() if response.ok else b'')
+        except Exception as e:
+            logging.warning(f"Не удалось загрузить {url}: {e}")
+            return (None, b'')
+
+    async def load_robots(self, origin):
+        robots = RobotFileParser(f"{origin}/robots.txt")
+        (status, body) = await self.fetch(robots.url)
+        if status is not None and status < 400:
+            robots.parse(body.decode('utf-8', errors='replace').splitlines())
+        elif status in (401, 403):
+            # Как RobotFileParser.read: закрытый robots.txt запрещает весь сайт
+            logging.warning(f"robots.txt закрыт ({status}) для {origin}, обход запрещён")
+            robots.disallow_all = True
+        else:
+            # Как у поисковых роботов: недоступный robots.txt не запрещает обход
+            logging.info(f"robots.txt недоступен ({status}) для {origin}, ограничений нет")
+            robots.allow_all = True
+        robots.modified()
+        return robots
+
+    def parse_sitemap(self, body):
+        """
+        Возвращает (вложенные sitemap, [(url, lastmod)]).
+        """
+        if body[:2] == b'\x1f\x8b':
+            body = gzip.decompress(body)
+        if not body.lstrip().startswith(b'<'):
+            # Текстовый sitemap: по одному URL в строке
+            lines = body.decode('utf-8', errors='replace').splitlines()
+            return ([], [(line.strip(), None) for line in lines if line.strip().startswith(('http://', 'https://'))])
+        root = ElementTree.fromstring(body)
+        (sitemaps, urls) = ([], [])
+        for entry in root:
+            fields = {local_name(child.tag): (child.text or '').strip() for child in entry}
+            if not fields.get('loc'):
+                continue
+            if local_name(entry.tag) == 'sitemap':
+                sitemaps.append(fields['loc'])
+            elif local_name(entry.tag) == 'url':
+                urls.append((fields['loc'], parse_lastmod(fields.get('lastmod'))))
+        return (sitemaps, urls)
+
+    async def load_sitemaps(self, sitemaps):
+        queue = list(dict.fromkeys(sitemaps))
+        seen = set(queue)
+        loaded = 0
+        while queue and loaded < self.max_sitemaps and len(self.lastmod) < self.max_urls:
+            sitemap_url = queue.pop(0)
+            (status, body) = await self.fetch(sitemap_url)
+            loaded += 1
+            if not body:
+                logging.debug(f"Sitemap недоступен ({status}): {sitemap_url}")
+                continue
+            try:
+                (nested, urls) = self.parse_sitemap(body)
+            except (ElementTree.ParseError, OSError, EOFError) as e:
+                logging.warning(f"Не удалось разобрать sitemap {sitemap_url}: {e}")
+                continue
+            for nested_url in nested:
+                nested_url = urljoin(sitemap_url, nested_url)
+                if nested_url not in seen:
+                    seen.add(nested_url)
+                    queue.append(nested_url)
+            for (url, lastmod) in urls[:self.max_urls - len(self.lastmod)]:
+                self.lastmod[url] = lastmod
+            logging.info(f"Sitemap {sitemap_url}: {len(urls)} URL, вложенных {len(nested)}")
+
+    async def discover(self, url):
+        """
+        Читает robots.txt и sitemap хоста url (один раз на хост).
+        """
+        parsed = urlparse(url)
+        if parsed.netloc in self.robots:
+            return
+        origin = f"{parsed.scheme}://{parsed.netloc}"
+        started = time.monotonic()
+        robots = await self.load_robots(origin)
+        self.robots[parsed.netloc] = robots
+        sitemaps = robots.site_maps() or [f"{origin}{path}" for path in self.sitemap_paths]
+        await self.load_sitemaps(sitemaps)
+        logging.info(
+            f"Обнаружение для {origin}: {len(self.lastmod)} URL из sitemap, "
+            f"crawl-delay {self.crawl_delay(url)}, {time.monotonic() - started:.2f} с"
+        )
+
+    def can_fetch(self, url):
+        robots = self.robots.get(urlparse(url).netloc)
+        return robots is None or robots.can_fetch(self.user_agent, url)
+
+    def crawl_delay(self, url):
+        """
+        Минимальный интервал между запросами к хосту url в секундах (Crawl-delay или Request-rate).
+        """
+        robots = self.robots.get(urlparse(url).netloc)
+        if robots is None:
+            return None
+        if (rate := robots.request_rate(self.user_agent)) and rate.requests:
+            return rate.seconds / rate.requests
+        delay = robots.crawl_delay(self.user_agent)
+        return float(delay) if delay else None
+
+    def seeds(self):
+        """
+        URL из sitemap, сначала недавно изменённые, затем без lastmod.
+        """
+        return sorted(self.lastmod.items(), key=lambda item: -(item[1] or 0))
@@ -0,0 +1,147 @@
+import logging
+import re
+from functools import lru_cache
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+
+# Правила приведения URL к каноническому виду
+DEFAULT_CANONICALIZATION = {
+    # Отбрасывать #фрагмент: он не меняет загружаемую страницу
+    'strip_fragment': True,
+    # Схема и хост в нижнем регистре, без порта по умолчанию (:80 для http, :443 для https)
+    'normalize_host': True,
+    # 'keep' - не менять путь, 'strip' - /a/ и /a считаются одной страницей. Канонический URL
+    # и загружается, поэтому 'strip' подходит только сайтам, которые отдают /a и /a/ одинаково
+    # (иначе 404 или лишнее перенаправление на серверах с каталогами вида /a/)
+    'trailing_slash': 'keep',
+    # 'sort' - упорядочить параметры запроса, 'drop' - отбросить запрос целиком, 'keep' - не менять
+    'query': 'sort',
+    # Регулярные выражения имён параметров, которые удаляются из запроса (метки рекламных кампаний и т.п.)
+    'drop_params': [r'utm_\w+', r'fbclid', r'gclid', r'yclid', r'_openstat'],
+}
+
+DEFAULT_PORTS = {'http': ':80', 'https': ':443'}
+
+
+class Frontier:
+    """
+    Допуск ссылок во фронтир обхода: приводит URL к каноническому виду, проверяет,
+    что хост входит в область обхода, и отсеивает уже посещённые или запланированные страницы.
+    allowed_domains - хосты помимо хоста base_url; запись вида '*.example.com' разрешает поддомены.
+    rules - переопределение правил DEFAULT_CANONICALIZATION.
+    """
+
+    def __init__(self, base_url, allowed_domains=None, rules=None, cache_size=65536):
+        self.rules = {**DEFAULT_CANONICALIZATION, **(rules or {})}
+        if self.rules['trailing_slash'] not in ('strip', 'keep'):
+            raise ValueError(f"Неизвестное правило trailing_slash: {self.rules['trailing_slash']}")
+        if self.rules['query'] not in ('sort', 'drop', 'keep'):
+            raise ValueError(f"Неизвестное правило query: {self.rules['query']}")
+        patterns = self.rules['drop_params']
+        self.drop_params = re.compile('|'.join(f'(?:{p})' for p in patterns)) if patterns else None
+
+        base = urlsplit(base_url)
+        self.base_netloc = self.normalize_netloc(base.netloc, base.scheme.lower())
+        # Область обхода проверяется один раз на канонический URL: точные хосты - по множеству,
+        # маски поддоменов - одним регулярным выражением
+        domains = [self.base_netloc] + [domain.lower() for domain in allowed_domains or []]
+        self.scope_hosts = frozenset(domain for domain in domains if not domain.startswith(('*.', '.')))
+        wildcards = [re.escape(domain.lstrip('*.')) for domain in domains if domain.startswith(('*.', '.'))]
+        self.scope_pattern = re.compile(rf'(?:[^/]+\.)?(?:{"|".join(wildcards)})') if wildcards else None
+
+        # Ссылки навигации и шаблона страниц повторяются на каждой странице, поэтому результат кешируется
+        self.resolve = lru_cache(maxsize=cache_size)(self.resolve_uncached)
+        self.stats = {'links': 0, 'out_of_scope': 0, 'disallowed': 0, 'duplicates': 0, 'canonical_duplicates': 0, 'admitted': 0}
+        # Правила robots.txt (SiteDiscovery), если они загружены
+        self.robots = None
+
+    def normalize_netloc(self, netloc, scheme):
+        if not self.rules['normalize_host']:
+            return netloc
+        (userinfo, at, hostport) = netloc.rpartition('@')
+        hostport = hostport.lower()
+        default_port = DEFAULT_PORTS.get(scheme)
+        if default_port and hostport.endswith(default_port):
+            hostport = hostport[:-len(default_port)]
+        return f"{userinfo}{at}{hostport}"
+
+    def normalize_query(self, query):
+        if not query or self.rules['query'] == 'drop':
+            return ''
+        if self.rules['query'] == 'keep' and not self.drop_params:
+            return query
+        pairs = parse_qsl(query, keep_blank_values=True)
+        if self.drop_params:
+            filtered = [(name, value) for (name, value) in pairs if not self.drop_params.fullmatch(name)]
+            if len(filtered) == len(pairs) and self.rules['query'] == 'keep':
+                return query
+            pairs = filtered
+        if self.rules['query'] == 'sort':
+            pairs.sort()
+        return urlencode(pairs)
+
+    def resolve_uncached(self, url):
+        """
+        Возвращает (канонический URL, входит ли он в область обхода) или (None, False)
+        для ссылок, которые не являются страницами (mailto:, javascript:, некорректные URL).
+        """
+        try:
+            parts = urlsplit(url.strip())
+        except ValueError:
+            return (None, False)
+        scheme = parts.scheme.lower()
+        if scheme not in ('http', 'https') or not parts.netloc:
+            return (None, False)
+        netloc = self.normalize_netloc(parts.netloc, scheme)
+        path = parts.path or '/'
+        if self.rules['trailing_slash'] == 'strip' and len(path) > 1:
+            path = path.rstrip('/') or '/'
+        query = self.normalize_query(parts.query)
+        fragment = '' if self.rules['strip_fragment'] else parts.fragment
+        canonical = urlunsplit((scheme, netloc, path, query, fragment))
+        return (canonical, self.in_scope(netloc))
+
+    def in_scope(self, netloc):
+        if netloc in self.scope_hosts:
+            return True
+        return bool(self.scope_pattern and self.scope_pattern.fullmatch(netloc))
+
+    def canonicalize(self, url):
+        return self.resolve(url)[0]
+
+    def allowed(self, url):
+        return self.robots is None or self.robots.can_fetch(url)
+
+    def admit(self, link_url, page_url, visited, scheduled=()):
+        """
+        Решает, нужно ли загружать ссылку со страницы page_url.
+        Возвращает канонический URL или None, если ссылка вне области обхода, ведёт на ту же страницу
+        или уже посещена / запланирована (visited и scheduled содержат канонические URL).
+        """
+        self.stats['links'] += 1
+        (canonical, in_scope) = self.resolve(link_url)
+        if not in_scope:
+            self.stats['out_of_scope'] += 1
+            return None
+        if not self.allowed(canonical):
+            self.stats['disallowed'] += 1
+            return None
+        if canonical == page_url or canonical in visited or canonical in scheduled:
+            self.stats['duplicates'] += 1
+            if canonical != link_url:
+                # Без канонизации эта ссылка была бы загружена как отдельная страница
+                self.stats['canonical_duplicates'] += 1
+            return None
+        self.stats['admitted'] += 1
+        return canonical
+
+    def report(self):
+        stats = self.stats
+        logging.info(
+            f"Фронтир: ссылок {stats['links']}, допущено {stats['admitted']}, вне области {stats['out_of_scope']}, "
+            f"запрещено robots.txt {stats['disallowed']}, "
+            f"повторов {stats['duplicates']}, "
+            f"избежано загрузок благодаря канонизации {stats['canonical_duplicates']}, "
+            f"кеш URL: {self.resolve.cache_info().hits} попаданий"
+        )
+        return stats
@@ -0,0 +1,301 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import sqlite3
+import time
+from urllib.parse import urlparse
+
+import aiofiles
+
+from utils.metrics import NullMetrics
+
+IMAGE_CONTENT_TYPES = ['image/jpeg', 'image/png', 'image/gif', 'image/webp']
+# Статусы, при которых имеет смысл повторить загрузку
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+IMAGE_STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    object TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL
+);
+CREATE TABLE IF NOT EXISTS names (
+    name TEXT PRIMARY KEY,
+    object TEXT NOT NULL
+);
+"""
+
+
+def image_extension(img_url, content_type=''):
+    """
+    Расширение файла изображения: из URL, а если в URL его нет - из Content-Type ответа.
+    """
+    ext = os.path.splitext(urlparse(img_url).path)[1]
+    if not ext and '/' in content_type:
+        ext = '.' + content_type.split(';')[0].strip().split('/')[1]
+    return ext
+
+
+def get_image_filename(img_url):
+    """
+    Имя файла изображения определяется по URL, поэтому известно до загрузки. Если в URL нет расширения,
+    имя остаётся без него: тип станет известен только из ответа, и расширение по Content-Type
+    получит файл объекта в хранилище (manifest.json сопоставляет имя с ним).
+    """
+    parsed = urlparse(img_url)
+    ext = os.path.splitext(parsed.path)[1]
+    img_name = re.sub(r'[\\/*?:"<>|]', "_", os.path.splitext(parsed.path.strip("/"))[0].replace("/", "_")) or "image"
+    url_hash = hashlib.md5(img_url.encode('utf-8')).hexdigest()[:16]
+    return f"{img_name}_{url_hash}{ext}"
+
+
+class ImageStore:
+    """
+    Контентно-адресуемое хранилище изображений.
+    Байты хранятся один раз в objects/<md5><ext>, постоянный индекс URL -> объект (index.sqlite)
+    позволяет не загружать известный URL повторно в течение freshness секунд, в том числе между запусками.
+    Имена файлов из markdown (##IMAGE##, local_image_paths) сопоставляются объектам в manifest.json.
+    revalidate - по истечении freshness проверять изображение условным запросом (ETag / Last-Modified).
+    """
+
+    def __init__(self, images_dir, freshness=7 * 24 * 3600, revalidate=True):
+        self.images_dir = images_dir
+        self.objects_dir = images_dir / 'objects'
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.freshness = freshness
+        self.revalidate = revalidate
+        self.conn = sqlite3.connect(images_dir / 'index.sqlite', timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(IMAGE_STORE_SCHEMA)
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def lookup(self, img_url):
+        row = self.conn.execute(
+            "SELECT object, etag, last_modified, fetched_at FROM urls WHERE url = ?", (img_url,)
+        ).fetchone()
+        if not row:
+            return None
+        return dict(zip(('object', 'etag', 'last_modified', 'fetched_at'), row))
+
+    def is_fresh(self, entry):
+        return entry is not None and time.time() - entry['fetched_at'] < self.freshness \
+            and (self.objects_dir / entry['object']).exists()
+
+    def conditional_headers(self, entry):
+        if not self.revalidate or entry is None or not (self.objects_dir / entry['object']).exists():
+            return {}
+        headers = {}
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def touch(self, img_url):
+        with self.conn:
+            self.conn.execute("UPDATE urls SET fetched_at = ? WHERE url = ?", (time.time(), img_url))
+
+    def link_name(self, img_filename, object_name):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO names (name, object) VALUES (?, ?)", (img_filename, object_name)
+            )
+
+    def put(self, img_url, img_bytes, ext, etag='', last_modified=''):
+        """
+        Сохраняет байты (если такого содержимого ещё нет) и запоминает URL. Возвращает имя объекта.
+        """
+        object_name = f"{hashlib.md5(img_bytes).hexdigest()}{ext}"
+        object_path = self.objects_dir / object_name
+        if not object_path.exists():
+            # Запись через временный файл: хранилище может быть общим для нескольких процессов
+            tmp_path = object_path.with_name(f"{object_path.name}.{os.getpid()}.tmp")
+            tmp_path.write_bytes(img_bytes)
+            os.replace(tmp_path, object_path)
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO urls (url, object, etag, last_modified, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (img_url, object_name, etag, last_modified, time.time()),
+            )
+        return object_name
+
+    def write_manifest(self):
+        manifest = {name: f"objects/{object_name}" for name, object_name in self.conn.execute("SELECT name, object FROM names")}
+        # Через временный файл: каталог изображений может быть общим для воркеров, и читающий
+        # не должен увидеть наполовину записанный manifest.json
+        manifest_path = self.images_dir / 'manifest.json'
+        tmp_path = manifest_path.with_name(f"{manifest_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, manifest_path)
+        return manifest
+
+
+class ImageDownloader:
+    """
+    Фоновая загрузка изображений пулом воркеров через request API контекста браузера
+    (общие cookies сессии). Не блокирует обработку HTML: имя файла возвращается сразу,
+    а байты загружаются асинхронно с экспоненциальной задержкой между попытками.
+    """
+
+    def __init__(self, retriever, images_dir, workers=4, retries=3, base_delay=1.0, max_delay=30.0, store=None, metrics=None):
+        self.retriever = retriever
+        self.images_dir = images_dir
+        self.store = store
+        self.metrics = metrics or NullMetrics()
+        self.workers_count = workers
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.queue = None
+        self.workers = []
+        # URL -> имя файла для уже поставленных в очередь изображений
+        self.submitted = {}
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.workers = [asyncio.create_task(self.worker()) for _ in range(self.workers_count)]
+
+    def submit(self, img_url):
+        """
+        Ставит изображение в очередь загрузки и возвращает имя файла.
+        """
+        if img_url in self.submitted:
+            return self.submitted[img_url]
+        if self.queue is None:
+            self.start()
+        img_filename = get_image_filename(img_url)
+        self.submitted[img_url] = img_filename
+        if self.store:
+            entry = self.store.lookup(img_url)
+            if self.store.is_fresh(entry):
+                logging.debug(f"Изображение уже в хранилище: {img_url}")
+                self.store.link_name(img_filename, entry['object'])
+                return img_filename
+        self.queue.put_nowait((img_url, img_filename))
+        return img_filename
+
+    async def join(self):
+        """
+        Дожидается загрузки всех изображений из очереди и останавливает воркеры.
+        """
+        if self.queue is None:
+            return
+        await self.queue.join()
+        await self.stop()
+
+    async def cancel(self):
+        """
+        Останавливает воркеры, не дожидаясь очереди (при прерванном обходе). Изображения, загрузка
+        которых не началась, будут поставлены в очередь заново при следующей встрече.
+        """
+        if self.queue is None:
+            return
+        while not self.queue.empty():
+            (img_url, _) = self.queue.get_nowait()
+            self.submitted.pop(img_url, None)
+            self.queue.task_done()
+        await self.stop()
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        if self.store:
+            self.store.write_manifest()
+        self.queue = None
+        self.workers = []
+
+    def close(self):
+        """
+        Закрывает хранилище изображений после всех обходов.
+        """
+        if self.store:
+            self.store.close()
+            self.store = None
+
+    async def worker(self):
+        while True:
+            (img_url, img_filename) = await self.queue.get()
+            try:
+                # Загрузка идёт в фоне и не относится к конкретной странице: учитывается только в суммах запуска
+                with self.metrics.phase('image_download'):
+                    downloaded = await self.download(img_url, img_filename)
+                self.metrics.count('images_downloaded' if downloaded else 'images_failed')
+            except Exception as e:
+                logging.error(f"Ошибка при сохранении изображения {img_url}: {e}")
+                self.metrics.count('images_failed')
+            finally:
+                self.queue.task_done()
+
+    def get_delay(self, attempt):
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay * (0.5 + random.random())
+
+    async def fetch(self, img_url, headers=None):
+        """
+        Загружает изображение. Возвращает (bytes, headers), (None, headers) для ответа 304
+        или None, если повторять бессмысленно.
+        """
+        for attempt in range(1, self.retries + 1):
+            try:
+                async with self.retriever.schedule(img_url) as slot:
+                    response = await self.retriever.context.request.get(img_url, headers=headers or {}, timeout=10000)  # Таймаут 10 секунд
+                    slot.record_response(response)
+                if response.status == 304:
+                    return (None, response.headers)
+                if response.ok:
+                    content_type = response.headers.get('content-type', '').lower()
+                    if all(ct not in content_type for ct in IMAGE_CONTENT_TYPES):
+                        logging.warning(f"Пропуск не-изображения: {img_url}")
+                        return None
+                    return (await response.body(), response.headers)
+                if response.status not in RETRY_STATUSES:
+                    logging.warning(f"Не удалось скачать изображение: {img_url}, статус {response.status}")
+                    return None
+                logging.error(f"Попытка {attempt} - статус {response.status} для изображения {img_url}")
+            except Exception as e:
+                logging.error(f"Попытка {attempt} - Ошибка при сохранении изображения {img_url}: {e}")
+            if attempt < self.retries:
+                delay = self.get_delay(attempt)
+                logging.info(f"Повтор через {delay:.1f} секунд...")
+                await asyncio.sleep(delay)
+        logging.error(f"Не удалось сохранить изображение после {self.retries} попыток: {img_url}")
+        return None
+
+    async def download(self, img_url, img_filename):
+        if self.store is None:
+            result = await self.fetch(img_url)
+            if result is None or result[0] is None:
+                return False
+            if not os.path.splitext(img_filename)[1]:
+                img_filename += image_extension(img_url, result[1].get('content-type', ''))
+            async with aiofiles.open(self.images_dir / img_filename, 'wb') as f:
+                await f.write(result[0])
+            logging.info(f"Сохранено изображение: {img_filename}")
+            return True
+
+        entry = self.store.lookup(img_url)
+        result = await self.fetch(img_url, self.store.conditional_headers(entry))
+        if result is None:
+            return False
+        (img_bytes, headers) = result
+        if img_bytes is None:
+            logging.debug(f"Изображение не изменилось (304): {img_url}")
+            self.store.touch(img_url)
+            object_name = entry['object']
+        else:
+            ext = image_extension(img_url, headers.get('content-type', ''))
+            object_name = self.store.put(img_url, img_bytes, ext, headers.get('etag', ''), headers.get('last-modified', ''))
+            logging.info(f"Сохранено изображение: {img_filename} -> objects/{object_name}")
+        self.store.link_name(img_filename, object_name)
+        return True
@@ -0,0 +1,69 @@
+import hashlib
+import re
+import sys
+from pathlib import Path
+
+
+START_MARKER = re.compile(r'^##START_LINKED_CONTENT_FROM:\s*(\S+)\s*$')
+
+
+class PageStore:
+    """
+    Хранит Markdown каждой страницы один раз: pages/<md5(url)>.md.
+    Вместо встроенного контента дочерних страниц документ содержит только маркеры
+    ##START_LINKED_CONTENT_FROM / ##END_LINKED_CONTENT_FROM, которые раскрывает assemble().
+    """
+
+    def __init__(self, pages_dir):
+        self.pages_dir = Path(pages_dir)
+        self.pages_dir.mkdir(parents=True, exist_ok=True)
+
+    def get_path(self, url):
+        return self.pages_dir / f"{hashlib.md5(url.encode('utf-8')).hexdigest()}.md"
+
+    def save(self, url, markdown):
+        if not markdown.endswith('\n'):
+            markdown += '\n'
+        self.get_path(url).write_text(markdown, encoding='utf-8')
+
+    def load(self, url):
+        path = self.get_path(url)
+        return path.read_text(encoding='utf-8') if path.exists() else None
+
+    def iter_lines(self, url):
+        path = self.get_path(url)
+        if not path.exists():
+            return
+        with open(path, encoding='utf-8') as f:
+            yield from f
+
+
+def assemble(store, url, _stack=None):
+    """
+    Лениво собирает документ со встроенным контентом дочерних страниц, отдавая его построчно.
+    Каждая страница читается с диска только в момент раскрытия её маркера, поэтому в памяти
+    находится лишь цепочка открытых файлов от корня до текущей страницы.
+    """
+    stack = _stack or set()
+    stack.add(url)
+    for line in store.iter_lines(url):
+        yield line
+        if match := START_MARKER.match(line):
+            linked_url = match[1]
+            if linked_url in stack:
+                # Ссылка на страницу выше по цепочке: раскрывать нельзя, иначе будет бесконечный цикл
+                continue
+            yield from assemble(store, linked_url, stack)
+    stack.discard(url)
+
+
+def assemble_to_file(store, url, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        for chunk in assemble(store, url):
+            f.write(chunk)
+
+
+if __name__ == "__main__":
+    # python -m utils.linked_content ./output/pages <url> - вывести собранный документ
+    for chunk in assemble(PageStore(sys.argv[1]), sys.argv[2]):
+        sys.stdout.write(chunk)
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import html2text
+
+
+LINKED_CONTENT_SEPARATOR = '==========================='
+
+# Параметры конвертеров HTML -> Markdown
+DEFAULT_MARKDOWN_OPTIONS = {
+    'html2text': {'body_width': 0},
+    # Без экранирования подчёркиваний, иначе маркеры ##START_LINKED_CONTENT_FROM не распознаются
+    'markdownify': {'heading_style': 'ATX', 'escape_underscores': False},
+}
+
+
+# Серии из двух и более пробелов и переводы строк вместе с пробелами перед ними и пустыми строками
+SPACES_PATTERN = re.compile(r' {2,}')
+NEWLINES_PATTERN = re.compile(r' ?\n(?: ?\n)*')
+
+# Маркеры связанного контента; шаблоны начинаются с литерала и ищутся быстро,
+# пробелы и переводы строк перед маркером отбрасываются в replace_markers
+MARKER_PATTERNS = {
+    kind: re.compile(rf'##{kind}_LINKED_CONTENT_FROM:\s*(https?://\S+)\n*') for kind in ('START', 'END')
+}
+MARKER_TEMPLATES = {
+    'START': f"\n{LINKED_CONTENT_SEPARATOR}\n##START_LINKED_CONTENT_FROM: {{url}}\n",
+    'END': f"\n##END_LINKED_CONTENT_FROM: {{url}}\n{LINKED_CONTENT_SEPARATOR}\n",
+}
+
+
+def replace_markers(markdown, kind):
+    """
+    Выделяет маркеры вида kind разделителями. Маркер поглощает переводы строк после себя
+    и переводы строк с пробелами перед собой.
+    """
+    pieces = []
+    position = 0
+    for match in MARKER_PATTERNS[kind].finditer(markdown):
+        pieces.append(markdown[position:match.start()].rstrip(' ').rstrip('\n'))
+        pieces.append(MARKER_TEMPLATES[kind].format(url=match.group(1)))
+        position = match.end()
+    pieces.append(markdown[position:])
+    return ''.join(pieces)
+
+
+def postprocess(markdown):
+    """
+    Нормализует пробелы и переводы строк и выделяет маркеры связанного контента разделителями.
+    Результат совпадает с прежней цепочкой re.sub (табуляции -> пробелы, схлопывание пробелов,
+    удаление пробелов перед переводом строки, схлопывание пустых строк, маркеры START, затем END),
+    но шаблоны скомпилированы заранее, пробелы обрабатываются двумя проходами вместо трёх,
+    а проходы по маркерам выполняются только на страницах, где маркеры есть.
+    Пробелы перед маркером отбрасываются в обоих режимах link_mode (так появилось вместе с режимом 'reference'):
+    до этого при встраивании они оставались в конце строки перед разделителем.
+    """
+    markdown = markdown.strip() if markdown else ""
+    markdown = NEWLINES_PATTERN.sub('\n', SPACES_PATTERN.sub(' ', markdown.replace('\t', ' ')))
+    for kind in ('START', 'END'):
+        if f'##{kind}_LINKED_CONTENT_FROM:' in markdown:
+            markdown = replace_markers(markdown, kind)
+    return markdown
+
+
+# Конвертеры, уже созданные в этом процессе: (движок, параметры) -> конвертер
+converters = {}
+
+
+def get_converter(engine, options):
+    key = (engine, tuple(sorted(options.items())))
+    if key not in converters:
+        if engine == 'markdownify':
+            from markdownify import MarkdownConverter as MarkdownifyConverter
+            converters[key] = MarkdownifyConverter(**options).convert
+        else:
+            converters[key] = make_html2text(options)
+    return converters[key]
+
+
+def make_html2text(options):
+    """
+    Функция конвертации на одном экземпляре HTML2Text. Экземпляр хранит состояние разбора (ссылки, списки,
+    незакрытые теги) и не сбрасывает его между вызовами handle(), поэтому перед каждым документом
+    его атрибуты возвращаются к состоянию сразу после создания и настройки. Конвертация в процессе
+    выполняется в одном потоке, и экземпляр не используется одновременно.
+    """
+    converter = html2text.HTML2Text()
+    for (name, value) in options.items():
+        setattr(converter, name, value)
+    initial = dict(vars(converter))
+
+    def handle(html):
+        # Списки и словари состояния заполняются при разборе, поэтому восстанавливаются копиями
+        converter.__dict__.clear()
+        converter.__dict__.update({
+            name: value.copy() if isinstance(value, (list, dict)) else value for (name, value) in initial.items()
+        })
+        return converter.handle(html)
+
+    return handle
+
+
+def convert_html(html, engine='html2text', options=None):
+    """
+    Конвертирует HTML-строку в Markdown с постобработкой. Выполняется и в процессах пула.
+    """
+    return postprocess(get_converter(engine, options or {})(html))
+
+
+class MarkdownConverter:
+    """
+    Конвертер HTML -> Markdown для краулера: 'html2text' или 'markdownify' с параметрами
+    (переопределение DEFAULT_MARKDOWN_OPTIONS движка) и однопроходной постобработкой.
+    workers > 0 - конвертация в пуле процессов, чтобы не занимать цикл событий,
+    пока браузер загружает следующие страницы; 0 - в текущем потоке.
+    """
+
+    def __init__(self, engine='html2text', options=None, workers=0):
+        if engine not in DEFAULT_MARKDOWN_OPTIONS:
+            raise ValueError(f"Неизвестный конвертер Markdown: {engine}")
+        self.engine = engine
+        self.options = {**DEFAULT_MARKDOWN_OPTIONS[engine], **(options or {})}
+        self.workers = workers
+        self.pool = None
+
+    def convert(self, html):
+        return convert_html(str(html), self.engine, self.options)
+
+    async def convert_async(self, html):
+        html = str(html)
+        if not self.workers:
+            return convert_html(html, self.engine, self.options)
+        if self.pool is None:
+            # spawn - одинаково в Linux и Windows и не копирует в воркеры состояние браузера
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+            logging.info(f"Запущен пул конвертации Markdown: {self.workers} процессов")
+        return await asyncio.get_running_loop().run_in_executor(self.pool, convert_html, html, self.engine, self.options)
+
+    def close(self):
+        if self.pool:
+            self.pool.shutdown()
+            self.pool = None
@@ -0,0 +1,202 @@
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+
+# Фазы обработки страницы в порядке вывода (остальные выводятся после них)
+PHASES = [
+    'revalidate',
+    'static_fetch',
+    'navigate',
+    'readiness',
+    'page_content',
+    'clean_content',
+    'parse',
+    'ignored',
+    'navigation',
+    'duplicates',
+    'images',
+    'links',
+    'image_download',
+    'html_to_markdown',
+    'save',
+]
+
+METRIC_PREFIX = 'crawler'
+
+
+class NullMetrics:
+    """
+    Метрики по умолчанию: ничего не измеряют и не записывают.
+    """
+
+    @contextmanager
+    def phase(self, name, url=None):
+        yield
+
+    def count(self, name, value=1, url=None):
+        pass
+
+    def page_done(self, url):
+        pass
+
+    def begin(self, start_url):
+        pass
+
+    def end(self, start_url):
+        pass
+
+
+class CrawlMetrics:
+    """
+    Время и счётчики обработки страниц по фазам (навигация, ожидание готовности, page.content,
+    clean_content, разбор, проходы по элементам, изображения, конвертация в Markdown).
+    Фазы страницы суммируются до page_done(url) и пишутся событием в events_path (JSONL),
+    суммы за весь запуск - в prometheus_path в текстовом формате Prometheus после каждого стартового URL.
+    Время фаз - реальное (wall clock), в параллельном режиме включает ожидание других задач.
+    """
+
+    def __init__(self, events_path=None, prometheus_path=None):
+        self.events_path = Path(events_path) if events_path else None
+        self.prometheus_path = Path(prometheus_path) if prometheus_path else None
+        self.events = None
+        if self.events_path:
+            self.events_path.parent.mkdir(parents=True, exist_ok=True)
+            self.events = open(self.events_path, 'a', encoding='utf-8')
+        self.started = time.time()
+        # Фаза -> [вызовов, секунд, максимум секунд] за весь запуск
+        self.phases = {}
+        # Счётчик -> значение за весь запуск
+        self.counters = {}
+        self.pages_count = 0
+        # URL -> {'phases': {фаза: секунд}, 'counters': {...}} для страниц в обработке
+        self.pages = {}
+        # Стартовый URL -> (время начала, копии сумм) для событий по стартовым URL
+        self.crawls = {}
+
+    def close(self):
+        if self.events:
+            self.events.close()
+            self.events = None
+
+    def page(self, url):
+        return self.pages.setdefault(url, {'phases': {}, 'counters': {}})
+
+    def record(self, name, elapsed, url=None):
+        totals = self.phases.setdefault(name, [0, 0.0, 0.0])
+        totals[0] += 1
+        totals[1] += elapsed
+        totals[2] = max(totals[2], elapsed)
+        if url:
+            phases = self.page(url)['phases']
+            phases[name] = phases.get(name, 0.0) + elapsed
+
+    @contextmanager
+    def phase(self, name, url=None):
+        """
+        Измеряет время блока как фазу name страницы url (без url - только в суммах запуска).
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started, url)
+
+    def count(self, name, value=1, url=None):
+        self.counters[name] = self.counters.get(name, 0) + value
+        if url:
+            counters = self.page(url)['counters']
+            counters[name] = counters.get(name, 0) + value
+
+    def write_event(self, event):
+        if self.events:
+            self.events.write(json.dumps(event, ensure_ascii=False) + '\n')
+            self.events.flush()
+
+    def page_done(self, url):
+        """
+        Завершает учёт страницы и пишет её событие. Страницы без измерений (пропущенные) не пишутся.
+        """
+        page = self.pages.pop(url, None)
+        if not page:
+            return
+        self.pages_count += 1
+        self.write_event({
+            'event': 'page',
+            'ts': round(time.time(), 3),
+            'url': url,
+            'total': round(sum(page['phases'].values()), 6),
+            'phases': {name: round(seconds, 6) for name, seconds in page['phases'].items()},
+            'counters': page['counters'],
+        })
+
+    def begin(self, start_url):
+        self.crawls[start_url] = (time.time(), self.pages_count, {name: totals[1] for name, totals in self.phases.items()})
+
+    def end(self, start_url):
+        """
+        Пишет событие по стартовому URL, обновляет снимок Prometheus и выводит сводку в лог.
+        """
+        # Страницы, учёт которых не был завершён (например, прерванные ошибкой)
+        for url in list(self.pages):
+            self.page_done(url)
+        (started, pages_count, phases) = self.crawls.pop(start_url, (self.started, 0, {}))
+        elapsed = time.time() - started
+        pages = self.pages_count - pages_count
+        crawl_phases = {name: round(totals[1] - phases.get(name, 0.0), 6) for name, totals in self.ordered_phases()}
+        self.write_event({
+            'event': 'crawl',
+            'ts': round(time.time(), 3),
+            'start_url': start_url,
+            'elapsed': round(elapsed, 3),
+            'pages': pages,
+            'phases': crawl_phases,
+        })
+        self.write_prometheus()
+        logging.info(
+            f"Метрики {start_url}: {pages} страниц за {elapsed:.1f} с, "
+            + ", ".join(f"{name} {seconds:.2f} с" for name, seconds in crawl_phases.items() if seconds)
+        )
+
+    def ordered_phases(self):
+        order = {name: i for i, name in enumerate(PHASES)}
+        return sorted(self.phases.items(), key=lambda item: (order.get(item[0], len(order)), item[0]))
+
+    def summary(self):
+        return {
+            'elapsed': time.time() - self.started,
+            'pages': self.pages_count,
+            'phases': {name: {'calls': calls, 'seconds': seconds, 'max': longest} for name, (calls, seconds, longest) in self.ordered_phases()},
+            'counters': dict(self.counters),
+        }
+
+    def prometheus_text(self):
+        lines = []
+
+        def metric(name, kind, description, samples):
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {description}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+            for (labels, value) in samples:
+                labels = "{" + ",".join(f'{key}="{label}"' for key, label in labels.items()) + "}" if labels else ""
+                lines.append(f"{METRIC_PREFIX}_{name}{labels} {value if isinstance(value, int) else f'{value:.6f}'}")
+
+        phases = self.ordered_phases()
+        metric('phase_seconds_total', 'counter', 'Суммарное время фазы обработки страниц', [({'phase': name}, totals[1]) for name, totals in phases])
+        metric('phase_calls_total', 'counter', 'Количество выполнений фазы', [({'phase': name}, totals[0]) for name, totals in phases])
+        metric('phase_seconds_max', 'gauge', 'Самое долгое выполнение фазы', [({'phase': name}, totals[2]) for name, totals in phases])
+        metric('pages_total', 'counter', 'Обработано страниц', [({}, self.pages_count)])
+        metric('events_total', 'counter', 'Счётчики обработки', [({'name': name}, value) for name, value in sorted(self.counters.items())])
+        metric('uptime_seconds', 'gauge', 'Время с начала запуска', [({}, time.time() - self.started)])
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self):
+        if not self.prometheus_path:
+            return
+        self.prometheus_path.parent.mkdir(parents=True, exist_ok=True)
+        # Файл заменяется атомарно, чтобы сборщик (node_exporter textfile) не прочитал его наполовину
+        tmp_path = self.prometheus_path.with_name(self.prometheus_path.name + '.tmp')
+        tmp_path.write_text(self.prometheus_text(), encoding='utf-8')
+        os.replace(tmp_path, self.prometheus_path)
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import re
+
+
+class NetworkCapture:
+    """
+    Запись ответов XHR/fetch, которые SPA загружает при навигации (тело статьи, дерево вложенных статей
+    и т.п.), чтобы строить контент из структурированных данных, а не из отрендеренного DOM.
+    endpoints - {имя: регулярное выражение URL ответа}; записываются только ответы в JSON.
+    page_pattern - регулярное выражение URL страницы с именованными группами (например, пространство и статья).
+        Значения групп, найденные в URL записанного ответа, заменяются подстановками, и получается шаблон
+        адреса API. Когда шаблоны известны для всех required, страницы получаются запросами к API
+        без рендеринга (direct=True, см. IHTMLRetriever.retrieve_captured).
+    page_key - группа page_pattern, которая идентифицирует саму страницу (по умолчанию последняя). Ответ,
+        в URL которого её значения нет (например, дерево корня, загружаемое на каждой странице), к странице
+        не относится: он не используется для её контента и не становится шаблоном.
+    required - имена ответов, без которых контент не построить (по умолчанию все endpoints).
+    """
+
+    def __init__(self, endpoints, page_pattern=None, page_key=None, required=None, direct=True, resource_types=('xhr', 'fetch')):
+        self.endpoints = {name: re.compile(pattern) for (name, pattern) in endpoints.items()}
+        self.page_pattern = re.compile(page_pattern) if page_pattern else None
+        if self.page_pattern and page_key is None and self.page_pattern.groupindex:
+            page_key = max(self.page_pattern.groupindex, key=self.page_pattern.groupindex.get)
+        self.page_key = page_key
+        self.required = list(required or endpoints)
+        self.direct = direct
+        self.resource_types = resource_types
+        # Имя ответа -> шаблон адреса API с подстановками {группа}
+        self.templates = {}
+        # Вкладка -> [(имя, URL ответа, задача чтения тела)] для текущей навигации
+        self.pages = {}
+
+    def match(self, url):
+        for (name, pattern) in self.endpoints.items():
+            if pattern.search(url):
+                return name
+        return None
+
+    def attach(self, page):
+        """
+        Подключает запись ответов к вкладке.
+        """
+        page.on("response", lambda response: self.on_response(page, response))
+
+    def on_response(self, page, response):
+        responses = self.pages.get(id(page))
+        if responses is None or response.request.resource_type not in self.resource_types:
+            return
+        if name := self.match(response.url):
+            # Тело читается сразу: после следующей навигации вкладки оно может быть уже недоступно
+            responses.append((name, response.url, asyncio.ensure_future(self.read(response))))
+
+    async def read(self, response):
+        if response.status >= 400:
+            logging.debug(f"Ответ {response.status} не записан: {response.url}")
+            return None
+        return await response.json()
+
+    def start_page(self, page):
+        self.pages[id(page)] = []
+
+    def discard_page(self, page):
+        for (_, _, task) in self.pages.pop(id(page), None) or []:
+            task.cancel()
+
+    def page_values(self, url):
+        match = self.page_pattern.search(url) if self.page_pattern else None
+        return {key: value for (key, value) in match.groupdict().items() if value} if match else {}
+
+    def is_page_specific(self, response_url, values):
+        """
+        Ответ относится к странице: в его URL есть значение page_key. Для страницы, не подходящей
+        под page_pattern, отличить свои ответы от общих нельзя, и подходит любой.
+        """
+        if not values:
+            return True
+        key_value = values.get(self.page_key)
+        return bool(key_value) and key_value in response_url
+
+    async def finish_page(self, page, url):
+        """
+        Дожидается чтения записанных ответов страницы url и возвращает {имя: данные} - по первому ответу
+        каждого имени из тех, что относятся к этой странице (см. is_page_specific).
+        """
+        values = self.page_values(url)
+        chosen = {}
+        for (name, response_url, task) in self.pages.pop(id(page), None) or []:
+            try:
+                payload = await task
+            except Exception as e:
+                logging.debug(f"Не удалось прочитать ответ {response_url}: {e}")
+                continue
+            if payload is None or name in chosen:
+                continue
+            if not self.is_page_specific(response_url, values):
+                logging.debug(f"Ответ '{name}' не относится к странице {url}: {response_url}")
+                continue
+            chosen[name] = (payload, response_url)
+        for (name, (_, response_url)) in chosen.items():
+            self.learn(name, response_url, values)
+        return {name: payload for (name, (payload, _)) in chosen.items()}
+
+    def is_complete(self, payloads):
+        return all(name in payloads for name in self.required)
+
+    def learn(self, name, response_url, values):
+        # Шаблон без подстановки page_key давал бы всем страницам один и тот же ответ
+        if name in self.templates or not self.page_key or not values.get(self.page_key):
+            return
+        template = response_url.replace('{', '{{').replace('}', '}}')
+        # Длинные значения заменяются первыми, чтобы не задеть их части
+        for (key, value) in sorted(values.items(), key=lambda item: -len(item[1])):
+            template = template.replace(value, f'{{{key}}}')
+        self.templates[name] = template
+        logging.info(f"Адрес API для '{name}': {template}")
+
+    def endpoint_urls(self, url):
+        """
+        Адреса API ({имя: URL}) для страницы url или None, если их ещё нельзя построить.
+        """
+        if not self.direct or any(name not in self.templates for name in self.required):
+            return None
+        values = self.page_values(url)
+        if not values:
+            return None
+        try:
+            return {name: template.format(**values) for (name, template) in self.templates.items()}
+        except KeyError:
+            # В шаблоне группа, которой нет в URL этой страницы
+            return None
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import os
+from pathlib import Path
+
+
+# Параметры буферизованной записи в файл результата
+DEFAULT_SINK_OPTIONS = {
+    # Сбросить буфер, как только в нём накопилось столько символов
+    'buffer_size': 256 * 1024,
+    # ... или прошло столько секунд с прошлого сброса
+    'flush_interval': 1.0,
+    # Больше этого записывающие ждут, пока поток записи освободит буфер
+    'max_buffer': 4 * 1024 * 1024,
+    # 'never' - полагаться на ОС, 'close' - os.fsync при закрытии файла, 'flush' - после каждого сброса
+    'fsync': 'close',
+}
+
+
+class OutputSink:
+    """
+    Буферизованная запись в один файл: write() добавляет текст в буфер в памяти, а единственная
+    фоновая задача записи сбрасывает его пакетами (по размеру или по времени) в пуле потоков.
+    Файл открывается один раз, текст попадает в него в порядке вызовов write(), поэтому записи
+    параллельно обрабатываемых страниц не перемешиваются.
+    mode - 'w' перезаписывает файл, 'a' дописывает в конец; options - переопределение DEFAULT_SINK_OPTIONS.
+    """
+
+    def __init__(self, path, mode='a', options=None):
+        self.path = Path(path)
+        self.mode = mode
+        self.options = {**DEFAULT_SINK_OPTIONS, **(options or {})}
+        if self.options['fsync'] not in ('never', 'close', 'flush'):
+            raise ValueError(f"Неизвестная политика fsync: {self.options['fsync']}")
+        self.buffer = []
+        self.buffered = 0
+        self.file = None
+        self.task = None
+        self.closing = False
+        self.wakeup = asyncio.Event()
+        # Оповещает ожидающих write() о том, что буфер освобождён
+        self.flushed = asyncio.Condition()
+        self.stats = {'chars': 0, 'flushes': 0}
+
+    async def write(self, text):
+        if self.closing:
+            raise RuntimeError(f"Запись в закрытый файл {self.path}")
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+        elif self.task.done():
+            # Поток записи завершился ошибкой: сообщаем о ней записывающему
+            self.task.result()
+        self.buffer.append(text)
+        self.buffered += len(text)
+        if self.buffered >= self.options['buffer_size']:
+            self.wakeup.set()
+        if self.buffered >= self.options['max_buffer']:
+            async with self.flushed:
+                await self.flushed.wait_for(lambda: self.buffered < self.options['max_buffer'] or self.task.done())
+
+    async def run(self):
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), self.options['flush_interval'])
+                except asyncio.TimeoutError:
+                    pass
+                self.wakeup.clear()
+                await self.flush()
+                if self.closing and not self.buffer:
+                    return
+        finally:
+            async with self.flushed:
+                self.flushed.notify_all()
+
+    async def flush(self):
+        if not self.buffer:
+            return
+        data = ''.join(self.buffer)
+        (self.buffer, self.buffered) = ([], 0)
+        async with self.flushed:
+            self.flushed.notify_all()
+        await asyncio.to_thread(self.write_data, data)
+
+    def write_data(self, data):
+        if self.file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.file = open(self.path, self.mode, encoding='utf-8')
+        self.file.write(data)
+        self.file.flush()
+        if self.options['fsync'] == 'flush':
+            os.fsync(self.file.fileno())
+        self.stats['chars'] += len(data)
+        self.stats['flushes'] += 1
+
+    def close_file(self):
+        if self.file is None:
+            return
+        if self.options['fsync'] != 'never':
+            os.fsync(self.file.fileno())
+        self.file.close()
+        self.file = None
+
+    async def close(self):
+        """
+        Записывает остаток буфера и закрывает файл.
+        """
+        self.closing = True
+        try:
+            if self.task:
+                self.wakeup.set()
+                await self.task
+        finally:
+            await asyncio.to_thread(self.close_file)
+        logging.debug(f"Записано в {self.path}: {self.stats['chars']} символов за {self.stats['flushes']} сбросов")
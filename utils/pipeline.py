@@ -0,0 +1,132 @@
+import asyncio
+import logging
+
+from utils.metrics import NullMetrics
+
+
+class Prefetcher:
+    """
+    Опережающая загрузка страниц: пока краулер разбирает текущую страницу, браузер уже загружает
+    следующие, и ни он, ни Python не простаивают. Загружается и ожидает обработки не больше limit
+    страниц; остальные ссылки загружаются, когда до них дойдёт обход.
+    fetch - корутина загрузки (обычно retriever.retrieve_content).
+    """
+
+    def __init__(self, fetch, limit, metrics=None):
+        self.fetch = fetch
+        self.limit = limit
+        self.metrics = metrics or NullMetrics()
+        # URL -> задача загрузки, в порядке постановки
+        self.tasks = {}
+
+    def schedule(self, urls):
+        """
+        Начинает загрузку URL по порядку, пока есть свободные места.
+        """
+        for url in urls:
+            if len(self.tasks) >= self.limit:
+                break
+            if url not in self.tasks:
+                self.tasks[url] = asyncio.create_task(self.fetch(url))
+
+    async def get(self, url):
+        """
+        Возвращает заранее загруженный контент или загружает страницу сейчас.
+        """
+        if task := self.tasks.pop(url, None):
+            self.metrics.count('prefetch_hits', url=url)
+            return await task
+        return await self.fetch(url)
+
+    def discard(self, url):
+        """
+        Отменяет загрузку страницы, которая не понадобится (уже посещена или отсеяна).
+        """
+        if task := self.tasks.pop(url, None):
+            task.cancel()
+            self.metrics.count('prefetch_discarded')
+
+    async def cancel(self):
+        tasks = list(self.tasks.values())
+        for url in list(self.tasks):
+            self.discard(url)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class OrderedStage:
+    """
+    Этап конвейера с сохранением порядка: задачи (например, конвертация в Markdown в пуле процессов)
+    выполняются параллельно, а их результаты передаются consume(result, *args) по одному в порядке
+    постановки. Незавершённых задач не больше limit: submit ждёт, пока потребитель освободит место,
+    поэтому медленный этап не даёт памяти расти без ограничений.
+    Первая ошибка задачи или consume повторно возбуждается в следующем submit или в drain,
+    чтобы результат не терялся молча.
+    """
+
+    def __init__(self, consume, limit):
+        self.consume = consume
+        self.slots = asyncio.Semaphore(limit)
+        self.queue = asyncio.Queue()
+        self.worker = None
+        self.error = None
+
+    def raise_error(self):
+        if self.error is not None:
+            (error, self.error) = (self.error, None)
+            raise error
+
+    async def submit(self, coroutine, *args):
+        self.raise_error()
+        await self.slots.acquire()
+        if self.error is not None:
+            coroutine.close()
+            self.slots.release()
+            self.raise_error()
+        self.queue.put_nowait((asyncio.ensure_future(coroutine), args))
+        if self.worker is None:
+            self.worker = asyncio.create_task(self.run())
+
+    async def run(self):
+        while True:
+            (task, args) = await self.queue.get()
+            try:
+                await self.consume(await task, *args)
+            except Exception as e:
+                logging.error(f"Ошибка этапа конвейера для {args}: {e}")
+                if self.error is None:
+                    self.error = e
+            finally:
+                self.queue.task_done()
+                self.slots.release()
+
+    async def drain(self):
+        """
+        Ждёт обработки всех поставленных задач и останавливает потребителя.
+        Возбуждает первую ошибку этапа, если она была.
+        """
+        if self.worker is not None:
+            await self.queue.join()
+            self.worker.cancel()
+            await asyncio.gather(self.worker, return_exceptions=True)
+            self.worker = None
+        self.raise_error()
+
+    async def cancel(self):
+        """
+        Отменяет незавершённые задачи и останавливает потребителя (при прерванном обходе).
+        Этап после этого можно использовать снова.
+        """
+        tasks = []
+        while not self.queue.empty():
+            (task, _) = self.queue.get_nowait()
+            task.cancel()
+            tasks.append(task)
+            self.queue.task_done()
+            self.slots.release()
+        if self.worker:
+            # Задача, которую потребитель ждёт сейчас, отменяется вместе с ним, место освобождается в run()
+            self.worker.cancel()
+            tasks.append(self.worker)
+            self.worker = None
+        self.error = None
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,253 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+
+# Параметры вежливости для хоста
+DEFAULT_POLITENESS = {
+    # Начальное, минимальное и максимальное число одновременных запросов к хосту
+    'initial_concurrency': 2,
+    'min_concurrency': 1,
+    'max_concurrency': 8,
+    # Аддитивное увеличение: +increase к лимиту за "окно" успешных запросов (increase / limit на запрос)
+    'increase': 1.0,
+    # Мультипликативное уменьшение при 429/503, таймаутах и всплесках задержки
+    'decrease': 0.5,
+    # Токен-бакет: не больше rate запросов в секунду в среднем и не больше burst подряд
+    'rate': 5.0,
+    'burst': 5,
+    # Всплеск задержки: ответ медленнее baseline * latency_spike и не быстрее min_spike_latency секунд
+    'latency_spike': 3.0,
+    'min_spike_latency': 1.0,
+    # Пауза для 429/503 без заголовка Retry-After и верхняя граница паузы
+    'default_backoff': 5.0,
+    'max_backoff': 120.0,
+}
+
+# Статусы, означающие перегрузку хоста
+THROTTLE_STATUSES = {429, 503}
+
+
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HostLimiter:
+    """
+    Состояние одного хоста: окно одновременных запросов (AIMD), токен-бакет и пауза после 429/503.
+    """
+
+    def __init__(self, host, settings):
+        self.host = host
+        self.settings = settings
+        self.limit = float(settings['initial_concurrency'])
+        self.tokens = float(settings['burst'])
+        self.refilled_at = time.monotonic()
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.active = 0
+        self.waiting = 0
+        self.latency = None
+        self.baseline = None
+        self.stats = {'requests': 0, 'throttled': 0, 'errors': 0, 'spikes': 0, 'increases': 0, 'decreases': 0}
+        self.released = asyncio.Event()
+
+    def refill(self, now):
+        self.tokens = min(self.settings['burst'], self.tokens + (now - self.refilled_at) * self.settings['rate'])
+        self.refilled_at = now
+
+    def admit_delay(self):
+        """
+        Занимает слот и возвращает 0, если запрос можно выполнить сейчас.
+        Иначе - через сколько секунд проверить снова (None - ждать освобождения слота).
+        """
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.active >= int(self.limit):
+            return None
+        self.refill(now)
+        if self.tokens < 1:
+            return (1 - self.tokens) / self.settings['rate']
+        self.tokens -= 1
+        self.active += 1
+        return 0
+
+    def release(self):
+        self.active -= 1
+        self.released.set()
+
+    def increase(self):
+        previous = int(self.limit)
+        self.limit = min(self.settings['max_concurrency'], self.limit + self.settings['increase'] / self.limit)
+        if int(self.limit) > previous:
+            self.stats['increases'] += 1
+            logging.info(f"Вежливость {self.host}: лимит увеличен до {int(self.limit)}")
+
+    def decrease(self, reason, started, backoff=0.0):
+        now = time.monotonic()
+        if backoff:
+            self.paused_until = max(self.paused_until, now + min(backoff, self.settings['max_backoff']))
+        # Запросы, начатые до прошлого уменьшения, сообщают о той же перегрузке: не уменьшать повторно
+        if started < self.last_decrease:
+            return
+        self.last_decrease = now
+        self.limit = max(self.settings['min_concurrency'], self.limit * self.settings['decrease'])
+        self.stats['decreases'] += 1
+        logging.warning(
+            f"Вежливость {self.host}: {reason}, лимит уменьшен до {int(self.limit)}"
+            + (f", пауза {backoff:.1f} с" if backoff else "")
+        )
+
+    def record(self, status, headers, latency, started):
+        self.stats['requests'] += 1
+        if status in THROTTLE_STATUSES:
+            self.stats['throttled'] += 1
+            backoff = parse_retry_after((headers or {}).get('retry-after'))
+            self.decrease(f"статус {status}", started, self.settings['default_backoff'] if backoff is None else backoff)
+            return
+        if status is None:
+            self.stats['errors'] += 1
+            self.decrease("ошибка или таймаут запроса", started)
+            return
+        self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+        # Базовая задержка - минимум сглаженной задержки, медленно догоняющий её при росте
+        if self.baseline is None or self.latency < self.baseline:
+            self.baseline = self.latency
+        else:
+            self.baseline += (self.latency - self.baseline) * 0.01
+        if latency > max(self.baseline * self.settings['latency_spike'], self.settings['min_spike_latency']):
+            self.stats['spikes'] += 1
+            self.decrease(f"задержка {latency:.2f} с при обычной {self.baseline:.2f} с", started)
+        elif status < 500:
+            self.increase()
+
+    def snapshot(self):
+        return {
+            'limit': round(self.limit, 2),
+            'active': self.active,
+            'waiting': self.waiting,
+            'tokens': round(self.tokens, 2),
+            'paused_for': round(max(0.0, self.paused_until - time.monotonic()), 2),
+            'latency': round(self.latency, 3) if self.latency is not None else None,
+            'baseline': round(self.baseline, 3) if self.baseline is not None else None,
+            **self.stats,
+        }
+
+
+class Slot:
+    """
+    Разрешение на один запрос к хосту. record() передаёт планировщику результат запроса.
+    """
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.started = time.monotonic()
+        self.recorded = False
+
+    def record(self, status, headers=None, latency=None):
+        if self.recorded:
+            return
+        self.recorded = True
+        self.limiter.record(status, headers, time.monotonic() - self.started if latency is None else latency, self.started)
+
+    def record_response(self, response, latency=None):
+        self.record(response.status if response is not None else None, response.headers if response is not None else None, latency)
+
+
+class PolitenessScheduler:
+    """
+    Планировщик запросов по хостам: ограничивает частоту (токен-бакет) и число одновременных запросов,
+    подстраивая его по схеме AIMD - лимит растёт аддитивно, пока ответы быстрые и без ошибок,
+    и уменьшается мультипликативно при 429/503, таймаутах и всплесках задержки.
+    settings - переопределение DEFAULT_POLITENESS, host_settings - то же для отдельных хостов: {netloc: {...}}.
+    """
+
+    def __init__(self, settings=None, host_settings=None):
+        self.settings = {**DEFAULT_POLITENESS, **(settings or {})}
+        self.host_settings = host_settings or {}
+        self.hosts = {}
+
+    def get_limiter(self, url):
+        host = urlparse(url).netloc
+        if host not in self.hosts:
+            self.hosts[host] = HostLimiter(host, {**self.settings, **self.host_settings.get(host, {})})
+        return self.hosts[host]
+
+    def set_host_settings(self, host, settings):
+        """
+        Переопределяет параметры хоста, например частоту запросов по Crawl-delay из robots.txt.
+        """
+        self.host_settings[host] = {**self.host_settings.get(host, {}), **settings}
+        if host in self.hosts:
+            limiter = self.hosts[host]
+            limiter.settings = {**self.settings, **self.host_settings[host]}
+            limiter.tokens = min(limiter.tokens, limiter.settings['burst'])
+            limiter.limit = min(limiter.limit, limiter.settings['max_concurrency'])
+
+    async def acquire(self, limiter):
+        limiter.waiting += 1
+        try:
+            while (delay := limiter.admit_delay()) != 0:
+                limiter.released.clear()
+                try:
+                    await asyncio.wait_for(limiter.released.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            limiter.waiting -= 1
+
+    @asynccontextmanager
+    async def slot(self, url):
+        """
+        Ожидает разрешения на запрос к хосту url. Если результат не передан через record(),
+        исключение внутри блока считается ошибкой запроса, а нормальный выход - успешным ответом.
+        """
+        limiter = self.get_limiter(url)
+        await self.acquire(limiter)
+        slot = Slot(limiter)
+        try:
+            yield slot
+        except Exception:
+            slot.record(None)
+            raise
+        else:
+            slot.record(200)
+        finally:
+            limiter.release()
+
+    def snapshot(self):
+        return {host: limiter.snapshot() for host, limiter in self.hosts.items()}
+
+    def log_snapshot(self):
+        for host, state in self.snapshot().items():
+            logging.info(f"Вежливость {host}: {state}")
+
+
+class NullSlot:
+    """
+    Слот без ограничений: используется, когда планировщик не задан.
+    """
+
+    def record(self, status, headers=None, latency=None):
+        pass
+
+    def record_response(self, response, latency=None):
+        pass
+
+
+@asynccontextmanager
+async def unlimited_slot():
+    yield NullSlot()
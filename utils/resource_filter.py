@@ -0,0 +1,126 @@
+import logging
+import re
+import time
+
+
+# Действие для типа ресурса: 'abort' - отменить запрос, 'stub' - вернуть пустой ответ
+DEFAULT_RESOURCE_POLICY = {
+    'image': 'abort',
+    'media': 'abort',
+    'font': 'abort',
+    'stylesheet': 'stub',
+}
+
+# Счётчики, трекеры и прочие запросы, не влияющие на DOM
+DEFAULT_BLOCKED_URL_PATTERNS = [
+    r'google-analytics\.com',
+    r'googletagmanager\.com',
+    r'doubleclick\.net',
+    r'mc\.yandex\.ru',
+    r'top-fwz1\.mail\.ru',
+    r'connect\.facebook\.net',
+]
+
+# Средние размеры ресурсов (байт) для оценки экономии: заблокированные ответы не загружаются,
+# поэтому их реальный размер неизвестен
+ESTIMATED_RESOURCE_SIZES = {
+    'image': 60_000,
+    'media': 500_000,
+    'font': 40_000,
+    'stylesheet': 30_000,
+    'script': 80_000,
+}
+DEFAULT_ESTIMATED_SIZE = 10_000
+
+STUB_CONTENT_TYPES = {
+    'stylesheet': 'text/css',
+    'script': 'application/javascript',
+}
+
+
+class ResourceFilter:
+    """
+    Политика перехвата запросов в BrowserContext: блокирует или подменяет ресурсы,
+    не нужные для получения DOM, и считает сэкономленный трафик и время по страницам.
+    resource_policy - {тип ресурса Playwright: 'abort' | 'stub'}
+    url_patterns - регулярные выражения URL, запросы к которым отменяются независимо от типа
+    """
+
+    def __init__(self, resource_policy=None, url_patterns=None, estimated_sizes=None):
+        self.resource_policy = DEFAULT_RESOURCE_POLICY if resource_policy is None else resource_policy
+        patterns = DEFAULT_BLOCKED_URL_PATTERNS if url_patterns is None else url_patterns
+        self.url_pattern = re.compile('|'.join(f'(?:{p})' for p in patterns)) if patterns else None
+        self.estimated_sizes = estimated_sizes or ESTIMATED_RESOURCE_SIZES
+        self.page_stats = {}
+        self.totals = {'blocked': 0, 'bytes_saved': 0, 'bytes_loaded': 0, 'time_saved': 0.0}
+
+    def get_action(self, request):
+        if self.url_pattern and self.url_pattern.search(request.url):
+            return 'abort'
+        return self.resource_policy.get(request.resource_type)
+
+    def stats_for(self, request):
+        try:
+            page = request.frame.page
+        except Exception:
+            return None
+        return self.page_stats.get(id(page))
+
+    async def handle(self, route):
+        request = route.request
+        action = self.get_action(request)
+        if action is None:
+            await route.continue_()
+            return
+        if stats := self.stats_for(request):
+            stats['blocked'][request.resource_type] = stats['blocked'].get(request.resource_type, 0) + 1
+            stats['bytes_saved'] += self.estimated_sizes.get(request.resource_type, DEFAULT_ESTIMATED_SIZE)
+        if action == 'stub':
+            await route.fulfill(
+                status=200,
+                content_type=STUB_CONTENT_TYPES.get(request.resource_type, 'text/plain'),
+                body='',
+            )
+        else:
+            await route.abort()
+
+    def attach(self, page):
+        """
+        Подключает подсчёт загруженного трафика к вкладке.
+        """
+        page.on("response", lambda response: self.on_response(page, response))
+
+    def on_response(self, page, response):
+        if stats := self.page_stats.get(id(page)):
+            length = response.headers.get('content-length')
+            if length and length.isdigit():
+                stats['bytes_loaded'] += int(length)
+
+    def start_page(self, page):
+        self.page_stats[id(page)] = {'blocked': {}, 'bytes_saved': 0, 'bytes_loaded': 0, 'started': time.monotonic()}
+
+    def finish_page(self, page, url):
+        """
+        Завершает учёт для загруженной страницы и пишет отчёт в лог.
+        Экономия времени оценивается по скорости загрузки пропущенных ресурсов.
+        """
+        stats = self.page_stats.pop(id(page), None)
+        if stats is None:
+            return None
+        elapsed = time.monotonic() - stats['started']
+        blocked = sum(stats['blocked'].values())
+        time_saved = 0.0
+        if stats['bytes_loaded'] and elapsed > 0:
+            time_saved = stats['bytes_saved'] / (stats['bytes_loaded'] / elapsed)
+        stats['elapsed'] = elapsed
+        stats['time_saved'] = time_saved
+        self.totals['blocked'] += blocked
+        self.totals['bytes_saved'] += stats['bytes_saved']
+        self.totals['bytes_loaded'] += stats['bytes_loaded']
+        self.totals['time_saved'] += time_saved
+        logging.info(
+            f"Фильтр ресурсов для {url}: заблокировано {blocked} запросов {stats['blocked']}, "
+            f"сэкономлено ~{stats['bytes_saved'] // 1024} КБ и ~{time_saved:.2f} с "
+            f"(загружено {stats['bytes_loaded'] // 1024} КБ за {elapsed:.2f} с)"
+        )
+        return stats
@@ -1,22 +1,106 @@
 import asyncio
-import os
+import json
 import re
-import aiofiles
 import hashlib  # Для хеширования
+import time
 from urllib.parse import urljoin, urlparse
 from pathlib import Path
 from uuid import uuid4
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 
-from playwright.async_api import async_playwright
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
 #from markdownify import markdownify as md
-from bs4 import BeautifulSoup, NavigableString
-import html2text
+from bs4 import BeautifulSoup, NavigableString, FeatureNotFound, Tag
 
 import logging
 
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from utils.revalidation import digest
+from utils.images import ImageDownloader, ImageStore
+from utils.linked_content import PageStore
+from utils.frontier import Frontier
+from utils import seen_sets
+from utils.politeness import unlimited_slot
+from utils.metrics import NullMetrics
+from utils.markdown import MarkdownConverter
+from utils.pipeline import Prefetcher, OrderedStage
+from utils.output_sink import OutputSink
+from utils.session import AuthRedirect
+
 USER_AGENT = "ILCrawler/1.0 (+http://gbvolkoff.name/crawler)"
+# Память браузера проверяется раз в столько загрузок страниц
+RSS_CHECK_INTERVAL = 20
 INSIGNIFICANT_TAGS = ['small', 'strong', 'em', 'span', 'b', 'i', 'u', 'sup', 'sub']
 
+# Параметры ожидания готовности страницы (см. IHTMLRetriever.wait_for_page_load)
+DEFAULT_READINESS = {
+    'ready_selector': None,
+    'loader_selector': '.loading, .spinner, .loader',
+    'quiet_ms': 300,
+    'network_idle': False,
+    'timeout': 10000,
+}
+
+READINESS_SCRIPT = '''({readySelector, loaderSelector, quietMs, timeout}) => {
+    return new Promise((resolve) => {
+        const start = performance.now();
+        let lastMutation = performance.now();
+        const observer = new MutationObserver(() => { lastMutation = performance.now(); });
+        observer.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+        const loaderVisible = () => loaderSelector && Array.from(document.querySelectorAll(loaderSelector))
+            .some((el) => el.getClientRects().length > 0);
+        const check = () => {
+            const now = performance.now();
+            const ready = document.readyState !== 'loading'
+                && (!readySelector || document.querySelector(readySelector) !== null)
+                && !loaderVisible()
+                && now - lastMutation >= quietMs;
+            if (ready || now - start >= timeout) {
+                observer.disconnect();
+                resolve(ready);
+            } else {
+                setTimeout(check, 50);
+            }
+        };
+        check();
+    });
+}'''
+
+def make_soup(html, parser='html.parser'):
+    """
+    Разбирает HTML выбранным парсером BeautifulSoup ('html.parser', 'lxml', 'html5lib').
+    """
+    return BeautifulSoup(html, parser)
+
+def ensure_soup(content, parser='html.parser'):
+    """
+    Возвращает BeautifulSoup для контента, не разбирая его повторно:
+    готовое дерево используется как есть, отдельный тег переносится в новый документ,
+    и только строка разбирается парсером.
+    """
+    if isinstance(content, BeautifulSoup):
+        return content
+    if isinstance(content, Tag):
+        soup = BeautifulSoup('', parser)
+        soup.append(content.extract())
+        return soup
+    return make_soup(content, parser)
+
+def check_parser(parser):
+    """
+    Проверяет, что парсер установлен, чтобы ошибка проявилась до начала обхода.
+    """
+    try:
+        BeautifulSoup('', parser)
+    except FeatureNotFound:
+        raise ValueError(f"Парсер {parser} недоступен, установите соответствующий пакет")
+    return parser
+
 def get_header(headers, key):
     """
     Получает значение заголовка независимо от регистра.
@@ -42,6 +126,46 @@ def prepare_tag_for_hashing(tag, insignificant_tags, base_url):
 
     return cleaned_html
 
+# Параметры полиномиального хеша последовательности ссылок (модуль - простое число Мерсенна 2^61-1)
+FINGERPRINT_MOD = (1 << 61) - 1
+FINGERPRINT_BASE = 1_000_003
+
+def link_token(url):
+    return int(hashlib.md5(url.encode('utf-8')).hexdigest()[:16], 16) % FINGERPRINT_MOD
+
+def compute_link_fingerprints(root, base_url):
+    """
+    Вычисляет отпечатки последовательностей ссылок для всех тегов за один проход снизу вверх.
+    Отпечаток тега - полиномиальный хеш последовательности абсолютных href всех вложенных <a>
+    в порядке документа (то же, что собирает prepare_tag_for_hashing). Хеш родителя складывается
+    из хешей детей: H(a + b) = H(a) * BASE^len(b) + H(b), поэтому теги не копируются,
+    а каждая ссылка разрешается и хешируется один раз.
+    Возвращает {id(tag): (hash, BASE^n, n)}, где n - количество ссылок.
+    """
+    fingerprints = {}
+    tags = [root] + root.find_all(True)
+    # В обратном порядке документа все потомки тега обрабатываются раньше него
+    for tag in reversed(tags):
+        (h, power, count) = (0, 1, 0)
+        for child in tag.children:
+            if not isinstance(child, Tag):
+                continue
+            if child.name == 'a' and child.has_attr('href'):
+                h = (h * FINGERPRINT_BASE + link_token(urljoin(base_url, child['href']))) % FINGERPRINT_MOD
+                power = power * FINGERPRINT_BASE % FINGERPRINT_MOD
+                count += 1
+            (child_h, child_power, child_count) = fingerprints[id(child)]
+            if child_count:
+                h = (h * child_power + child_h) % FINGERPRINT_MOD
+                power = power * child_power % FINGERPRINT_MOD
+                count += child_count
+        fingerprints[id(tag)] = (h, power, count)
+    return fingerprints
+
+def format_fingerprint(fingerprint):
+    (h, _, count) = fingerprint
+    return f"{h:016x}{count:x}"
+
 def replace_tag(tag, replacement_text):
     """
     Заменяет HTML-тег на заданный текст или HTML.
@@ -57,69 +181,277 @@ def has_ignored_class(tag, ignored_classes):
 
 
 class IHTMLRetriever:
-    def __init__(self, base_url, login_url=None, login_credentials=None, user_agent=None):
+    # Параметры готовности страницы, которые переопределяют наследники
+    default_readiness = {}
+
+    def __init__(self, base_url, login_url=None, login_credentials=None, user_agent=None, pages_count=1, revalidation=None, static_first=False, content_selector=None, min_text_length=200, static_probe_limit=3, resource_filter=None, readiness=None, site_readiness=None, parser='html.parser', scheduler=None, metrics=None, parse_workers=0, headless=False, recycle_after=0, max_browser_rss=None, session=None, network_capture=None):
         """
         Инициализация HTML Retriever.
+        pages_count - количество вкладок в общем BrowserContext, которые могут загружаться параллельно.
+        revalidation - необязательное хранилище валидаторов (RevalidationStore) для инкрементального обхода.
+        static_first - сначала пробовать получить страницу обычным HTTP-запросом без рендеринга;
+            страница считается полной, если в ней есть content_selector (если задан) и не меньше min_text_length символов текста.
+        static_probe_limit - после стольких неудачных попыток без единой удачной хост обрабатывается только через браузер.
+        resource_filter - необязательная политика перехвата запросов (ResourceFilter) для вкладок браузера.
+        readiness - параметры ожидания готовности страницы (см. DEFAULT_READINESS),
+        site_readiness - те же параметры для отдельных хостов: {netloc: {...}}.
+        parser - парсер BeautifulSoup для разбора страниц ('html.parser', 'lxml', 'html5lib').
+        scheduler - необязательный планировщик запросов по хостам (PolitenessScheduler): через него проходят
+            проверки актуальности, статические загрузки, рендеринг и загрузка изображений.
+        metrics - необязательный сбор времени фаз обработки страниц (utils.metrics.CrawlMetrics); фазы
+            измеряются вокруг вызовов clean_content, wait_for_page_load и т.д., поэтому переопределения
+            этих методов в наследниках учитываются без изменений.
+        parse_workers - количество потоков для разбора HTML, чтобы цикл событий тем временем управлял
+            браузером (0 - разбор в цикле событий). Отрендеренная страница тогда передаётся в clean_content
+            уже разобранной.
+        headless - запускать браузер без окна.
+        recycle_after - вкладка, загрузившая столько страниц, закрывается и заменяется новой (0 - не заменять).
+        max_browser_rss - при превышении этой памяти (МБ) процессами браузера контекст пересоздаётся вместе
+            со всеми вкладками, cookies и localStorage переносятся в новый контекст. Нужен psutil.
+        session - необязательное хранилище состояния авторизации (utils.session.SessionStore): контекст
+            создаётся с сохранённым состоянием, а вход выполняется, только если сайт перенаправил на login_url.
+        network_capture - необязательная запись ответов XHR/fetch при рендеринге (utils.network_capture.NetworkCapture):
+            если build_content строит по ним контент, DOM страницы не разбирается, а когда адреса API известны,
+            страницы получаются запросами к API без рендеринга.
         """
         self.base_url = base_url
         
         self.login_url = login_url
         self.login_credentials = login_credentials or {}
         self.user_agent = user_agent or USER_AGENT
+        self.pages_count = max(1, pages_count)
+        self.revalidation = revalidation
+        self.static_first = static_first
+        self.content_selector = content_selector
+        self.min_text_length = min_text_length
+        self.static_probe_limit = static_probe_limit
+        # Способ загрузки, который сработал для URL: 'static' или 'render'
+        self.fetch_paths = {}
+        # Статистика статической загрузки по хостам: [успешно, неудачно]
+        self.static_stats = {}
+        self.resource_filter = resource_filter
+        self.readiness = {**DEFAULT_READINESS, **self.default_readiness, **(readiness or {})}
+        self.site_readiness = site_readiness or {}
+        self.parser = check_parser(parser)
+        self.scheduler = scheduler
+        self.metrics = metrics or NullMetrics()
+        self.parse_pool = ThreadPoolExecutor(max_workers=parse_workers, thread_name_prefix='parse') if parse_workers else None
+        self.headless = headless
+        self.recycle_after = recycle_after
+        if max_browser_rss and psutil is None:
+            logging.warning("max_browser_rss не действует: не установлен psutil")
+            max_browser_rss = None
+        self.max_browser_rss = max_browser_rss
+        # Загрузок страниц всего и по вкладкам (вкладка -> количество) с момента её создания
+        self.navigations_total = 0
+        self.navigations = {}
+        self.recycle_lock = asyncio.Lock()
+        self.session = session
+        self.session_restored = False
+        # Номер успешного входа: вкладки, одновременно попавшие на страницу входа, выполняют вход один раз
+        self.login_generation = 0
+        self.login_lock = asyncio.Lock()
+        self.network_capture = network_capture
+        # Дата изменения страниц из sitemap (URL -> timestamp), заполняется краулером при обнаружении
+        self.lastmod = {}
         self.playwright = None
         self.browser = None
         self.context = None
         self.page = None
+        self.pages_pool = None
 
     async def __aenter__(self):
         self.playwright = await async_playwright().start()
-        self.browser = await self.playwright.chromium.launch(headless=False)
-        self.context = await self.browser.new_context(user_agent=self.user_agent, accept_downloads=True)
-        self.page = await self.context.new_page()
+        self.browser = await self.playwright.chromium.launch(headless=self.headless)
+        storage_state = self.session.load() if self.session else None
+        self.session_restored = storage_state is not None
+        await self.open_context(storage_state=storage_state)
         return self
 
+    async def open_context(self, storage_state=None):
+        """
+        Создаёт BrowserContext и кладёт в пул его вкладки: основную (используется для входа) плюс дополнительные.
+        """
+        self.context = await self.browser.new_context(user_agent=self.user_agent, accept_downloads=True, storage_state=storage_state)
+        if self.resource_filter:
+            await self.context.route("**/*", self.resource_filter.handle)
+        self.page = await self.new_page()
+        pages = [self.page] + [await self.new_page() for _ in range(self.pages_count - 1)]
+        if self.pages_pool is None:
+            self.pages_pool = asyncio.Queue()
+        for page in pages:
+            self.pages_pool.put_nowait(page)
+
+    async def new_page(self):
+        """
+        Создаёт вкладку. Обработчики событий подключаются здесь, один раз на вкладку.
+        """
+        page = await self.context.new_page()
+        if self.resource_filter:
+            self.resource_filter.attach(page)
+        if self.network_capture:
+            self.network_capture.attach(page)
+        page.on("console", self.on_console)
+        return page
+
+    def on_console(self, msg):
+        if msg.type == "error":
+            logging.warning(f"Console {msg.type}: {msg.text}")
+
+    @asynccontextmanager
+    async def acquire_page(self):
+        """
+        Берёт свободную вкладку из пула и возвращает её после использования.
+        Вкладка, загрузившая recycle_after страниц, перед выдачей заменяется новой.
+        """
+        if self.max_browser_rss and self.navigations_total % RSS_CHECK_INTERVAL == 0 and self.navigations_total:
+            await self.check_browser_memory()
+        page = await self.pages_pool.get()
+        try:
+            if self.recycle_after and self.navigations.get(page, 0) >= self.recycle_after:
+                page = await self.replace_page(page)
+            self.navigations[page] = self.navigations.get(page, 0) + 1
+            self.navigations_total += 1
+            yield page
+        finally:
+            self.pages_pool.put_nowait(page)
+
+    async def replace_page(self, page):
+        """
+        Возвращает новую вкладку вместо page, чтобы память рендерера не накапливалась. Старая вкладка
+        закрывается в фоне: если ожидание прервут, в пул вернётся рабочая вкладка.
+        """
+        try:
+            new_page = await self.new_page()
+        except Exception as e:
+            logging.warning(f"Не удалось заменить вкладку: {e}")
+            return page
+        self.navigations.pop(page, None)
+        if page is self.page:
+            self.page = new_page
+        asyncio.create_task(self.close_quietly(page))
+        self.metrics.count('pages_recycled')
+        return new_page
+
+    async def close_quietly(self, target):
+        try:
+            await target.close()
+        except Exception as e:
+            logging.debug(f"Ошибка при закрытии {target}: {e}")
+
+    def browser_rss(self):
+        """
+        Память (RSS, МБ) процессов браузера - дочерних процессов Chromium.
+        """
+        total = 0
+        for child in psutil.Process().children(recursive=True):
+            try:
+                name = child.name().lower()
+                if 'chrom' in name or 'headless_shell' in name:
+                    total += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return total / 2**20
+
+    async def check_browser_memory(self):
+        if self.recycle_lock.locked():
+            return
+        rss = await asyncio.to_thread(self.browser_rss)
+        if rss > self.max_browser_rss:
+            logging.info(f"Память браузера {rss:.0f} МБ больше {self.max_browser_rss} МБ, контекст пересоздаётся")
+            await self.recycle_context()
+
+    async def recycle_context(self):
+        """
+        Пересоздаёт BrowserContext вместе со всеми вкладками, перенося cookies и localStorage.
+        Ждёт, пока все вкладки вернутся в пул. Запросы через context.request, выполняющиеся
+        в этот момент (изображения), завершаются ошибкой и повторяются уже в новом контексте.
+        """
+        async with self.recycle_lock:
+            pages = []
+            (old_context, old_page) = (self.context, self.page)
+            try:
+                for _ in range(self.pages_count):
+                    pages.append(await self.pages_pool.get())
+                await self.open_context(storage_state=await old_context.storage_state())
+            except BaseException as e:
+                logging.error(f"Не удалось пересоздать контекст браузера: {e!r}")
+                if self.context is not old_context:
+                    asyncio.create_task(self.close_quietly(self.context))
+                (self.context, self.page) = (old_context, old_page)
+                for page in pages:
+                    self.pages_pool.put_nowait(page)
+                if not isinstance(e, Exception):
+                    raise
+                return
+            self.navigations = {}
+            await self.close_quietly(old_context)
+            self.metrics.count('contexts_recycled')
+
     async def __aexit__(self, exc_type, exc, tb):
+        if self.scheduler:
+            self.scheduler.log_snapshot()
+        if self.login_generation or self.session_restored:
+            # Сайт мог продлить cookies за время обхода
+            await self.save_session()
         await self.context.close()
         await self.browser.close()
         await self.playwright.stop()
+        if self.parse_pool:
+            self.parse_pool.shutdown()
+
+    async def parse(self, content, parser=None):
+        """
+        Разбирает контент (см. ensure_soup); строка разбирается в пуле потоков, если он задан.
+        """
+        parser = parser or self.parser
+        if self.parse_pool and isinstance(content, str):
+            return await asyncio.get_running_loop().run_in_executor(self.parse_pool, make_soup, content, parser)
+        return ensure_soup(content, parser)
 
-    async def wait_for_page_load(self, timeout=30000):
+    def schedule(self, url):
+        """
+        Ожидает разрешения планировщика на запрос к хосту url. Результат запроса передаётся
+        через slot.record_response(response).
+        """
+        return self.scheduler.slot(url) if self.scheduler else unlimited_slot()
+
+    def get_readiness(self, url):
+        return {**self.readiness, **self.site_readiness.get(urlparse(url).netloc, {})}
+
+    async def wait_for_page_load(self, page=None, timeout=None, **overrides):
+        """
+        Ждёт, пока страница действительно готова: DOM перестал меняться в течение quiet_ms,
+        появился ready_selector (если задан), исчезли видимые индикаторы загрузки
+        и (опционально) затихла сеть. Ожидание ограничено timeout миллисекундами.
+        """
+        page = page or self.page
+        options = self.get_readiness(page.url)
+        options.update(overrides)
+        if timeout is not None:
+            options['timeout'] = timeout
         try:
-            # Wait for the page to reach the 'load' state
-            await self.page.wait_for_load_state('load', timeout=timeout)
-            
-            # Wait for any remaining dynamic content
-            await self.page.evaluate('''() => {
-                return new Promise((resolve) => {
-                    try {
-                        if (document.readyState === 'complete') {
-                            // Add a small delay to allow for any final rendering
-                            setTimeout(resolve, 1000);
-                        } else {
-                            window.addEventListener('load', () => setTimeout(resolve, 1000));
-                        }
-                    } catch (error) {
-                        resolve();
-                    }
-                })
-            }''')
-            
-            # Optional: Check for any loading indicators
-            loading_indicator_gone = await self.page.evaluate('''() => {
-                const loaders = document.querySelectorAll('.loading, .spinner, .loader');
-                return loaders.length === 0;
-            }''')
+            await page.wait_for_load_state('domcontentloaded', timeout=options['timeout'])
+            if options['network_idle']:
+                try:
+                    await page.wait_for_load_state('networkidle', timeout=options['timeout'])
+                except PlaywrightTimeoutError:
+                    logging.debug(f"Сеть не затихла за {options['timeout']} мс: {page.url}")
+
+            is_ready = await page.evaluate(READINESS_SCRIPT, {
+                'readySelector': options['ready_selector'],
+                'loaderSelector': options['loader_selector'],
+                'quietMs': options['quiet_ms'],
+                'timeout': options['timeout'],
+            })
+
+            if not is_ready:
+                logging.warning(f"Warning: page not settled within {options['timeout']} ms (loading indicators or missing content) on {page.url}")
             
-            if not loading_indicator_gone:
-                logging.warning(f"Warning: Possible loading indicators still present on {self.page.url}")
-            
-        except TimeoutError:
-            logging.error(f"Timeout waiting for page to load: {self.page.url}")
-        
-        # Capture any console errors
-        self.page.on("console", lambda msg: print(f"Console {msg.type}: {msg.text}") if msg.type == "error" else None)
+        except PlaywrightTimeoutError:
+            logging.error(f"Timeout waiting for page to load: {page.url}")
 
-    async def login(self):
+    async def login(self, page=None):
         if not self.login_url:
             return True # Вход не требуется
         try:
@@ -128,52 +460,392 @@ class IHTMLRetriever:
             logging.error(f"Не удалось выполнить вход на {self.login_url}: {e}")
             return False
 
-    async def clean_content(self, html_content):
-        return str(html_content)
+    def is_auth_redirect(self, url):
+        """
+        url - страница входа, на которую сайт перенаправляет при недействительной сессии.
+        """
+        return bool(self.login_url) and urlparse(url).path.rstrip('/') == urlparse(self.login_url).path.rstrip('/')
+
+    async def authenticate(self):
+        """
+        Выполняет вход перед обходом, если не удалось восстановить сохранённую сессию.
+        С восстановленной сессией вход откладывается до первого перенаправления на страницу входа.
+        """
+        if self.session_restored:
+            return True
+        return await self.relogin()
+
+    async def relogin(self, generation=None):
+        """
+        Выполняет вход в одной из вкладок пула и сохраняет состояние сессии. Вкладки делят один контекст
+        и его cookies, поэтому вход нужен один раз: если после generation вход уже выполнен другой
+        вкладкой, достаточно повторить загрузку.
+        """
+        async with self.login_lock:
+            if generation is not None and generation != self.login_generation:
+                return True
+            async with self.acquire_page() as page:
+                if not await self.login(page):
+                    return False
+            self.login_generation += 1
+            self.metrics.count('logins')
+            await self.save_session()
+            return True
+
+    async def save_session(self):
+        if not self.session:
+            return
+        try:
+            self.session.save(await self.context.storage_state())
+        except Exception as e:
+            logging.warning(f"Не удалось сохранить состояние сессии: {e}")
+
+    async def clean_content(self, html_content, url=None):
+        """
+        Очищает контент страницы. Может вернуть строку или уже разобранное дерево (BeautifulSoup/Tag) -
+        тогда краулер использует его без повторного разбора.
+        """
+        return html_content
+
+    async def build_content(self, payloads, url):
+        """
+        Строит контент страницы из записанных ответов API ({имя: данные}, см. network_capture).
+        Возвращает None, если контент нужно получать из DOM; наследники для SPA переопределяют.
+        """
+        return None
+
+    async def revalidate(self, url):
+        """
+        Проверяет без рендеринга, изменилась ли ранее загруженная страница.
+        Возвращает сохранённый контент для неизменившейся страницы или None.
+        """
+        entry = self.revalidation.get(url)
+        if not entry or not entry['content']:
+            return None
+        if (lastmod := self.lastmod.get(url)) and entry['checked_at'] and lastmod <= entry['checked_at']:
+            logging.info(f"Не изменилась (lastmod из sitemap): {url}")
+            self.revalidation.mark_unchanged(url)
+            self.metrics.count('unchanged_lastmod', url=url)
+            return entry['content']
+        if not self.revalidation.trust_raw_digest:
+            # Ответ навигации SPA - общая для всех страниц оболочка, и её валидаторы не говорят об изменении
+            # самой страницы: актуальность проверяется по ответам API в retrieve_captured или по контенту после рендеринга
+            return None
+        headers = self.revalidation.conditional_headers(entry)
+        try:
+            with self.metrics.phase('revalidate', url):
+                async with self.schedule(url) as slot:
+                    response = await self.context.request.get(url, headers=headers, timeout=30000)
+                    slot.record_response(response)
+                unchanged = response.status == 304 or (
+                    response.status < 400 and entry['raw_digest'] == digest(await response.body())
+                )
+            if unchanged:
+                logging.info(f"Не изменилась ({'304' if response.status == 304 else 'совпадает хеш'}): {url}")
+                self.revalidation.mark_unchanged(url)
+                self.metrics.count('unchanged', url=url)
+                return entry['content']
+        except Exception as e:
+            logging.warning(f"Не удалось проверить актуальность {url}: {e}")
+        return None
+
+    async def response_digest(self, response):
+        try:
+            return digest(await response.body())
+        except Exception as e:
+            logging.debug(f"Тело ответа недоступно для {response.url}: {e}")
+            return ''
+
+    def choose_fetch_path(self, url):
+        """
+        Выбирает способ загрузки: по результату прошлой загрузки URL, иначе по статистике хоста.
+        """
+        if url in self.fetch_paths:
+            return self.fetch_paths[url]
+        (succeeded, failed) = self.static_stats.get(urlparse(url).netloc, (0, 0))
+        if not succeeded and failed >= self.static_probe_limit:
+            return 'render'
+        return 'static'
+
+    def update_static_stats(self, url, succeeded):
+        host = urlparse(url).netloc
+        stats = self.static_stats.setdefault(host, [0, 0])
+        stats[0 if succeeded else 1] += 1
+        self.fetch_paths[url] = 'static' if succeeded else 'render'
+
+    def has_required_content(self, soup):
+        """
+        Проверяет, что статический HTML уже содержит нужный краулеру контент.
+        """
+        if self.content_selector:
+            root = soup.select_one(self.content_selector)
+            if root is None:
+                return False
+        else:
+            root = soup.body or soup
+        return len(root.get_text(" ", strip=True)) >= self.min_text_length
+
+    def remember_content(self, url, content, headers, raw_digest, document=True):
+        """
+        Сохраняет контент для повторного обхода. document - headers и raw_digest относятся к ответу
+        на запрос самой страницы; без trust_raw_digest они не сохраняются (см. revalidate).
+        """
+        if self.revalidation and content:
+            if document and not self.revalidation.trust_raw_digest:
+                (headers, raw_digest) = ({}, '')
+            self.revalidation.record(
+                url,
+                str(content),
+                etag=get_header(headers, 'ETag'),
+                last_modified=get_header(headers, 'Last-Modified'),
+                raw_digest=raw_digest,
+            )
+
+    async def retrieve_static(self, url):
+        """
+        Получает страницу HTTP-запросом без браузера.
+        Возвращает None, если страницу нужно рендерить в браузере.
+        """
+        try:
+            with self.metrics.phase('static_fetch', url):
+                async with self.schedule(url) as slot:
+                    response = await self.context.request.get(url, timeout=30000)
+                    slot.record_response(response)
+                content_type = get_header(response.headers, 'Content-Type').lower()
+                body = await response.body() if response.status < 400 and 'text/html' in content_type else None
+            if body is None:
+                logging.debug(f"Статическая загрузка не подходит для {url}: статус {response.status}, тип {content_type}")
+                self.update_static_stats(url, False)
+                return None
+            with self.metrics.phase('parse', url):
+                soup = await self.parse(body.decode('utf-8', errors='replace'))
+            if not self.has_required_content(soup):
+                logging.debug(f"В статическом HTML нет нужного контента, переход к рендерингу: {url}")
+                self.update_static_stats(url, False)
+                return None
+            with self.metrics.phase('clean_content', url):
+                content = await self.clean_content(soup, response.url)
+            if not content:
+                self.update_static_stats(url, False)
+                return None
+        except Exception as e:
+            logging.warning(f"Ошибка статической загрузки {url}: {e}")
+            self.update_static_stats(url, False)
+            return None
+        self.update_static_stats(url, True)
+        self.metrics.count('static', url=url)
+        self.metrics.count('html_size', len(body), url=url)
+        logging.debug(f"Страница получена без рендеринга: {url}")
+        self.remember_content(url, content, response.headers, digest(body))
+        return content
+
+    async def render_content(self, url):
+        """
+        Загружает и рендерит страницу в браузере.
+        """
+        payloads = None
+        async with self.schedule(url) as slot, self.acquire_page() as page:
+            if self.resource_filter:
+                self.resource_filter.start_page(page)
+            if self.network_capture:
+                self.network_capture.start_page(page)
+            try:
+                generation = self.login_generation
+                started = time.monotonic()
+                with self.metrics.phase('navigate', url):
+                    response = await page.goto(url, timeout=30000, wait_until='domcontentloaded')  # Таймаут 30 секунд
+                slot.record_response(response, latency=time.monotonic() - started)
+                if response is None:
+                    logging.warning(f"Нет ответа для {url}")
+                    return ""
+                status = response.status
+                if status >= 400:
+                    logging.warning(f"Получен статус {status} для {url}")
+                    return ""
+                with self.metrics.phase('readiness', url):
+                    await self.wait_for_page_load(page)
+                if self.is_auth_redirect(page.url):
+                    raise AuthRedirect(url, generation)
+
+                content_type = get_header(response.headers, 'Content-Type').lower()
+                if 'text/html' not in content_type:
+                    logging.warning(f"Пропуск не-HTML контента: {url}")
+                    return ""
+                with self.metrics.phase('page_content', url):
+                    html_content = await page.content()
+                page_url = page.url
+                if self.network_capture:
+                    with self.metrics.phase('capture', url):
+                        payloads = await self.network_capture.finish_page(page, page_url)
+            finally:
+                if self.network_capture:
+                    self.network_capture.discard_page(page)
+                if self.resource_filter:
+                    self.resource_filter.finish_page(page, url)
+
+        self.metrics.count('render', url=url)
+        self.metrics.count('html_size', len(html_content), url=url)
+        content = None
+        # Без всех нужных ответов (например, ответ дерева был общим, а не этой статьи) контент берётся из DOM
+        if payloads and self.network_capture.is_complete(payloads):
+            with self.metrics.phase('build_content', url):
+                content = await self.build_content(payloads, page_url)
+        if content:
+            self.metrics.count('captured', url=url)
+        else:
+            if self.parse_pool:
+                # Вкладка уже возвращена в пул и загружает следующую страницу, пока эта разбирается
+                with self.metrics.phase('parse', url):
+                    html_content = await self.parse(html_content)
+            with self.metrics.phase('clean_content', url):
+                content = await self.clean_content(html_content, page_url)
+        self.remember_content(url, content, response.headers, await self.response_digest(response))
+        return content
+
+    async def retrieve_captured(self, url):
+        """
+        Получает страницу запросами к API по адресам, известным из записанных при рендеринге ответов.
+        Возвращает None, если адреса ещё неизвестны или контент не удалось построить - тогда страница рендерится.
+        """
+        endpoints = self.network_capture.endpoint_urls(url)
+        if not endpoints:
+            return None
+        generation = self.login_generation
+        payloads = {}
+        bodies = []
+        try:
+            with self.metrics.phase('api_fetch', url):
+                for (name, api_url) in endpoints.items():
+                    async with self.schedule(api_url) as slot:
+                        response = await self.context.request.get(api_url, timeout=30000)
+                        slot.record_response(response)
+                    if response.status in (401, 403) or self.is_auth_redirect(response.url):
+                        raise AuthRedirect(url, generation)
+                    if response.status >= 400:
+                        logging.debug(f"Ответ {response.status} от {api_url}, страница будет отрендерена: {url}")
+                        return None
+                    body = await response.body()
+                    bodies.append(body)
+                    payloads[name] = json.loads(body)
+        except AuthRedirect:
+            raise
+        except Exception as e:
+            logging.warning(f"Ошибка запроса к API для {url}, страница будет отрендерена: {e}")
+            return None
+        raw_digest = digest(b''.join(bodies))
+        entry = self.revalidation.get(url) if self.revalidation else None
+        if entry and entry['content'] and entry['raw_digest'] == raw_digest:
+            # Ответы API относятся к самой странице, поэтому совпадение их хеша надёжно и для SPA
+            logging.info(f"Не изменилась (совпадает хеш ответов API): {url}")
+            self.revalidation.mark_unchanged(url)
+            self.metrics.count('unchanged', url=url)
+            return entry['content']
+        with self.metrics.phase('build_content', url):
+            content = await self.build_content(payloads, url)
+        if not content:
+            return None
+        self.metrics.count('api', url=url)
+        logging.debug(f"Страница получена через API без рендеринга: {url}")
+        # Валидаторы ответов API не подходят для условного запроса к самой странице
+        self.remember_content(url, content, {}, raw_digest, document=False)
+        return content
 
     async def retrieve_content(self, url):
         """
         Получает HTML-контент по заданному URL.
         """
         try:
-            response = await self.page.goto(url, timeout=30000)  # Таймаут 30 секунд
-            if response is None:
-                logging.warning(f"Нет ответа для {url}")
-                return ""
-            status = response.status
-            if status >= 400:
-                logging.warning(f"Получен статус {status} для {url}")
-                return ""
-            await self.wait_for_page_load(self.page)
-            await self.page.wait_for_timeout(2000)
-
-            content_type = get_header(response.headers, 'Content-Type').lower()
-            if 'text/html' not in content_type:
-                logging.warning(f"Пропуск не-HTML контента: {url}")
-                return ""
-            html_content = await self.page.content()
-
-            content = await self.clean_content(html_content)
-
-            return content
+            if self.revalidation and (content := await self.revalidate(url)) is not None:
+                return content
+            if self.static_first and self.choose_fetch_path(url) == 'static':
+                content = await self.retrieve_static(url)
+                if content is not None:
+                    return content
+            try:
+                if self.network_capture and (content := await self.retrieve_captured(url)) is not None:
+                    return content
+                return await self.render_content(url)
+            except AuthRedirect as redirect:
+                logging.info(f"{redirect}, выполняется вход")
+                if not await self.relogin(redirect.generation):
+                    return ""
+                return await self.render_content(url)
         except Exception as e:
             logging.error(f"Не удалось получить {url}: {e}")
             return ""
 
 class IWebCrawler:
-    def __init__(self, retriever, output_dir='output', images_dir='images', duplicate_tags=None, no_images=False, max_depth=5, non_recursive_classes=None, navigation_classes=None, ignored_classes=None, allowed_domains = None):
+    def __init__(self, retriever, output_dir='output', images_dir='images', duplicate_tags=None, no_images=False, max_depth=5, non_recursive_classes=None, navigation_classes=None, ignored_classes=None, allowed_domains = None, state=None, image_workers=4, image_freshness=7 * 24 * 3600, parser=None, link_mode='inline', frontier=None, seen_backend='set', seen_options=None, discovery=None, shared_store=None, shared_scope='crawl', metrics=None, markdown_engine='html2text', markdown_options=None, markdown_workers=0, prefetch=0, markdown_queue=0, sink_options=None):
         """
         Инициализация WebCrawler.
+        state - необязательное хранилище состояния (CrawlStateStore) для продолжения прерванного обхода.
+        image_workers - количество параллельных загрузок изображений.
+        image_freshness - сколько секунд загруженное изображение считается актуальным и не запрашивается повторно.
+        parser - парсер BeautifulSoup, по умолчанию тот же, что у retriever.
+        link_mode - 'inline': контент дочерних страниц встраивается в родителя;
+            'reference': каждая страница сохраняется один раз в output_dir/pages, а родитель содержит
+            только маркеры START/END_LINKED_CONTENT_FROM (полный документ собирает utils.linked_content.assemble).
+        frontier - допуск ссылок в обход (utils.frontier.Frontier): канонизация URL, область обхода, отсев повторов.
+            По умолчанию строится по base_url retriever и allowed_domains.
+        seen_backend - хранение посещённых URL и хешей дубликатов (utils.seen_sets): 'set', 'digest' или 'bloom'.
+            Для обходов из миллионов страниц и блоков 'digest' и 'bloom' занимают в десятки раз меньше памяти.
+        seen_options - параметры множества, например {'error_rate': 1e-4} для 'bloom'.
+        discovery - необязательное обнаружение URL по robots.txt и sitemap (utils.discovery.SiteDiscovery).
+            URL из sitemap обходятся после стартовой страницы, недавно изменённые первыми, вместо ссылок
+            навигационных элементов; Disallow и Crawl-delay применяются к фронтиру и планировщику retriever.
+        shared_store - общее для процессов хранилище (utils.sharding.SharedCrawlStore): посещённые страницы
+            и хеши дубликатов берутся из него, чтобы несколько воркеров не обрабатывали одно и то же.
+        shared_scope - 'crawl': общие множества свои для каждого стартового URL (как при обходе в одном процессе),
+            'global': каждая страница и каждый блок попадают в результат один раз на все стартовые URL.
+        metrics - сбор времени фаз обработки страниц (utils.metrics.CrawlMetrics), по умолчанию тот же, что у retriever.
+            Страница считается обработанной, когда возвращается вызов process_page, поэтому в её событие
+            попадает и работа, которую наследники выполняют после super().process_page().
+        markdown_engine - конвертер HTML -> Markdown ('html2text' или 'markdownify'), markdown_options - его параметры.
+        markdown_workers - количество процессов для конвертации, чтобы она не блокировала цикл событий
+            (0 - конвертация в текущем потоке).
+        prefetch - сколько страниц при последовательном обходе загружать заранее (включая текущую), пока
+            краулер разбирает уже загруженные: браузер работает одновременно с Python (0 - без опережающей загрузки).
+        markdown_queue - сколько страниц верхнего уровня могут одновременно ожидать конвертации в Markdown
+            и записи; обход продолжается, пока они конвертируются, а при заполнении очереди ждёт её
+            (0 - конвертация и запись до перехода к следующей странице). Порядок записи сохраняется.
+        sink_options - параметры буферизованной записи файлов результата (utils.output_sink.DEFAULT_SINK_OPTIONS):
+            размер буфера, интервал сброса, политика fsync.
         """
         self.retriever = retriever
         self.output_dir = Path(output_dir)
         self.no_images = no_images
         self.images_dir = self.output_dir / images_dir
-        self.base_netloc = urlparse(retriever.base_url).netloc
+        self.image_freshness = image_freshness
+        self.image_workers = image_workers
+        self.parser = check_parser(parser or getattr(retriever, 'parser', 'html.parser'))
+        if link_mode not in ('inline', 'reference'):
+            raise ValueError(f"Неизвестный link_mode: {link_mode}")
+        self.link_mode = link_mode
         self.max_depth = max_depth
         self.non_recursive_classes = non_recursive_classes or []
         self.ignored_classes = ignored_classes or []
         self.allowed_domains = allowed_domains or []
+        self.frontier = frontier or Frontier(retriever.base_url, self.allowed_domains)
+        self.base_netloc = self.frontier.base_netloc
+        # Параллельный обход включается, если у retriever больше одной вкладки
+        # (общие дочерние страницы при этом могут встраиваться в других родителей, см. process_links)
+        self.concurrent = getattr(retriever, 'pages_count', 1) > 1
+        self.state = state
+        self.crawl_id = None
+        self.seen_backend = seen_backend
+        self.seen_options = seen_options or {}
+        self.discovery = discovery
+        if shared_scope not in ('crawl', 'global'):
+            raise ValueError(f"Неизвестный shared_scope: {shared_scope}")
+        self.shared_store = shared_store
+        self.shared_scope = shared_scope
+        self.metrics = metrics or getattr(retriever, 'metrics', None) or NullMetrics()
+        self.markdown = MarkdownConverter(markdown_engine, markdown_options, workers=markdown_workers)
+        self.prefetcher = Prefetcher(retriever.retrieve_content, prefetch, self.metrics) if prefetch else None
+        self.output_stage = OrderedStage(self.write_page, markdown_queue) if markdown_queue else None
+        self.sink_options = sink_options
+        # Имя файла результата -> OutputSink, открытые в текущем обходе
+        self.sinks = {}
 
         # Навигационные классы
         self.navigation_classes = navigation_classes or []
@@ -185,11 +857,42 @@ class IWebCrawler:
         # Создание директорий для вывода и изображений
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self.images_dir.mkdir(parents=True, exist_ok=True)
+        self.page_store = PageStore(self.output_dir / 'pages') if link_mode == 'reference' else None
+        self.image_downloader = ImageDownloader(
+            retriever,
+            self.images_dir,
+            workers=self.image_workers,
+            store=ImageStore(self.images_dir, freshness=self.image_freshness),
+            metrics=self.metrics,
+        )
 
     def initialize(self):
-        self.visited = set()
-        self.processed_elements = set()
-        self.processed_navigation = set()
+        self.visited = seen_sets.make_seen_set(self.seen_backend, **self.seen_options)
+        self.processed_elements = seen_sets.make_seen_set(self.seen_backend, **self.seen_options)
+        self.processed_navigation = seen_sets.make_seen_set(self.seen_backend, **self.seen_options)
+        # Родительская страница для каждой встраиваемой ссылки (нужна для восстановления состояния)
+        self.parents = {}
+        # URL из sitemap, которые будут обойдены после стартовой страницы: {URL: глубина}
+        self.seeds = {}
+
+    def attach_shared_store(self, start_url):
+        namespace = start_url if self.shared_scope == 'crawl' else ''
+        self.visited = self.shared_store.seen_set('visited', namespace)
+        self.processed_elements = self.shared_store.seen_set('element', namespace)
+        self.processed_navigation = self.shared_store.seen_set('navigation', namespace)
+
+    def restore_state(self, start_url):
+        """
+        Восстанавливает посещённые страницы и хеши дубликатов из хранилища состояния.
+        """
+        self.state.log_resume(start_url)
+        self.visited.update(self.state.load_visited(start_url))
+        self.processed_elements.update(self.state.load_hashes(start_url, 'element'))
+        self.processed_navigation.update(self.state.load_hashes(start_url, 'navigation'))
+
+    def remember_hash(self, kind, hash_value, url):
+        if self.state:
+            self.state.add_hash(self.crawl_id, kind, hash_value, url)
 
     def sanitize_filename(self, url):
         """
@@ -201,62 +904,42 @@ class IWebCrawler:
         filename = re.sub(r'[\\/*?:"<>|]', "_", filename)
         return filename
 
+    def get_sink(self, filename, mode='a'):
+        """
+        Возвращает поток записи файла результата, открывая его при первом обращении.
+        """
+        if filename not in self.sinks:
+            self.sinks[filename] = OutputSink(self.output_dir / filename, mode, self.sink_options)
+        return self.sinks[filename]
+
+    async def close_sinks(self):
+        """
+        Закрывает все файлы результата; ошибка закрытия одного не мешает закрыть остальные.
+        """
+        (sinks, self.sinks) = (list(self.sinks.values()), {})
+        results = await asyncio.gather(*(sink.close() for sink in sinks), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
     async def save_markdown(self, filename, content, title=None, url=None):
         """
-        Сохраняет Markdown-контент в файл с YAML фронтматером.
+        Сохраняет Markdown-контент в файл с YAML фронтматером. Текст попадает в буфер потока записи
+        файла и записывается на диск пакетами в порядке вызовов.
         """
         if content is None:
             content = ""
-        file_path = self.output_dir / filename
         front_matter = f"---\nTITLE: \"{title or filename}\"\nurl: \"{url or ''}\"\n---\n\n" if title or url else ""
-        async with aiofiles.open(file_path, 'a', encoding='utf-8') as f:
-            await f.write(front_matter + content + "\n\n===================================\n\n")
+        await self.get_sink(filename).write(front_matter + content + "\n\n===================================\n\n")
 
-    async def save_image(self, img_url, retries=3, delay=2):
+    async def save_image(self, img_url):
         """
-        Скачивает и сохраняет изображение с механизом повторных попыток.
+        Ставит изображение в очередь фоновой загрузки и сразу возвращает имя его файла.
         """
-        for attempt in range(1, retries + 1):
-            try:
-                if img_url.startswith('data:'):
-                    logging.warning(f"Пропуск изображения с data URI: {img_url}")
-                    return ""
-                
-                response = await self.retriever.page.goto(img_url, timeout=10000)  # Таймаут 10 секунд
-                if response is None:
-                    logging.warning(f"Не удалось скачать изображение: {img_url}")
-                    return ""
-                content_type = get_header(response.headers, 'Content-Type').lower()
-                if all(
-                    ct not in content_type
-                    for ct in [
-                        'image/jpeg',
-                        'image/png',
-                        'image/gif',
-                        'image/webp',
-                    ]
-                ):
-                    logging.warning(f"Пропуск не-изображения: {img_url}")
-                    return ""
-                img_bytes = await response.body()
-                parsed = urlparse(img_url)
-                ext = os.path.splitext(parsed.path)[1] or '.'+content_type.split('/')[1]
-                img_content_hash = hashlib.md5(img_bytes).hexdigest()
-                img_name = re.sub(r'[\\/*?:"<>|]', "_", parsed.path.strip("/").replace("/", "_")) or "image"
-                img_filename = f"{img_name}_{img_content_hash}{ext}"
-                img_path = self.images_dir / img_filename
-                async with aiofiles.open(img_path, 'wb') as f:
-                    await f.write(img_bytes)
-                logging.info(f"Сохранено изображение: {img_filename}")
-                return img_filename
-            except Exception as e:
-                logging.error(f"Попытка {attempt} - Ошибка при сохранении изображения {img_url}: {e}")
-                if attempt < retries:
-                    logging.info(f"Повтор через {delay} секунд...")
-                    await asyncio.sleep(delay)
-                else:
-                    logging.error(f"Не удалось сохранить изображение после {retries} попыток: {img_url}")
-                    return ""
+        if img_url.startswith('data:'):
+            logging.warning(f"Пропуск изображения с data URI: {img_url}")
+            return ""
+        return self.image_downloader.submit(img_url)
 
     async def process_navigation_link(self, link_url, current_depth = 0, filename = None):
         """
@@ -264,15 +947,33 @@ class IWebCrawler:
         """
         if filename is None:
             filename = self.sanitize_filename(link_url)
+        (content, markdown, links, images) = (None, "", [], [])
         if link_url not in self.visited:
             logging.info(f"Обработка навигационной ссылки: {link_url}")
             markdown = ""
             (content, links, images, _) = await self.process_page(link_url, filename=filename, current_depth=current_depth, check_duplicates_depth=8)
-            if content is not None:
-                markdown = self.html_to_markdown(content)
-                await self.save_markdown(filename, markdown)
+            if content is None:
+                self.metrics.page_done(link_url)
+            elif self.output_stage:
+                # Markdown будет записан позже, обход тем временем переходит к следующей странице
+                await self.output_stage.submit(self.convert_page(content, link_url), filename, link_url)
+            else:
+                markdown = await self.convert_page(content, link_url)
+                await self.write_page(markdown, filename, link_url)
         return (content, markdown, filename, links, images)
 
+    async def convert_page(self, content, url):
+        # В режиме ссылок process_page уже сконвертировал страницу и сохранил её в page_store
+        if self.page_store and (markdown := self.page_store.load(url)) is not None:
+            return markdown
+        with self.metrics.phase('html_to_markdown', url):
+            return await self.to_markdown(content)
+
+    async def write_page(self, markdown, filename, url):
+        with self.metrics.phase('save', url):
+            await self.save_markdown(filename, markdown)
+        self.metrics.page_done(url)
+
     async def remove_ignored_elements(self, soup, url):
         #Удаляем игнорируемые элементы
         for ignored_class in self.ignored_classes:
@@ -287,11 +988,10 @@ class IWebCrawler:
         for nav_class in self.navigation_classes:
             nav_elements = soup.find_all(class_=nav_class)
             for nav in nav_elements:
-                hashed_content = prepare_tag_for_hashing(nav, INSIGNIFICANT_TAGS, base_url=url)
-                nav_hash = hashlib.md5(hashed_content.encode('utf-8')).hexdigest()
-                if nav_hash not in self.processed_navigation:
+                nav_hash = format_fingerprint(compute_link_fingerprints(nav, url)[id(nav)])
+                if seen_sets.claim(self.processed_navigation, nav_hash):
                     logging.debug(f"Добавлен в очередь навигационный элемент с классом {nav_class} из {url}")
-                    self.processed_navigation.add(nav_hash)
+                    self.remember_hash('navigation', nav_hash, url)
                     navigators.append(nav.__copy__())
                 # Удаление навигационного элемента из содержимого страницы
                 nav.decompose()
@@ -302,22 +1002,27 @@ class IWebCrawler:
     async def remove_duplicates(self, soup, url):
         # Обработка дублирующихся элементов
         tags_to_decompose = []
-        for tag in soup.find_all(self.duplicate_tags):
-            cleaned_content = prepare_tag_for_hashing(tag, INSIGNIFICANT_TAGS, base_url=url)
-            if not cleaned_content:
-                continue
-            tag_hash = hashlib.md5(cleaned_content.encode('utf-8')).hexdigest()
+        if not self.duplicate_tags:
+            return
+        with self.metrics.phase('duplicates', url):
+            fingerprints = compute_link_fingerprints(soup, url)
+            for tag in soup.find_all(self.duplicate_tags):
+                fingerprint = fingerprints[id(tag)]
+                # Элементы без ссылок не проверяются
+                if not fingerprint[2]:
+                    continue
+                tag_hash = format_fingerprint(fingerprint)
 
-            if tag_hash in self.processed_elements:
-                tags_to_decompose.append(tag)
-                logging.debug(f"Дублирующий элемент {tag} будет пропущен на {url}")
-            else:
-                self.processed_elements.add(tag_hash)
-                logging.debug(f"Новый элемент обработан на {url}")
+                if not seen_sets.claim(self.processed_elements, tag_hash):
+                    tags_to_decompose.append(tag)
+                    logging.debug(f"Дублирующий элемент <{tag.name}> будет пропущен на {url}")
+                else:
+                    self.remember_hash('element', tag_hash, url)
+                    logging.debug(f"Новый элемент обработан на {url}")
 
-        for tag in tags_to_decompose:
-            tag.decompose()
-            logging.debug(f"Дублирующий элемент удалён из {url}")
+            for tag in tags_to_decompose:
+                tag.decompose()
+                logging.debug(f"Дублирующий элемент удалён из {url}")
         
 
     async def get_images_elements(self, soup):
@@ -357,40 +1062,223 @@ class IWebCrawler:
         wrapper['class'] = 'embedded-content'
 
         start = f"\n\n##START_LINKED_CONTENT_FROM: {link_url}\n"
-        wrapper.append(BeautifulSoup(start, "html.parser"))
+        wrapper.append(NavigableString(start))
 
-        wrapper.append(BeautifulSoup(linked_content, "html.parser"))
+        # Узлы дочернего дерева переносятся в родителя без сериализации и повторного разбора
+        wrapper.append(ensure_soup(linked_content))
 
         end = f"\n##END_LINKED_CONTENT_FROM: {link_url}\n\n"
-        wrapper.append(BeautifulSoup(end, "html.parser"))
+        wrapper.append(NavigableString(end))
 
         replace_tag(link_element, wrapper)
         return wrapper
 
-    async def process_navigators(self, navigators, url, current_depth, filename):
+    async def replace_with_reference(self, soup, link_url, link_element):
+        """
+        Заменяет ссылку маркерами связанного контента без самого контента (режим link_mode='reference').
+        """
+        wrapper = soup.new_tag('div')
+        wrapper['class'] = 'embedded-content'
+        wrapper.append(NavigableString(f"\n\n##START_LINKED_CONTENT_FROM: {link_url}\n"))
+        wrapper.append(NavigableString(f"\n##END_LINKED_CONTENT_FROM: {link_url}\n\n"))
+        replace_tag(link_element, wrapper)
+        return wrapper
+
+    async def embed_linked_content(self, soup, linked_content, link_url, link_element):
+        if self.link_mode == 'reference':
+            return await self.replace_with_reference(soup, link_url, link_element)
+        return await self.replace_with_linked_content(soup, linked_content, link_url, link_element)
+
+    def navigation_targets(self, navigators, url):
+        """
+        Ссылки навигационных элементов страницы url: [(href, канонический URL)].
+        """
+        return [(a['href'], self.frontier.canonicalize(urljoin(url, a['href']))) for nav in navigators for a in nav.find_all('a', href=True)]
+
+    async def process_navigation_targets(self, targets, current_depth, filename):
         # Извлечение и обработка ссылок из навигационного элемента
-        for nav in navigators:
-            for a in nav.find_all('a', href=True):
-                link_url = urljoin(url, a['href'])
-                if link_url not in self.visited:
-                    logging.info(f"Обрабатываю навигационную ссылку {a['href']} на {link_url}")
-                    await self.process_navigation_link(link_url, current_depth=current_depth, filename=filename)
+        if self.concurrent:
+            link_urls = []
+            for (_, link_url) in targets:
+                if self.is_navigation_target(link_url) and link_url not in link_urls:
+                    link_urls.append(link_url)
+            await asyncio.gather(*(self.process_navigation_link(link_url, current_depth=current_depth, filename=filename) for link_url in link_urls))
+            return
+        for (i, (href, link_url)) in enumerate(targets):
+            if self.is_navigation_target(link_url):
+                self.prefetch_navigation((target for (_, target) in targets[i:]), current_depth)
+                logging.info(f"Обрабатываю навигационную ссылку {href} на {link_url}")
+                await self.process_navigation_link(link_url, current_depth=current_depth, filename=filename)
+
+    def is_navigation_target(self, link_url):
+        # Ссылки из sitemap обходятся отдельно, в порядке lastmod
+        return link_url and link_url not in self.visited and link_url not in self.seeds and self.frontier.allowed(link_url)
+
+    def seed_depth(self, url, start_url):
+        """
+        Глубина URL из sitemap относительно start_url или None, если URL не относится к этому обходу.
+        По умолчанию относятся только URL внутри пути start_url: глубина - количество сегментов пути после него.
+        Сайтам, у которых иерархия не отражена в URL, нужно переопределить метод, иначе URL из sitemap не обходятся.
+        """
+        (start, target) = (urlparse(start_url), urlparse(url))
+        prefix = start.path.rstrip('/') + '/'
+        if target.netloc != start.netloc or not target.path.startswith(prefix):
+            return None
+        depth = len([segment for segment in target.path[len(prefix):].split('/') if segment])
+        return depth or None
+
+    async def discover(self, start_url):
+        """
+        Загружает robots.txt и sitemap, применяет их правила и возвращает URL для обхода {URL: глубина}.
+        URL глубже max_depth отбрасываются.
+        """
+        await self.discovery.discover(start_url)
+        self.frontier.robots = self.discovery
+        scheduler = getattr(self.retriever, 'scheduler', None)
+        if delay := self.discovery.crawl_delay(start_url):
+            if scheduler:
+                scheduler.set_host_settings(urlparse(start_url).netloc, {'rate': 1 / delay, 'burst': 1})
+            else:
+                logging.warning(f"robots.txt задаёт Crawl-delay {delay} с, но у retriever нет планировщика")
+        seeds = {}
+        for (url, lastmod) in self.discovery.seeds():
+            (canonical, in_scope) = self.frontier.resolve(url)
+            if not in_scope or canonical in seeds or not self.frontier.allowed(canonical):
+                continue
+            depth = self.seed_depth(canonical, start_url)
+            if depth is not None and depth <= self.max_depth:
+                seeds[canonical] = depth
+                if lastmod:
+                    self.retriever.lastmod[canonical] = lastmod
+        logging.info(f"Из sitemap для {start_url}: {len(seeds)} URL")
+        return seeds
+
+    async def process_seeds(self, filename):
+        """
+        Обходит URL из sitemap, ещё не встроенные в другие страницы, как навигационные ссылки.
+        """
+        link_urls = [url for url in self.seeds if url not in self.visited]
+        if self.concurrent:
+            await asyncio.gather(*(
+                self.process_navigation_link(link_url, current_depth=self.seeds[link_url], filename=filename) for link_url in link_urls
+            ))
+            return
+        for (i, link_url) in enumerate(link_urls):
+            # Все URL из sitemap не глубже max_depth (см. discover)
+            self.prefetch_navigation(link_urls[i:], 0)
+            await self.process_navigation_link(link_url, current_depth=self.seeds[link_url], filename=filename)
 
     def get_title(self, soup, url):
         return soup.title.string.strip() if soup.title and soup.title.string else self.sanitize_filename(url)
 
-    async def process_links(self, links, url, soup, current_depth, images, filename):
-        for link in links:
-            link_element = link[0]
-            link_url = link[1]
-            if not link_url.startswith(('http://', 'https://')) or link_url == url or (urlparse(link_url).netloc not in self.allowed_domains and urlparse(link_url).netloc != self.base_netloc):
-                continue
-            if not has_ignored_class(link_element, self.non_recursive_classes) and link_url not in self.visited:
-                (linked_content, linked_links, linked_images, _) = await self.process_page(link_url, filename=filename, current_depth=current_depth + 1)
+    def admit_link(self, link_element, link_url, url, scheduled=()):
+        """
+        Возвращает канонический URL ссылки, если её нужно обойти, иначе None.
+        """
+        if link_element is None or has_ignored_class(link_element, self.non_recursive_classes):
+            return None
+        return self.frontier.admit(link_url, url, self.visited, scheduled)
+
+    def peek_link(self, link_element, link_url, url):
+        """
+        То же, что admit_link, но без учёта в статистике фронтира: для опережающей загрузки.
+        """
+        if link_element is None or has_ignored_class(link_element, self.non_recursive_classes):
+            return None
+        (canonical, in_scope) = self.frontier.resolve(link_url)
+        if in_scope and canonical != url and canonical not in self.visited and self.frontier.allowed(canonical):
+            return canonical
+        return None
+
+    def prefetch_links(self, links, url, depth):
+        """
+        Начинает опережающую загрузку ссылок страницы url, которые будут обработаны на глубине depth.
+        """
+        if self.prefetcher and depth <= self.max_depth:
+            self.prefetcher.schedule(filter(None, (self.peek_link(link_element, link_url, url) for (link_element, link_url) in links)))
+
+    def prefetch_navigation(self, link_urls, depth):
+        if self.prefetcher and depth <= self.max_depth:
+            self.prefetcher.schedule(link_url for link_url in link_urls if self.is_navigation_target(link_url))
+
+    async def fetch(self, url):
+        if self.prefetcher:
+            return await self.prefetcher.get(url)
+        return await self.retriever.retrieve_content(url)
+
+    def discard_prefetch(self, url):
+        if self.prefetcher:
+            self.prefetcher.discard(url)
+
+    async def process_links(self, links, url, soup, current_depth, images, filename, check_duplicates_depth=-1):
+        """
+        Рекурсивно обходит ссылки страницы и встраивает полученный контент вместо ссылок.
+        В параллельном режиме все дочерние страницы одного уровня загружаются одновременно
+        (количество одновременных загрузок ограничено пулом вкладок retriever).
+        Страница, на которую ссылаются несколько страниц, встраивается в ту, что первой до неё дошла.
+        При последовательном обходе (pages_count=1) это первая ссылка в порядке обхода в глубину.
+        В параллельном режиме ссылки уровня занимаются раньше, чем ссылки поддеревьев его страниц, поэтому
+        общая страница встраивается ближе к стартовой, а между поддеревьями выбор может зависеть от порядка
+        загрузки. Набор страниц тот же, но результат может отличаться от последовательного обхода.
+        """
+        if not self.concurrent:
+            # Ссылки дочерних страниц добавляются в links для результата, но обходятся только
+            # ссылки самой страницы (их элементы находятся в её дереве)
+            pending = list(links)
+            for (i, (link_element, link_url)) in enumerate(pending):
+                if not (link_url := self.admit_link(link_element, link_url, url)):
+                    continue
+                # Текущая ссылка и следующие за ней загружаются, пока обрабатываются уже загруженные
+                self.prefetch_links(pending[i:], url, current_depth + 1)
+                self.parents[link_url] = url
+                (linked_content, linked_links, linked_images, _) = await self.process_page(link_url, filename=filename, current_depth=current_depth + 1, check_duplicates_depth=check_duplicates_depth)
+                self.metrics.page_done(link_url)
                 if linked_content:
                     links.extend(linked_links)
                     images.extend(linked_images)
-                    new_element = await self.replace_with_linked_content(soup, linked_content, link_url, link_element)
+                    await self.embed_linked_content(soup, linked_content, link_url, link_element)
+            return
+
+        # Параллельный режим: отбираем ссылки фронтира текущего уровня без повторов
+        frontier = []
+        scheduled = set()
+        for link_element, link_url in links:
+            if not (link_url := self.admit_link(link_element, link_url, url, scheduled)):
+                continue
+            scheduled.add(link_url)
+            self.parents[link_url] = url
+            frontier.append((link_element, link_url))
+
+        results = await asyncio.gather(*(
+            self.process_page(link_url, filename=filename, current_depth=current_depth + 1, check_duplicates_depth=check_duplicates_depth)
+            for _, link_url in frontier
+        ))
+        for (link_element, link_url), (linked_content, linked_links, linked_images, _) in zip(frontier, results):
+            self.metrics.page_done(link_url)
+            if linked_content:
+                links.extend(linked_links)
+                images.extend(linked_images)
+                await self.embed_linked_content(soup, linked_content, link_url, link_element)
+
+    async def restore_linked_content(self, url, content, current_depth=0, filename=None):
+        """
+        Собирает страницу из сохранённого состояния: там хранится только её собственный контент,
+        а дочерние страницы, встроенные в неё при обходе, встраиваются заново из их сохранённого контента.
+        Ссылки навигационных элементов страницы и дочерних страниц обходятся снова в том же порядке,
+        что и при обработке страницы: страницы, найденные по ним, тоже записываются в результат.
+        """
+        soup = await self.retriever.parse(content, self.parser)
+        children = self.state.load_children(self.crawl_id, url)
+        if children:
+            for (link_element, link_url) in await self.get_links(soup, url):
+                link_url = self.frontier.resolve(link_url)[0]
+                if link_url not in children or not (cached := self.state.get_page(self.crawl_id, link_url)):
+                    continue
+                children.discard(link_url)
+                linked_content = await self.restore_linked_content(link_url, cached[0], current_depth + 1, filename)
+                await self.embed_linked_content(soup, linked_content, link_url, link_element)
+        await self.process_navigation_targets(self.state.get_navigation(self.crawl_id, url), current_depth, filename)
+        return soup
 
     async def process_page(self, url, filename=None, current_depth=0, check_duplicates_depth=-1):
         """
@@ -398,88 +1286,151 @@ class IWebCrawler:
         """
         if current_depth > self.max_depth:
             logging.debug(f"Превышена максимальная глубина для {url}, пропуск.")
+            self.discard_prefetch(url)
             return (None, [], [], '')
-        if url in self.visited and check_duplicates_depth >= current_depth:
+        if check_duplicates_depth >= current_depth and not seen_sets.claim(self.visited, url):
             logging.debug(f"Уже посещена {url}, пропуск.")
+            self.discard_prefetch(url)
             return (None, [], [], '')
         self.visited.add(url)
+        if self.state:
+            if cached := self.state.get_page(self.crawl_id, url):
+                logging.info(f"Взята из сохранённого состояния: {url}")
+                self.discard_prefetch(url)
+                (content, link_urls, images, title) = cached
+                content = await self.restore_linked_content(url, content, current_depth, filename)
+                return (content, [(None, link_url) for link_url in link_urls], images, title)
+            self.state.page_started(self.crawl_id, url, self.parents.get(url))
         logging.info(f"Обработка: {url}. Глубина {current_depth}")
-        html = await self.retriever.retrieve_content(url)
+        html = await self.fetch(url)
         if not html:
             return (None, [], [], '')
 
-        soup = BeautifulSoup(html, 'html.parser')
-        await self.remove_ignored_elements(soup, url)
+        if isinstance(html, str):
+            with self.metrics.phase('parse', url):
+                soup = await self.retriever.parse(html, self.parser)
+        else:
+            # Статическая загрузка и пул разбора уже вернули дерево: разбор учтён там
+            soup = ensure_soup(html, self.parser)
+        with self.metrics.phase('ignored', url):
+            await self.remove_ignored_elements(soup, url)
 
         # Обработка навигационных элементов
-        navigators = await self.get_navigators(soup, url)
+        with self.metrics.phase('navigation', url):
+            navigators = await self.get_navigators(soup, url)
 
-        images = [] if self.no_images else await self.save_images(soup, url)
+        with self.metrics.phase('images', url):
+            images = [] if self.no_images else await self.save_images(soup, url)
+        self.metrics.count('images', len(images), url=url)
         links = []
-        # Обработка ссылок для рекурсивного обхода
-        if urlparse(url).netloc == self.base_netloc:
-            links = await self.get_links(soup, url)
-            #self.process_links(links, url, soup, current_depth, images, filename)
-            for link in links:
-                link_element = link[0]
-                link_url = link[1]
-                if not link_url.startswith(('http://', 'https://')) or link_url == url or (urlparse(link_url).netloc not in self.allowed_domains and urlparse(link_url).netloc != self.base_netloc):
-                    continue
-                if not has_ignored_class(link_element, self.non_recursive_classes) and link_url not in self.visited:
-                    (linked_content, linked_links, linked_images, _) = await self.process_page(link_url, filename=filename, current_depth=current_depth + 1, check_duplicates_depth=check_duplicates_depth)
-                    if linked_content:
-                        links.extend(linked_links)
-                        images.extend(linked_images)
-                        new_element = await self.replace_with_linked_content(soup, linked_content, link_url, link_element)
+        # В состоянии хранится только собственный контент страницы, без встроенных ниже дочерних страниц:
+        # иначе его объём рос бы с глубиной и размером поддерева
+        own_content = str(soup) if self.state else None
+        # Обработка ссылок для рекурсивного обхода: только со страниц базового хоста,
+        # страницы остальных allowed_domains сохраняются без перехода по их ссылкам
+        canonical = self.frontier.resolve(url)[0]
+        if canonical and urlparse(canonical).netloc == self.base_netloc:
+            with self.metrics.phase('links', url):
+                links = await self.get_links(soup, url)
+            self.metrics.count('links', len(links), url=url)
+            await self.process_links(links, url, soup, current_depth, images, filename, check_duplicates_depth=check_duplicates_depth)
 
         # Извлечение и обработка ссылок из навигационного элемента
-        await self.process_navigators(navigators, url, current_depth, filename)
+        navigation = self.navigation_targets(navigators, url)
+        await self.process_navigation_targets(navigation, current_depth, filename)
 
-        content = str(soup) if soup else None
+        # Дерево страницы возвращается без сериализации: родитель встраивает его узлы,
+        # а в строку оно превращается один раз - при конвертации в Markdown
+        content = soup
         # Извлечение заголовка для метаданных
         title = self.get_title(soup, url)
+        if self.page_store:
+            with self.metrics.phase('html_to_markdown', url):
+                markdown = await self.to_markdown(content)
+            with self.metrics.phase('save', url):
+                self.page_store.save(url, markdown)
+        if self.state:
+            self.state.page_done(self.crawl_id, url, own_content, [link[1] for link in links], images, title, navigation)
         return (content, links, images, title)
 
     def html_to_markdown(self, soup):
         """
-        Конвертирует HTML в Markdown с помощью markdownify.
-        """
-        html = str(soup)
-        #markdown = md(html, heading_style="ATX")
-        converter = html2text.HTML2Text()
-        converter.body_width = 0
-        markdown = converter.handle(html)
-        markdown = markdown.strip() if markdown else ""
-        markdown = markdown.replace('\t', ' ')
-        markdown = re.sub(r'[ ]{2,}', ' ', markdown)
-        markdown = re.sub(r'[ ]{1,}+\n{1,}', '\n', markdown)
-        markdown = re.sub(r'\n{2,}', '\n', markdown)
-        markdown = re.sub(
-            r'(\n*)##START_LINKED_CONTENT_FROM:\s*(https?://\S+)(\n*)',
-            r'\n===========================\n##START_LINKED_CONTENT_FROM: \2\n',
-            markdown
-        )
-        markdown = re.sub(
-            r'(\n*)##END_LINKED_CONTENT_FROM:\s*(https?://\S+)(\n*)',
-            r'\n##END_LINKED_CONTENT_FROM: \2\n===========================\n',
-            markdown
-        )
+        Конвертирует HTML в Markdown в текущем потоке.
+        """
+        return self.markdown.convert(soup)
 
-        return markdown
+    async def to_markdown(self, soup):
+        """
+        Конвертирует HTML в Markdown, в пуле процессов, если он задан (markdown_workers).
+        """
+        return await self.markdown.convert_async(soup)
 
     async def crawl(self, start_url):
         """
         Запускает процесс краулинга с заданного URL.
         """
+        self.crawl_id = start_url
+        if self.shared_store:
+            self.attach_shared_store(start_url)
+        if self.state:
+            if self.state.is_crawl_done(start_url):
+                logging.info(f"Обход {start_url} уже завершён, пропуск.")
+                return
+            self.state.start_crawl(start_url)
+            self.restore_state(start_url)
+
+        self.metrics.begin(start_url)
+        if revalidation := getattr(self.retriever, 'revalidation', None):
+            revalidation.begin_crawl(start_url)
         filename = self.sanitize_filename(start_url)
         start_tag = f"##START##: {start_url}\n\n"
-        async with aiofiles.open(self.output_dir / filename, 'w', encoding='utf-8') as f:
-            await f.write(start_tag)
+        # Файл перезаписывается, начальная метка - первая запись его потока
+        await self.get_sink(filename, 'w').write(start_tag)
 
         #content = await self.process_page(start_url, filename=filename)
         #markdown = self.html_to_markdown(content)
         #await self.save_markdown(filename, markdown)
-        await self.process_navigation_link(start_url, filename=filename)
+        canonical_start_url = self.frontier.canonicalize(start_url) or start_url
+        try:
+            if self.discovery:
+                self.seeds = await self.discover(canonical_start_url)
+            await self.process_navigation_link(canonical_start_url, filename=filename)
+            await self.process_seeds(filename)
+            if self.output_stage:
+                await self.output_stage.drain()
+            await self.image_downloader.join()
+        finally:
+            # После ошибки обхода незавершённые задачи конвейера отменяются, а то, что уже
+            # попало в буферы файлов, записывается на диск
+            if self.prefetcher:
+                await self.prefetcher.cancel()
+            if self.output_stage:
+                await self.output_stage.cancel()
+            await self.image_downloader.cancel()
+            await self.close_sinks()
+        self.frontier.report()
+        seen_sets.report({
+            'visited': self.visited,
+            'processed_elements': self.processed_elements,
+            'processed_navigation': self.processed_navigation,
+        })
+        await self.finalize_crawl(start_url)
+        self.metrics.end(start_url)
+        if self.state:
+            self.state.finish_crawl(start_url)
+
+    async def finalize_crawl(self, start_url):
+        """
+        Вызывается после завершения обхода start_url (до отметки о завершении в хранилище состояния).
+        """
+        pass
+
+    def close(self):
+        """
+        Останавливает пул конвертации Markdown и закрывает хранилище изображений после всех обходов.
+        """
+        self.markdown.close()
+        self.image_downloader.close()
 
 
 async def main():
@@ -495,9 +1446,9 @@ async def main():
     #}
 
     # Инициализация retriever без логина
-    async with IHTMLRetriever(base_url=start_url, login_url=None, login_credentials='') as retriever:
+    async with IHTMLRetriever(base_url=start_url, login_url=None, login_credentials='', static_first=True) as retriever:
         # Если требуется логин, раскомментируйте следующие строки:
-        if await retriever.login():
+        if await retriever.authenticate():
             #allowed_domains = ['kb.ileasing.ru']
             crawler = IWebCrawler(
                 retriever,
@@ -515,6 +1466,7 @@ async def main():
             for start_url in start_urls:
                 crawler.initialize()
                 await crawler.crawl(start_url)
+            crawler.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
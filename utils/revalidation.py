@@ -0,0 +1,143 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    raw_digest TEXT,
+    content_digest TEXT,
+    content TEXT,
+    checked_at REAL,
+    crawl TEXT
+);
+"""
+
+
+def digest(data):
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.md5(data).hexdigest()
+
+
+class RevalidationStore:
+    """
+    Хранит валидаторы (ETag / Last-Modified), хеши и очищенный контент страниц между запусками.
+    Позволяет при повторном обходе не рендерить неизменившиеся страницы и формирует
+    отчёт new/changed/unchanged/removed для последующих этапов.
+    trust_raw_digest - считать страницу неизменной, если совпал хеш сырого HTML без рендеринга или сервер
+    ответил 304 на условный запрос. Для SPA (например, kb.ileasing.ru) сырой HTML и его валидаторы одинаковы
+    для всех страниц, поэтому там опцию нужно отключать: страницы проверяются по ответам API или рендерятся.
+    """
+
+    def __init__(self, path, trust_raw_digest=True):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.trust_raw_digest = trust_raw_digest
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(pages)")}
+        if 'crawl' not in columns:
+            # Файл прежней версии: стартовый URL для его страниц станет известен при следующей встрече
+            self.conn.execute("ALTER TABLE pages ADD COLUMN crawl TEXT")
+        # Статусы страниц в текущем запуске
+        self.statuses = {}
+        # Стартовый URL текущего обхода и все стартовые URL, обойдённые в этом запуске
+        self.crawl = None
+        self.crawls = set()
+
+    def begin_crawl(self, crawl):
+        """
+        Последующие страницы относятся к обходу crawl (стартовому URL): удалёнными в отчёте считаются
+        только страницы обходов, выполненных в этом запуске.
+        """
+        self.crawl = crawl
+        self.crawls.add(crawl)
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def get(self, url):
+        row = self.conn.execute(
+            "SELECT etag, last_modified, raw_digest, content_digest, content, checked_at FROM pages WHERE url = ?",
+            (url,),
+        ).fetchone()
+        if not row:
+            return None
+        return dict(zip(('etag', 'last_modified', 'raw_digest', 'content_digest', 'content', 'checked_at'), row))
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def mark_unchanged(self, url):
+        self.statuses[url] = 'unchanged'
+        with self.conn:
+            self.conn.execute(
+                "UPDATE pages SET checked_at = ?, crawl = COALESCE(?, crawl) WHERE url = ?", (time.time(), self.crawl, url)
+            )
+
+    def record(self, url, content, etag='', last_modified='', raw_digest=''):
+        """
+        Сохраняет результат полной загрузки страницы и определяет её статус.
+        """
+        content_digest = digest(content)
+        entry = self.get(url)
+        if entry is None:
+            status = 'new'
+        elif entry['content_digest'] != content_digest:
+            status = 'changed'
+        else:
+            status = 'unchanged'
+        self.statuses[url] = status
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages (url, etag, last_modified, raw_digest, content_digest, content, checked_at, crawl) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, COALESCE(?, (SELECT crawl FROM pages WHERE url = ?)))",
+                (url, etag, last_modified, raw_digest, content_digest, content, time.time(), self.crawl, url),
+            )
+        return status
+
+    def report(self):
+        """
+        Отчёт об изменениях. removed - страницы, найденные в прошлый раз обходом одного из стартовых URL
+        этого запуска, но не встреченные в нём. Страницы других стартовых URL в removed не попадают.
+        """
+        report = {'new': [], 'changed': [], 'unchanged': [], 'removed': []}
+        for url, status in self.statuses.items():
+            report[status].append(url)
+        for crawl in self.crawls:
+            for (url,) in self.conn.execute("SELECT url FROM pages WHERE crawl = ?", (crawl,)):
+                if url not in self.statuses:
+                    report['removed'].append(url)
+        return report
+
+    def forget(self, urls):
+        with self.conn:
+            self.conn.executemany("DELETE FROM pages WHERE url = ?", ((url,) for url in urls))
+
+    def write_report(self, path):
+        """
+        Пишет отчёт и удаляет страницы из removed, чтобы следующий запуск не сообщал о них снова.
+        """
+        report = self.report()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        self.forget(report['removed'])
+        logging.info(
+            f"Отчёт о повторном обходе: новых {len(report['new'])}, изменённых {len(report['changed'])}, "
+            f"без изменений {len(report['unchanged'])}, удалённых {len(report['removed'])}"
+        )
+        return report
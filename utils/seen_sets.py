@@ -0,0 +1,257 @@
+import hashlib
+import json
+import logging
+import math
+import sys
+from array import array
+from pathlib import Path
+
+
+# Коды array для разрядности хешей DigestSet
+DIGEST_TYPECODES = {32: 'I', 64: 'Q'}
+
+
+def hash_item(item, size=8):
+    if isinstance(item, str):
+        item = item.encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(item, digest_size=size).digest(), 'little')
+
+
+def write_blob(path, header, payload):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(json.dumps(header).encode('utf-8') + b'\n')
+        f.write(payload)
+
+
+def read_blob(path):
+    with open(path, 'rb') as f:
+        header = json.loads(f.readline())
+        return (header, f.read())
+
+
+class DigestSet:
+    """
+    Множество строк, хранящее вместо самих строк их 32- или 64-битные хеши в массиве
+    с открытой адресацией (8 байт на ячейку вместо ~100 байт на URL в set).
+    Вероятность ложного совпадения при n элементах - около n / 2**bits на проверку.
+    """
+
+    def __init__(self, bits=64, capacity=1024, max_load=0.7):
+        if bits not in DIGEST_TYPECODES:
+            raise ValueError(f"Неподдерживаемая разрядность хеша: {bits}")
+        self.bits = bits
+        self.max_load = max_load
+        self.count = 0
+        self.table = array(DIGEST_TYPECODES[bits], bytes(self.slot_size * self.table_size_for(capacity)))
+
+    @property
+    def slot_size(self):
+        return self.bits // 8
+
+    def table_size_for(self, capacity):
+        return 1 << max(4, math.ceil(math.log2(capacity / self.max_load + 1)))
+
+    def digest(self, item):
+        # 0 обозначает пустую ячейку
+        return hash_item(item, self.slot_size) or 1
+
+    def find_slot(self, table, digest):
+        mask = len(table) - 1
+        slot = digest & mask
+        while table[slot] and table[slot] != digest:
+            slot = (slot + 1) & mask
+        return slot
+
+    def add(self, item):
+        digest = self.digest(item)
+        slot = self.find_slot(self.table, digest)
+        if self.table[slot]:
+            return
+        self.table[slot] = digest
+        self.count += 1
+        if self.count > len(self.table) * self.max_load:
+            self.resize(len(self.table) * 2)
+
+    def resize(self, size):
+        table = array(self.table.typecode, bytes(self.slot_size * size))
+        for digest in self.table:
+            if digest:
+                table[self.find_slot(table, digest)] = digest
+        self.table = table
+
+    def update(self, items):
+        for item in items:
+            self.add(item)
+
+    def __contains__(self, item):
+        return bool(self.table[self.find_slot(self.table, self.digest(item))])
+
+    def __len__(self):
+        return self.count
+
+    def memory_usage(self):
+        return sys.getsizeof(self.table)
+
+    def save(self, path):
+        write_blob(path, {'type': 'digest', 'bits': self.bits, 'count': self.count, 'max_load': self.max_load}, self.table.tobytes())
+
+    @classmethod
+    def load(cls, path):
+        (header, payload) = read_blob(path)
+        digest_set = cls(bits=header['bits'], max_load=header['max_load'])
+        digest_set.table = array(DIGEST_TYPECODES[header['bits']])
+        digest_set.table.frombytes(payload)
+        digest_set.count = header['count']
+        return digest_set
+
+
+class BloomFilter:
+    """
+    Фильтр Блума фиксированной ёмкости: capacity элементов с вероятностью ложного срабатывания error_rate.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bits_count = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes_count = max(1, round(self.bits_count / capacity * math.log(2)))
+        self.bits = bytearray((self.bits_count + 7) // 8)
+        self.count = 0
+
+    def positions(self, digest):
+        # Двойное хеширование: k позиций из двух 64-битных половин одного хеша
+        (h1, h2) = (digest & 0xFFFFFFFFFFFFFFFF, digest >> 64 | 1)
+        return [(h1 + i * h2) % self.bits_count for i in range(self.hashes_count)]
+
+    def contains_digest(self, digest):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self.positions(digest))
+
+    def add_digest(self, digest):
+        for pos in self.positions(digest):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+
+class ScalableBloomFilter:
+    """
+    Масштабируемый фильтр Блума: при заполнении добавляется новый фильтр в growth раз большей ёмкости
+    с ужесточённой (в tightening раз) вероятностью ошибки, так что суммарная вероятность ложного
+    срабатывания не превышает error_rate при любом числе элементов. Около 1.2 байта на элемент при 1e-3.
+    Ложное срабатывание для visited означает пропуск непосещённой страницы.
+    """
+
+    def __init__(self, error_rate=0.001, capacity=100_000, growth=2, tightening=0.5):
+        if not 0 < error_rate < 1:
+            raise ValueError(f"error_rate должен быть в интервале (0, 1): {error_rate}")
+        self.error_rate = error_rate
+        self.initial_capacity = capacity
+        self.growth = growth
+        self.tightening = tightening
+        self.filters = []
+
+    def new_filter(self):
+        index = len(self.filters)
+        capacity = self.initial_capacity * self.growth ** index
+        error_rate = self.error_rate * (1 - self.tightening) * self.tightening ** index
+        self.filters.append(BloomFilter(capacity, error_rate))
+        return self.filters[-1]
+
+    def add(self, item):
+        digest = hash_item(item, 16)
+        if any(bloom.contains_digest(digest) for bloom in self.filters):
+            return
+        bloom = self.filters[-1] if self.filters else self.new_filter()
+        if bloom.count >= bloom.capacity:
+            bloom = self.new_filter()
+        bloom.add_digest(digest)
+
+    def update(self, items):
+        for item in items:
+            self.add(item)
+
+    def __contains__(self, item):
+        digest = hash_item(item, 16)
+        return any(bloom.contains_digest(digest) for bloom in self.filters)
+
+    def __len__(self):
+        return sum(bloom.count for bloom in self.filters)
+
+    def memory_usage(self):
+        return sum(sys.getsizeof(bloom.bits) for bloom in self.filters)
+
+    def save(self, path):
+        header = {
+            'type': 'bloom',
+            'error_rate': self.error_rate,
+            'capacity': self.initial_capacity,
+            'growth': self.growth,
+            'tightening': self.tightening,
+            'counts': [bloom.count for bloom in self.filters],
+        }
+        write_blob(path, header, b''.join(bytes(bloom.bits) for bloom in self.filters))
+
+    @classmethod
+    def load(cls, path):
+        (header, payload) = read_blob(path)
+        bloom_filter = cls(header['error_rate'], header['capacity'], header['growth'], header['tightening'])
+        offset = 0
+        for count in header['counts']:
+            bloom = bloom_filter.new_filter()
+            bloom.bits[:] = payload[offset:offset + len(bloom.bits)]
+            bloom.count = count
+            offset += len(bloom.bits)
+        return bloom_filter
+
+
+SEEN_SET_BACKENDS = {
+    'set': set,
+    'digest': DigestSet,
+    'bloom': ScalableBloomFilter,
+}
+
+
+def make_seen_set(backend='set', **options):
+    """
+    Создаёт множество посещённых URL или обработанных хешей: 'set' - обычный set (точный, много памяти),
+    'digest' - DigestSet (хеши в массиве), 'bloom' - ScalableBloomFilter (минимум памяти, ложные срабатывания).
+    """
+    if backend not in SEEN_SET_BACKENDS:
+        raise ValueError(f"Неизвестный тип множества: {backend}")
+    return SEEN_SET_BACKENDS[backend](**options)
+
+
+def load_seen_set(path):
+    (header, _) = read_blob(path)
+    return SEEN_SET_BACKENDS[header['type']].load(path)
+
+
+def claim(seen_set, item):
+    """
+    Добавляет элемент и возвращает True, если его ещё не было. Для множеств, общих для
+    нескольких процессов (SharedSeenSet), проверка и добавление выполняются атомарно.
+    """
+    if hasattr(seen_set, 'claim'):
+        return seen_set.claim(item)
+    if item in seen_set:
+        return False
+    seen_set.add(item)
+    return True
+
+
+def memory_usage(seen_set):
+    if hasattr(seen_set, 'memory_usage'):
+        return seen_set.memory_usage()
+    return sys.getsizeof(seen_set) + sum(sys.getsizeof(item) for item in seen_set)
+
+
+def report(seen_sets):
+    """
+    Пишет в лог объём памяти, занятый множествами {имя: множество}, и возвращает его в байтах.
+    """
+    usage = {name: (len(seen_set), memory_usage(seen_set)) for name, seen_set in seen_sets.items()}
+    logging.info("Память множеств: " + ", ".join(
+        f"{name} - {count} элементов, {size / 1024:.0f} КБ" for name, (count, size) in usage.items()
+    ))
+    return {name: size for name, (_, size) in usage.items()}
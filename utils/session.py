@@ -0,0 +1,66 @@
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+
+class AuthRedirect(Exception):
+    """
+    Сайт перенаправил на страницу входа: сессия недействительна.
+    generation - номер входа (IHTMLRetriever.login_generation), с которым загружалась страница.
+    """
+
+    def __init__(self, url, generation):
+        super().__init__(f"Перенаправление на страницу входа: {url}")
+        self.url = url
+        self.generation = generation
+
+
+class SessionStore:
+    """
+    Состояние авторизации между запусками: storage_state Playwright (cookies и localStorage) в JSON-файле.
+    Файл совместим с Playwright (storage_state=path), время сохранения - время изменения файла.
+    max_age - состояние старше стольких секунд не загружается (None - без ограничения).
+    Cookies с истёкшим сроком отбрасываются при загрузке; если не осталось ни одной, состояние не загружается.
+    """
+
+    def __init__(self, path, max_age=12 * 3600):
+        self.path = Path(path)
+        self.max_age = max_age
+
+    def load(self):
+        """
+        Возвращает сохранённое состояние или None, если его нет или оно устарело.
+        """
+        try:
+            age = time.time() - self.path.stat().st_mtime
+            with open(self.path, encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.warning(f"Не удалось прочитать состояние сессии {self.path}: {e}")
+            return None
+        if self.max_age is not None and age > self.max_age:
+            logging.info(f"Состояние сессии {self.path} устарело ({age / 3600:.1f} ч), потребуется вход")
+            return None
+        now = time.time()
+        cookies = [cookie for cookie in state.get('cookies', []) if cookie.get('expires', -1) < 0 or cookie['expires'] > now]
+        if not cookies:
+            logging.info(f"В состоянии сессии {self.path} нет действующих cookies, потребуется вход")
+            return None
+        logging.info(f"Загружено состояние сессии {self.path}: {len(cookies)} cookies")
+        return {**state, 'cookies': cookies}
+
+    def save(self, state):
+        """
+        Сохраняет состояние атомарно: воркеры, разделяющие файл, не прочитают его наполовину записанным.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        # Файл содержит cookies сессии, поэтому доступен только владельцу
+        with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        logging.debug(f"Состояние сессии сохранено в {self.path}")
@@ -0,0 +1,227 @@
+import csv
+import json
+import logging
+import multiprocessing
+import shutil
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+
+SHARED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    url TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    worker INTEGER,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS seen (
+    namespace TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    item TEXT NOT NULL,
+    worker INTEGER,
+    PRIMARY KEY (namespace, kind, item)
+) WITHOUT ROWID;
+"""
+
+
+class SharedCrawlStore:
+    """
+    Общее для процессов-воркеров SQLite-хранилище: очередь стартовых URL (tasks)
+    и посещённые страницы / хеши дубликатов (seen), чтобы каждую страницу и каждый
+    блок обработал ровно один воркер.
+    """
+
+    def __init__(self, path, worker=None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.worker = worker
+        # Транзакции управляются явно (BEGIN IMMEDIATE), остальные запросы - в режиме автофиксации
+        self.conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SHARED_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def reset(self):
+        self.conn.execute("DELETE FROM tasks")
+        self.conn.execute("DELETE FROM seen")
+
+    def add_tasks(self, urls, resume=False):
+        """
+        Ставит стартовые URL в очередь. При продолжении прерванного запуска задачи,
+        начатые упавшими воркерами, возвращаются в очередь, а завершённые не повторяются.
+        """
+        if resume:
+            self.conn.execute("UPDATE tasks SET status = 'pending', worker = NULL WHERE status = 'running'")
+        for url in urls:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO tasks (url, status, updated_at) VALUES (?, 'pending', ?)", (url, time.time())
+            )
+
+    def next_task(self):
+        """
+        Атомарно забирает следующий стартовый URL из очереди или возвращает None.
+        """
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute("SELECT url FROM tasks WHERE status = 'pending' ORDER BY rowid LIMIT 1").fetchone()
+            if row:
+                self.conn.execute(
+                    "UPDATE tasks SET status = 'running', worker = ?, updated_at = ? WHERE url = ?",
+                    (self.worker, time.time(), row[0]),
+                )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return row[0] if row else None
+
+    def finish_task(self, url):
+        self.conn.execute("UPDATE tasks SET status = 'done', updated_at = ? WHERE url = ?", (time.time(), url))
+
+    def task_counts(self):
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status"))
+
+    def claim(self, namespace, kind, item):
+        cursor = self.conn.execute(
+            "INSERT OR IGNORE INTO seen (namespace, kind, item, worker) VALUES (?, ?, ?, ?)",
+            (namespace, kind, item, self.worker),
+        )
+        return cursor.rowcount == 1
+
+    def contains(self, namespace, kind, item):
+        return self.conn.execute(
+            "SELECT 1 FROM seen WHERE namespace = ? AND kind = ? AND item = ?", (namespace, kind, item)
+        ).fetchone() is not None
+
+    def seen_set(self, kind, namespace=''):
+        return SharedSeenSet(self, kind, namespace)
+
+
+class SharedSeenSet:
+    """
+    Множество посещённых URL или хешей, общее для всех воркеров (утилита для IWebCrawler).
+    claim() атомарно добавляет элемент и сообщает, был ли он новым.
+    Найденные элементы кешируются локально: из общего множества они не удаляются.
+    """
+
+    def __init__(self, store, kind, namespace=''):
+        self.store = store
+        self.kind = kind
+        self.namespace = namespace
+        self.known = set()
+
+    def claim(self, item):
+        if item in self.known:
+            return False
+        self.known.add(item)
+        return self.store.claim(self.namespace, self.kind, item)
+
+    def add(self, item):
+        self.claim(item)
+
+    def update(self, items):
+        for item in items:
+            self.claim(item)
+
+    def __contains__(self, item):
+        if item in self.known:
+            return True
+        if self.store.contains(self.namespace, self.kind, item):
+            self.known.add(item)
+            return True
+        return False
+
+    def __len__(self):
+        return len(self.known)
+
+    def memory_usage(self):
+        return sys.getsizeof(self.known) + sum(sys.getsizeof(item) for item in self.known)
+
+
+def run_workers(target, workers, args=()):
+    """
+    Запускает target(worker, *args) в workers отдельных процессах (у каждого свой браузер
+    и цикл событий) и дожидается их завершения. Возвращает коды завершения.
+    """
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=target, args=(worker, *args), name=f"crawler-{worker}") for worker in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        if process.exitcode:
+            logging.error(f"Воркер {process.name} завершился с кодом {process.exitcode}")
+    return [process.exitcode for process in processes]
+
+
+def merge_csv(sources, destination):
+    """
+    Дописывает строки CSV-файлов воркеров в destination (заголовок - если файла ещё нет).
+    """
+    csv.field_size_limit(sys.maxsize)
+    destination = Path(destination)
+    write_header = not destination.exists()
+    rows = 0
+    with open(destination, 'a', encoding='utf-8', newline='') as out:
+        writer = csv.writer(out)
+        for source in sources:
+            if not source.exists():
+                continue
+            with open(source, encoding='utf-8', newline='') as f:
+                reader = csv.reader(f)
+                header = next(reader, None)
+                if header is None:
+                    continue
+                if write_header:
+                    writer.writerow(header)
+                    write_header = False
+                for row in reader:
+                    writer.writerow(row)
+                    rows += 1
+    return rows
+
+
+def merge_reports(sources, destination):
+    """
+    Объединяет отчёты new/changed/unchanged/removed воркеров. Удалённой считается страница,
+    которую не встретил ни один воркер.
+    """
+    reports = [json.loads(source.read_text(encoding='utf-8')) for source in sources if source.exists()]
+    merged = {status: sorted({url for report in reports for url in report.get(status, [])}) for status in ('new', 'changed', 'unchanged')}
+    seen = {url for urls in merged.values() for url in urls}
+    removed = set.intersection(*(set(report.get('removed', [])) for report in reports)) if reports else set()
+    merged['removed'] = sorted(removed - seen)
+    Path(destination).write_text(json.dumps(merged, ensure_ascii=False, indent=2), encoding='utf-8')
+    return merged
+
+
+def merge_outputs(worker_dirs, output_dir, csv_names=(), report_name=None, report_path=None):
+    """
+    Собирает результаты воркеров в output_dir: Markdown-файлы стартовых URL, страницы режима
+    ссылок (pages/), CSV и отчёты. Каждый стартовый URL обходит один воркер; если после продолжения
+    прерванного запуска файл есть у нескольких воркеров, берётся самый новый.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    markdown_files = {}
+    for worker_dir in worker_dirs:
+        for path in Path(worker_dir).glob('*.md'):
+            if path.name not in markdown_files or path.stat().st_mtime > markdown_files[path.name].stat().st_mtime:
+                markdown_files[path.name] = path
+    for (name, path) in sorted(markdown_files.items()):
+        shutil.copyfile(path, output_dir / name)
+    for worker_dir in worker_dirs:
+        pages_dir = Path(worker_dir) / 'pages'
+        if pages_dir.is_dir():
+            shutil.copytree(pages_dir, output_dir / 'pages', dirs_exist_ok=True)
+    for name in csv_names:
+        rows = merge_csv([Path(worker_dir) / name for worker_dir in worker_dirs], output_dir / name)
+        logging.info(f"{name}: добавлено {rows} строк от {len(worker_dirs)} воркеров")
+    if report_name and report_path:
+        merge_reports([Path(worker_dir) / report_name for worker_dir in worker_dirs], report_path)
+    logging.info(f"Результаты {len(worker_dirs)} воркеров собраны в {output_dir}: {len(markdown_files)} Markdown-файлов")